@@ -1,11 +1,22 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django_tenants.admin import TenantAdminMixin
 
 from apps.core.models import Client, Domain
+from apps.core.offboarding import start_offboarding
 
 @admin.register(Client)
 class ClientAdmin(TenantAdminMixin, admin.ModelAdmin):
-    list_display = ('name',)
+    list_display = ('name', 'disabled_at', 'offboarding_state')
+    readonly_fields = ('disabled_at', 'offboarding_state', 'offboarding_progress')
+    actions = ['offboard']
+
+    @admin.action(description='Desativar e remover os dados (offboarding em segundo plano)')
+    def offboard(self, request, queryset):
+        for tenant in queryset.exclude(schema_name='public'):
+            start_offboarding(tenant)
+        self.message_user(
+            request, 'Offboarding iniciado; acompanhe com "manage.py offboard_tenant --status"', messages.INFO,
+        )
 
 @admin.register(Domain)
 class DomainAdmin(admin.ModelAdmin):
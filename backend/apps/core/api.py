@@ -1,16 +1,22 @@
+import json
 from django.utils import timezone
 from ninja import Router, Schema
 from ninja.security import HttpBearer
 from typing import Optional, Dict, Any
-from django.contrib.auth import authenticate, login, logout
+from django.contrib.auth import login, logout
 from django.contrib.auth.models import AnonymousUser
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.middleware.csrf import get_token
 from django.conf import settings
-from django_tenants.utils import schema_context
+from . import hashing, user_import
+from .hashing import HashingPoolSaturated, authenticate_credentials
+from .idempotency import idempotent
 from .models import User, Client
-from .utils import create_tenant_with_domain, get_tenant_redirect_url
+from .utils import create_tenant_with_domain, get_tenant_redirect_url, taken_credential
 from .jwt_utils import generate_jwt_token, JWTAuth
+from .query_budget import budgeted_iterator, query_budget
+from .timeouts import QueryTimeout, query_timeout, stream_with_timeouts
+from .routers import read_only_route
 
 router = Router(tags=["Authentication"])
 
@@ -98,6 +104,7 @@ class TokenAuth(HttpBearer):
 
 
 @router.get("/csrf", response=dict)
+@query_budget(0)
 def get_csrf_token(request):
     """Endpoint para obter token CSRF"""
     return {
@@ -106,20 +113,16 @@ def get_csrf_token(request):
 
 
 @router.post("/login", response=AuthResponseSchema)
+@query_budget(6)
 def login_endpoint(request, payload: LoginSchema):
     """Endpoint de login (session-based)"""
     try:
-        user = authenticate(
-            username=payload.username,
-            password=payload.password
-        )
+        # Verificação da senha no pool de hashing (já carrega o tenant)
+        user = authenticate_credentials(payload.username, payload.password)
 
         if user is not None:
             login(request, user)
 
-            # Recarregar usuário com o tenant para garantir que o relacionamento seja carregado
-            user = User.objects.select_related('tenant').get(id=user.id)
-
             # Determinar URL de redirecionamento para o frontend
             redirect_url = None
             if user.tenant:
@@ -138,6 +141,9 @@ def login_endpoint(request, payload: LoginSchema):
                 message="Credenciais inválidas"
             )
 
+    except HashingPoolSaturated:
+        # Tratado pela API (503 + Retry-After)
+        raise
     except Exception as e:
         return AuthResponseSchema(
             success=False,
@@ -146,18 +152,14 @@ def login_endpoint(request, payload: LoginSchema):
 
 
 @router.post("/login-jwt", response=JWTAuthResponseSchema)
+@query_budget(4)
 def login_jwt_endpoint(request, payload: LoginSchema):
     """Endpoint de login JWT (recomendado para APIs) - permite login em qualquer contexto"""
     try:
-        user = authenticate(
-            username=payload.username,
-            password=payload.password
-        )
+        # Verificação da senha no pool de hashing (já carrega o tenant)
+        user = authenticate_credentials(payload.username, payload.password)
         
         if user is not None:
-            # Recarregar usuário com o tenant para garantir que o relacionamento seja carregado
-            user = User.objects.select_related('tenant').get(id=user.id)
-            
             # Gerar token JWT
             access_token = generate_jwt_token(user)
             
@@ -196,6 +198,8 @@ def login_jwt_endpoint(request, payload: LoginSchema):
                 user=None
             )
             
+    except HashingPoolSaturated:
+        raise
     except Exception as e:
         return JWTAuthResponseSchema(
             success=False,
@@ -206,7 +210,11 @@ def login_jwt_endpoint(request, payload: LoginSchema):
         )
 
 
+# As migrations do schema do novo tenant ficam fora do orçamento (Client.create_schema)
 @router.post("/register", response=AuthResponseSchema)
+@idempotent()
+@query_budget(9)
+@query_timeout(statement_timeout_ms=0, lock_timeout_ms=0)  # cria e migra o schema
 def register_endpoint(request, payload: RegisterSchema):
     """Endpoint de registro"""
     try:
@@ -217,42 +225,34 @@ def register_endpoint(request, payload: RegisterSchema):
                 message="As senhas não coincidem"
             )
         
-        # Verificar se usuário já existe
-        if User.objects.filter(username=payload.username).exists():
+        # Verificar se usuário ou e-mail já existem (uma única query)
+        taken = taken_credential(payload.username, payload.email)
+        if taken == 'username':
             return AuthResponseSchema(
                 success=False,
                 message="Nome de usuário já existe"
             )
         
-        if User.objects.filter(email=payload.email).exists():
+        if taken == 'email':
             return AuthResponseSchema(
                 success=False,
                 message="E-mail já está em uso"
             )
         
-        # Criar tenant e domínio no schema public
-        with schema_context('public'):
-            # Criar usuário
-            user = User.objects.create_user(
-                username=payload.username,
-                email=payload.email,
-                password=payload.password,
-                first_name=payload.first_name,
-                last_name=payload.last_name
-            )
-            
-            # Criar tenant e domínio
-            tenant, domain = create_tenant_with_domain(
-                payload.organization,
-                user
-            )
+        # Hash da senha fora da transação; tenant, domínio e usuário (já com
+        # o tenant) em uma única transação no schema public
+        user = hashing.build_user(
+            username=payload.username,
+            email=payload.email,
+            password=payload.password,
+            first_name=payload.first_name,
+            last_name=payload.last_name
+        )
+        tenant, domain = create_tenant_with_domain(payload.organization, user)
         
-        # Autenticar usuário após registro
+        # Autenticar usuário após registro (user.tenant já carregado)
         login(request, user)
         
-        # Recarregar usuário com o tenant para garantir que o relacionamento seja carregado
-        user = User.objects.select_related('tenant').get(id=user.id)
-        
         # Determinar URL de redirecionamento para o frontend
         redirect_url = get_tenant_redirect_url(user, for_api=True)
         
@@ -264,6 +264,8 @@ def register_endpoint(request, payload: RegisterSchema):
             csrf_token=get_token(request)
         )
         
+    except HashingPoolSaturated:
+        raise
     except Exception as e:
         return AuthResponseSchema(
             success=False,
@@ -271,7 +273,11 @@ def register_endpoint(request, payload: RegisterSchema):
         )
 
 
+# As migrations do schema do novo tenant ficam fora do orçamento (Client.create_schema)
 @router.post("/register-jwt", response=JWTAuthResponseSchema)
+@idempotent()
+@query_budget(5)
+@query_timeout(statement_timeout_ms=0, lock_timeout_ms=0)  # cria e migra o schema
 def register_jwt_endpoint(request, payload: RegisterSchema):
     """Endpoint de registro JWT (recomendado para APIs)"""
     try:
@@ -284,8 +290,9 @@ def register_jwt_endpoint(request, payload: RegisterSchema):
                 expires_in=0
             )
         
-        # Verificar se usuário já existe
-        if User.objects.filter(username=payload.username).exists():
+        # Verificar se usuário ou e-mail já existem (uma única query)
+        taken = taken_credential(payload.username, payload.email)
+        if taken == 'username':
             return JWTAuthResponseSchema(
                 success=False,
                 message="Nome de usuário já existe",
@@ -293,7 +300,7 @@ def register_jwt_endpoint(request, payload: RegisterSchema):
                 expires_in=0
             )
         
-        if User.objects.filter(email=payload.email).exists():
+        if taken == 'email':
             return JWTAuthResponseSchema(
                 success=False,
                 message="E-mail já está em uso",
@@ -301,25 +308,16 @@ def register_jwt_endpoint(request, payload: RegisterSchema):
                 expires_in=0
             )
         
-        # Criar tenant e domínio no schema public
-        with schema_context('public'):
-            # Criar usuário
-            user = User.objects.create_user(
-                username=payload.username,
-                email=payload.email,
-                password=payload.password,
-                first_name=payload.first_name,
-                last_name=payload.last_name
-            )
-            
-            # Criar tenant e domínio
-            tenant, domain = create_tenant_with_domain(
-                payload.organization,
-                user
-            )
-        
-        # Recarregar usuário com o tenant para garantir que o relacionamento seja carregado
-        user = User.objects.select_related('tenant').get(id=user.id)
+        # Hash da senha fora da transação; tenant, domínio e usuário (já com
+        # o tenant) em uma única transação no schema public
+        user = hashing.build_user(
+            username=payload.username,
+            email=payload.email,
+            password=payload.password,
+            first_name=payload.first_name,
+            last_name=payload.last_name
+        )
+        tenant, domain = create_tenant_with_domain(payload.organization, user)
         
         return JWTAuthResponseSchema(
             success=True,
@@ -330,6 +328,8 @@ def register_jwt_endpoint(request, payload: RegisterSchema):
             redirect_url="/login"  # Redirecionar para login
         )
         
+    except HashingPoolSaturated:
+        raise
     except Exception as e:
         return JWTAuthResponseSchema(
             success=False,
@@ -340,6 +340,7 @@ def register_jwt_endpoint(request, payload: RegisterSchema):
 
 
 @router.post("/logout", response=dict)
+@query_budget(2)
 def logout_endpoint(request):
     """Endpoint de logout"""
     try:
@@ -360,12 +361,14 @@ jwt_auth = JWTAuth()
 
 
 @router.get("/profile-jwt", response=UserResponseSchema, auth=jwt_auth)
+@query_budget(1)
 def get_profile_jwt(request):
     """Endpoint para obter perfil do usuário logado via JWT"""
     return UserResponseSchema.from_orm(request.auth)
 
 
 @router.get("/check-auth-jwt", response=dict, auth=jwt_auth)
+@query_budget(2)
 def check_authentication_jwt(request):
     """Endpoint para verificar se usuário está autenticado via JWT"""
     user = request.auth
@@ -388,6 +391,8 @@ def check_authentication_jwt(request):
 
 
 @router.get("/tenant-info-jwt", response=dict, auth=jwt_auth)
+@query_budget(2)
+@read_only_route
 def get_tenant_info_jwt(request):
     """Endpoint para obter informações do tenant atual via JWT"""
     user = request.auth
@@ -411,6 +416,7 @@ def get_tenant_info_jwt(request):
 
 
 @router.post("/validate-tenant-access", response=dict, auth=jwt_auth)
+@query_budget(2)
 def validate_tenant_access(request, payload: dict):
     """Valida se o usuário pode acessar o tenant baseado no domínio"""
     from ninja import Schema
@@ -459,6 +465,7 @@ def validate_tenant_access(request, payload: dict):
 
 
 @router.post("/logout-jwt", response=dict)
+@query_budget(0)
 def logout_jwt_endpoint(request):
     """Endpoint de logout JWT (stateless - apenas informativo)"""
     return {
@@ -468,6 +475,8 @@ def logout_jwt_endpoint(request):
 
 
 @router.post("/create-user-tenant", response=UserResponseSchema, auth=jwt_auth)
+@idempotent()
+@query_budget(3)
 def create_user_for_tenant(request, payload: CreateUserForTenantSchema):
     """Criar usuário dentro do tenant atual (apenas para admins da organização)"""
     try:
@@ -487,36 +496,78 @@ def create_user_for_tenant(request, payload: CreateUserForTenantSchema):
                 "message": "As senhas não coincidem"
             }
         
-        # Verificar se usuário já existe (no schema atual)
-        if User.objects.filter(username=payload.username).exists():
+        # Verificar se usuário ou e-mail já existem (uma única query)
+        taken = taken_credential(payload.username, payload.email)
+        if taken == 'username':
             return {
                 "success": False,
                 "message": "Nome de usuário já existe nesta organização"
             }
         
-        if User.objects.filter(email=payload.email).exists():
+        if taken == 'email':
             return {
                 "success": False,
                 "message": "E-mail já está em uso nesta organização"
             }
         
         # Criar novo usuário no schema atual (herdando o tenant do usuário atual)
-        new_user = User.objects.create_user(
+        new_user = hashing.create_user(
             username=payload.username,
             email=payload.email,
             password=payload.password,
             first_name=payload.first_name,
             last_name=payload.last_name,
-            tenant=current_user.tenant  # Herdar tenant do usuário atual
+            tenant=current_user.tenant  # Herdar tenant do usuário atual (já carregado pelo JWTAuth)
         )
         
-        # Recarregar com tenant para resposta
-        new_user = User.objects.select_related('tenant').get(id=new_user.id)
-        
         return UserResponseSchema.from_orm(new_user)
         
+    except HashingPoolSaturated:
+        raise
     except Exception as e:
         return {
             "success": False,
             "message": f"Erro ao criar usuário: {str(e)}"
         }
+
+
+# Por lote: a busca dos usuários já existentes e o bulk_create. O insert um a
+# um depois de um conflito (raro) estoura e fica registrado no log
+IMPORT_BATCH_QUERY_BUDGET = 2
+
+
+@router.post("/import-users", response={400: dict, 403: dict}, auth=jwt_auth)
+@query_budget(1)
+def import_users_endpoint(request, format: str = None):
+    """
+    Importação em massa de usuários no tenant atual. O corpo é o arquivo
+    (CSV com cabeçalho ou JSONL; formato pelo Content-Type ou ?format=) com
+    username, email, password e opcionalmente first_name/last_name. A
+    resposta é NDJSON: um evento de progresso por lote, com os erros por
+    linha, e um evento final com done=true.
+    """
+    current_user = request.auth
+    if not current_user.tenant:
+        return 403, {"error": "Usuário não pertence a nenhuma organização"}
+
+    fmt = format or user_import.detect_format(request.content_type)
+    if fmt not in user_import.FORMATS:
+        return 400, {"error": f"Formato inválido (use: {', '.join(user_import.FORMATS)})"}
+
+    # O trabalho no banco acontece enquanto o corpo é enviado, depois que a
+    # view retornou: o orçamento (por lote) e os timeouts são aplicados ali
+    progress = user_import.import_users(current_user.tenant, user_import.decode_lines(request), fmt)
+    progress = stream_with_timeouts(
+        budgeted_iterator(progress, 'import_users_endpoint', IMPORT_BATCH_QUERY_BUDGET),
+        getattr(request, 'tenant', None),
+        'import_users_endpoint',
+    )
+
+    def events():
+        try:
+            for event in progress:
+                yield json.dumps(event) + '\n'
+        except QueryTimeout as e:
+            yield json.dumps({'done': True, 'error': str(e), 'timeout': e.kind}) + '\n'
+
+    return StreamingHttpResponse(events(), content_type='application/x-ndjson')
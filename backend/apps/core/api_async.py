@@ -0,0 +1,137 @@
+"""
+Versões async (ASGI) dos endpoints de autenticação JWT.
+
+Montadas em /api/async/auth/. O registro continua síncrono por dentro (criar o
+schema do tenant é DDL pesado), mas roda em uma thread via sync_to_async.
+"""
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+from ninja import Router
+
+from .api import (
+    JWTAuthResponseSchema,
+    LoginSchema,
+    RegisterSchema,
+    UserResponseSchema,
+    register_jwt_endpoint,
+)
+from .hashing import aauthenticate_credentials
+from .idempotency import idempotent
+from .jwt_utils import AsyncJWTAuth, generate_jwt_token
+from .query_budget import query_budget
+from .timeouts import query_timeout
+from .utils import get_tenant_redirect_url
+
+router = Router(tags=["Authentication (async)"])
+
+jwt_auth = AsyncJWTAuth()
+
+aget_tenant_redirect_url = sync_to_async(get_tenant_redirect_url)
+
+
+def tenant_info(user, redirect_url):
+    return {
+        "id": user.tenant.id,
+        "name": user.tenant.name,
+        "schema_name": user.tenant.schema_name,
+        "redirect_url": redirect_url
+    }
+
+
+@router.post("/login-jwt", response=JWTAuthResponseSchema)
+@query_budget(4)
+async def login_jwt_endpoint_async(request, payload: LoginSchema):
+    """Endpoint de login JWT async - permite login em qualquer contexto"""
+    user = await aauthenticate_credentials(payload.username, payload.password)
+
+    if user is None:
+        return JWTAuthResponseSchema(
+            success=False,
+            message="Credenciais inválidas",
+            access_token="",
+            expires_in=0,
+            user=None
+        )
+
+    access_token = generate_jwt_token(user)
+
+    redirect_url = None
+    if user.tenant:
+        current_host = request.get_host().split(':')[0]
+        if current_host != f"{user.tenant.schema_name}.localhost":
+            redirect_url = await aget_tenant_redirect_url(user, for_api=True)
+
+    user.last_login = timezone.now()
+    await user.asave(update_fields=["last_login"])
+
+    return JWTAuthResponseSchema(
+        success=True,
+        message="Login realizado com sucesso",
+        access_token=access_token,
+        expires_in=86400,  # 24 horas em segundos
+        user=UserResponseSchema.from_orm(user),
+        redirect_url=redirect_url
+    )
+
+
+# As migrations do schema do novo tenant ficam fora do orçamento (Client.create_schema)
+@router.post("/register-jwt", response=JWTAuthResponseSchema)
+@idempotent()
+@query_budget(5)
+@query_timeout(statement_timeout_ms=0, lock_timeout_ms=0)  # cria e migra o schema
+async def register_jwt_endpoint_async(request, payload: RegisterSchema):
+    """Endpoint de registro JWT async (provisionamento do tenant em thread)"""
+    return await sync_to_async(register_jwt_endpoint)(request, payload)
+
+
+@router.get("/profile-jwt", response=UserResponseSchema, auth=jwt_auth)
+@query_budget(1)
+async def get_profile_jwt_async(request):
+    """Perfil do usuário logado via JWT"""
+    return UserResponseSchema.from_orm(request.auth)
+
+
+@router.get("/check-auth-jwt", response=dict, auth=jwt_auth)
+@query_budget(2)
+async def check_authentication_jwt_async(request):
+    """Verifica se o usuário está autenticado via JWT"""
+    user = request.auth
+
+    response_data = {
+        "is_authenticated": True,
+        "user": UserResponseSchema.from_orm(user).dict()
+    }
+
+    if user.tenant:
+        response_data["tenant_info"] = tenant_info(
+            user, await aget_tenant_redirect_url(user, for_api=True)
+        )
+
+    return response_data
+
+
+@router.get("/tenant-info-jwt", response=dict, auth=jwt_auth)
+@query_budget(2)
+async def get_tenant_info_jwt_async(request):
+    """Informações do tenant atual via JWT"""
+    user = request.auth
+
+    if not user.tenant:
+        return {
+            "has_tenant": False,
+            "message": "Usuário não possui tenant associado"
+        }
+
+    info = tenant_info(user, await aget_tenant_redirect_url(user, for_api=True))
+    info["created_on"] = user.tenant.created_on
+    return {"has_tenant": True, "tenant": info}
+
+
+@router.post("/logout-jwt", response=dict)
+@query_budget(0)
+async def logout_jwt_endpoint_async(request):
+    """Logout JWT (stateless - apenas informativo)"""
+    return {
+        "success": True,
+        "message": "Logout realizado com sucesso"
+    }
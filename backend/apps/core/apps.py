@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.core'
+
+    def ready(self):
+        # Conecta os signals que invalidam o cache hostname -> tenant
+        from . import tenant_cache  # noqa: F401
+        from .routers import check_sticky_cache
+        check_sticky_cache()
@@ -0,0 +1,14 @@
+"""
+Inicialização dos processos de hash de apps.core.user_import.
+
+Fica em um módulo separado, sem importar models: o initializer é importado
+pelo processo novo antes do django.setup().
+"""
+import django
+from django.conf import settings
+
+
+def init(password_hashers):
+    django.setup()
+    # Mesmos hashers do processo que importa (ex.: MD5 nos testes)
+    settings.PASSWORD_HASHERS = password_hashers
@@ -0,0 +1,230 @@
+"""
+Pool dedicado e limitado para hash/verificação de senhas.
+
+O PBKDF2 ocupa a CPU por dezenas de milissegundos por chamada; rodando direto
+na view, uma rajada de logins prende todos os workers e atrasa as leituras de
+projetos. Aqui o hash roda em um ThreadPoolExecutor próprio (o hashlib libera
+o GIL) com uma fila de tamanho fixo: quando ela enche, a requisição falha na
+hora com HashingPoolSaturated (503 + Retry-After) em vez de enfileirar.
+
+O pool nunca acessa o banco: o usuário é buscado na thread da requisição e só
+a comparação/geração do hash vai para o pool.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, identify_hasher, make_password
+
+from . import metrics
+from .models import User
+
+
+class HashingPoolSaturated(Exception):
+    """Fila do pool de hashing cheia (ou tempo de espera esgotado)"""
+
+    def __init__(self, retry_after):
+        super().__init__("Serviço de autenticação sobrecarregado, tente novamente")
+        self.retry_after = retry_after
+
+
+class CredentialHasher:
+    """
+    Executor limitado: no máximo `workers` hashes em paralelo e `queue_size`
+    aguardando. Expõe profundidade da fila, rejeições e latências.
+    """
+
+    def __init__(self, workers=4, queue_size=32, timeout=5.0, retry_after=1):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='credential-hasher')
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.running = 0
+        self.rejected = 0
+        self.hash_latency = metrics.LatencyWindow()
+        self.queue_wait = metrics.LatencyWindow()
+
+    def submit(self, fn, *args):
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.rejected += 1
+            raise HashingPoolSaturated(self.retry_after)
+
+        with self.lock:
+            self.pending += 1
+        try:
+            future = self.executor.submit(self._call, time.perf_counter(), fn, *args)
+        except BaseException:
+            self._release(started=False)
+            raise
+        # Cancelado antes de rodar (timeout do chamador): devolve a vaga
+        future.add_done_callback(lambda f: f.cancelled() and self._release(started=False))
+        return future
+
+    def _call(self, submitted_at, fn, *args):
+        self.queue_wait.observe(time.perf_counter() - submitted_at)
+        with self.lock:
+            self.pending -= 1
+            self.running += 1
+        try:
+            with metrics.Timer(self.hash_latency):
+                return fn(*args)
+        finally:
+            self._release(started=True)
+
+    def _release(self, started):
+        with self.lock:
+            if started:
+                self.running -= 1
+            else:
+                self.pending -= 1
+        self.slots.release()
+
+    def run(self, fn, *args):
+        """Executa `fn(*args)` no pool e aguarda o resultado"""
+        future = self.submit(fn, *args)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise HashingPoolSaturated(self.retry_after)
+
+    async def arun(self, fn, *args):
+        """Versão async de run(): aguarda sem bloquear o event loop"""
+        future = self.submit(fn, *args)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            raise HashingPoolSaturated(self.retry_after)
+
+    def snapshot(self):
+        with self.lock:
+            state = {
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'queue_depth': self.pending,
+                'running': self.running,
+                'rejected': self.rejected,
+            }
+        state['hash_latency'] = self.hash_latency.snapshot()
+        state['queue_wait'] = self.queue_wait.snapshot()
+        return state
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+_hasher = None
+_hasher_lock = threading.Lock()
+
+
+def get_hasher():
+    """Pool do processo, criado na primeira utilização"""
+    global _hasher
+    if _hasher is None:
+        with _hasher_lock:
+            if _hasher is None:
+                _hasher = CredentialHasher(
+                    workers=settings.HASHING_POOL_WORKERS,
+                    queue_size=settings.HASHING_POOL_QUEUE_SIZE,
+                    timeout=settings.HASHING_POOL_TIMEOUT,
+                    retry_after=settings.HASHING_POOL_RETRY_AFTER,
+                )
+    return _hasher
+
+
+metrics.register('credential_hashing', lambda: get_hasher().snapshot())
+
+
+def _verify(user, password):
+    """
+    (senha confere, hash atualizado ou None). Roda no pool; não toca no banco,
+    então o rehash (mudança de algoritmo/iterações) é salvo pelo chamador.
+    """
+    if not check_password(password, user.password):
+        return False, None
+    try:
+        must_update = identify_hasher(user.password).must_update(user.password)
+    except ValueError:
+        must_update = False
+    return True, make_password(password) if must_update else None
+
+
+def _can_authenticate(user):
+    # Usuários de tenants desativados (offboarding) não entram mais
+    return user is not None and user.is_active and not (user.tenant and user.tenant.is_disabled)
+
+
+def authenticate_credentials(username, password):
+    """
+    Equivalente ao authenticate() do ModelBackend com o hash no pool. Retorna
+    o usuário (com tenant carregado) ou None.
+    """
+    hasher = get_hasher()
+    user = User.objects.select_related('tenant').filter(username=username).first()
+    if user is None:
+        # Mesmo custo para usuário inexistente (evita enumeração por tempo)
+        hasher.run(make_password, password)
+        return None
+
+    valid, new_hash = hasher.run(_verify, user, password)
+    if not valid or not _can_authenticate(user):
+        return None
+    if new_hash:
+        user.password = new_hash
+        user.save(update_fields=['password'])
+    user.backend = 'django.contrib.auth.backends.ModelBackend'
+    return user
+
+
+async def aauthenticate_credentials(username, password):
+    """Versão async de authenticate_credentials"""
+    hasher = get_hasher()
+    user = await User.objects.select_related('tenant').filter(username=username).afirst()
+    if user is None:
+        await hasher.arun(make_password, password)
+        return None
+
+    valid, new_hash = await hasher.arun(_verify, user, password)
+    if not valid or not _can_authenticate(user):
+        return None
+    if new_hash:
+        user.password = new_hash
+        await user.asave(update_fields=['password'])
+    user.backend = 'django.contrib.auth.backends.ModelBackend'
+    return user
+
+
+def hash_password(password):
+    """make_password no pool"""
+    return get_hasher().run(make_password, password)
+
+
+def build_user(username, email, password, **extra_fields):
+    """
+    Usuário ainda não salvo, com o hash da senha feito no pool (fora de
+    qualquer transação).
+    """
+    user = User(
+        username=User.normalize_username(username),
+        email=User.objects.normalize_email(email),
+        **extra_fields
+    )
+    user.password = hash_password(password)
+    return user
+
+
+def create_user(username, email, password, **extra_fields):
+    """
+    Equivalente a User.objects.create_user com o hash da senha no pool.
+    """
+    user = build_user(username, email, password, **extra_fields)
+    user.save()
+    return user
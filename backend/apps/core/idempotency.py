@@ -0,0 +1,253 @@
+"""
+Idempotency-Key nos endpoints de escrita da API (Django Ninja).
+
+Um cliente que repete a mesma requisição (ex.: retry do app mobile depois de
+um timeout) com o mesmo header ``Idempotency-Key`` recebe a resposta gravada
+na primeira execução, sem que a view rode de novo:
+
+  * as respostas ficam em core_idempotencyrecord (schema public), por tenant
+    e chave, por IDEMPOTENCY_TTL segundos (``purge_idempotency_keys`` apaga
+    as expiradas);
+  * duplicatas simultâneas são serializadas por um advisory lock de sessão
+    na conexão default: a segunda espera a primeira terminar (até
+    IDEMPOTENCY_LOCK_TIMEOUT_MS, depois 409 + Retry-After) e devolve a
+    resposta gravada por ela;
+  * a mesma chave com outro corpo, caminho ou credencial é rejeitada com 422;
+  * erros 5xx e 429 não são gravados: o retry executa de novo.
+
+O advisory lock é de sessão, então pressupõe conexões diretas ou pool em
+modo sessão (com DB_TRANSACTION_POOLING o lock pode ficar em outra conexão
+do servidor).
+"""
+import hashlib
+import inspect
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from ninja.utils import contribute_operation_callback
+from psycopg2 import errorcodes
+
+from .models import IdempotencyRecord
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+NOT_STORED_STATUS = (429,)
+
+
+class KeyMismatch(Exception):
+    """A chave já foi usada com outra requisição"""
+
+
+class KeyLocked(Exception):
+    """Outra requisição com a mesma chave ainda está em andamento"""
+
+
+def fingerprint(request):
+    digest = hashlib.sha256()
+    for part in (request.method, request.get_full_path(), request.headers.get('Authorization', '')):
+        digest.update(part.encode())
+        digest.update(b'\0')
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def lookup(tenant_id, key, request_fingerprint):
+    """Resposta gravada para a chave (None se não houver ou se expirou)"""
+    record = (
+        IdempotencyRecord.objects.using(DEFAULT_DB_ALIAS)
+        .filter(tenant_id=tenant_id, key=key, expires_at__gt=timezone.now())
+        .first()
+    )
+    if record is None:
+        return None
+    if record.fingerprint != request_fingerprint:
+        raise KeyMismatch(key)
+
+    response = HttpResponse(bytes(record.body), status=record.status_code, content_type=record.content_type)
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def store(tenant_id, key, request_fingerprint, response, ttl):
+    if response.streaming or response.status_code >= 500 or response.status_code in NOT_STORED_STATUS:
+        return
+    now = timezone.now()
+    # Upsert: substitui um registro expirado ainda não removido
+    IdempotencyRecord.objects.using(DEFAULT_DB_ALIAS).bulk_create(
+        [IdempotencyRecord(
+            tenant_id=tenant_id,
+            key=key,
+            fingerprint=request_fingerprint,
+            status_code=response.status_code,
+            content_type=response.get('Content-Type', ''),
+            body=response.content,
+            created_at=now,
+            expires_at=now + timedelta(seconds=ttl),
+        )],
+        update_conflicts=True,
+        unique_fields=['tenant', 'key'],
+        update_fields=['fingerprint', 'status_code', 'content_type', 'body', 'created_at', 'expires_at'],
+    )
+
+
+def lock_name(tenant_id, key):
+    return f'idempotency:{tenant_id}:{key}'
+
+
+def acquire(tenant_id, key, timeout_ms):
+    """Advisory lock de sessão da chave, esperando no máximo timeout_ms"""
+    try:
+        with transaction.atomic(using=DEFAULT_DB_ALIAS), connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+            cursor.execute(f'SET LOCAL lock_timeout = {int(timeout_ms)}')
+            cursor.execute('SELECT pg_advisory_lock(hashtextextended(%s, 0))', [lock_name(tenant_id, key)])
+    except OperationalError as error:
+        if getattr(error.__cause__, 'pgcode', None) == errorcodes.LOCK_NOT_AVAILABLE:
+            raise KeyLocked(key) from error
+        raise
+
+
+def release(tenant_id, key):
+    with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_unlock(hashtextextended(%s, 0))', [lock_name(tenant_id, key)])
+
+
+def error_response(error):
+    if isinstance(error, KeyLocked):
+        response = JsonResponse(
+            {"error": f"Requisição com {HEADER} '{error}' ainda em andamento"}, status=409
+        )
+        response['Retry-After'] = str(settings.IDEMPOTENCY_RETRY_AFTER)
+        return response
+    return JsonResponse(
+        {"error": f"{HEADER} '{error}' já foi usada com outra requisição"}, status=422
+    )
+
+
+def request_key(request):
+    """(tenant_id, chave) da requisição, ou None se ela não usa idempotência"""
+    key = request.headers.get(HEADER)
+    tenant = getattr(request, 'tenant', None)
+    if not key or tenant is None:
+        return None
+    return tenant.pk, key
+
+
+def idempotent(ttl=None):
+    """
+    Aceita o header Idempotency-Key em uma operação Ninja.
+
+    Uso (abaixo do decorator do router e acima do @query_budget, que assim
+    conta só as queries da view):
+
+        @router.post("/projects", response=ProjectSchema, auth=jwt_auth)
+        @idempotent()
+        @query_budget(2)
+        def create_project(request, payload: ProjectCreateSchema):
+            ...
+    """
+    def decorator(view_func):
+        def apply(operation):
+            operation.run = with_idempotency(operation.run)
+
+        if hasattr(view_func, '_ninja_operation'):
+            apply(view_func._ninja_operation)
+        else:
+            contribute_operation_callback(view_func, apply)
+
+        view_func.idempotent = True
+        return view_func
+
+    def with_idempotency(run):
+        if inspect.iscoroutinefunction(run):
+            # Lock, lookup e gravação na thread "thread sensitive" do
+            # sync_to_async, a mesma do ORM async da view: o advisory lock é
+            # liberado na conexão em que foi obtido.
+            async def async_wrapper(request, *args, **kwargs):
+                scope = request_key(request)
+                if scope is None:
+                    return await run(request, *args, **kwargs)
+                tenant_id, key = scope
+                if len(key) > MAX_KEY_LENGTH:
+                    return JsonResponse({"error": f"{HEADER} excede {MAX_KEY_LENGTH} caracteres"}, status=400)
+
+                request_fingerprint = await sync_to_async(fingerprint)(request)
+                try:
+                    replay = await sync_to_async(lookup)(tenant_id, key, request_fingerprint)
+                    if replay is not None:
+                        return replay
+                    await sync_to_async(acquire)(tenant_id, key, settings.IDEMPOTENCY_LOCK_TIMEOUT_MS)
+                except (KeyMismatch, KeyLocked) as error:
+                    return error_response(error)
+
+                try:
+                    try:
+                        replay = await sync_to_async(lookup)(tenant_id, key, request_fingerprint)
+                    except KeyMismatch as error:
+                        return error_response(error)
+                    if replay is not None:
+                        return replay
+
+                    response = await run(request, *args, **kwargs)
+                    await sync_to_async(store)(
+                        tenant_id, key, request_fingerprint, response, ttl or settings.IDEMPOTENCY_TTL
+                    )
+                    return response
+                finally:
+                    await sync_to_async(release)(tenant_id, key)
+
+            return async_wrapper
+
+        def wrapper(request, *args, **kwargs):
+            scope = request_key(request)
+            if scope is None:
+                return run(request, *args, **kwargs)
+            tenant_id, key = scope
+            if len(key) > MAX_KEY_LENGTH:
+                return JsonResponse({"error": f"{HEADER} excede {MAX_KEY_LENGTH} caracteres"}, status=400)
+
+            request_fingerprint = fingerprint(request)
+            try:
+                replay = lookup(tenant_id, key, request_fingerprint)
+                if replay is not None:
+                    return replay
+                acquire(tenant_id, key, settings.IDEMPOTENCY_LOCK_TIMEOUT_MS)
+            except (KeyMismatch, KeyLocked) as error:
+                return error_response(error)
+
+            try:
+                # Uma duplicata simultânea pode ter terminado enquanto esperávamos
+                try:
+                    replay = lookup(tenant_id, key, request_fingerprint)
+                except KeyMismatch as error:
+                    return error_response(error)
+                if replay is not None:
+                    return replay
+
+                response = run(request, *args, **kwargs)
+                store(tenant_id, key, request_fingerprint, response, ttl or settings.IDEMPOTENCY_TTL)
+                return response
+            finally:
+                release(tenant_id, key)
+
+        return wrapper
+
+    return decorator
+
+
+def purge_expired(batch_size=10000):
+    """Remove as respostas expiradas em lotes; retorna o total removido"""
+    deleted = 0
+    while True:
+        ids = list(
+            IdempotencyRecord.objects.using(DEFAULT_DB_ALIAS)
+            .filter(expires_at__lte=timezone.now())
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        deleted += IdempotencyRecord.objects.using(DEFAULT_DB_ALIAS).filter(pk__in=ids).delete()[0]
@@ -47,6 +47,24 @@ def get_user_from_jwt_token(token):
     except User.DoesNotExist:
         return None
 
+async def aget_user_from_jwt_token(token):
+    """Versão assíncrona de get_user_from_jwt_token (ORM async)"""
+    payload = decode_jwt_token(token)
+
+    if not payload:
+        return None
+
+    try:
+        user = await User.objects.select_related('tenant').aget(id=payload['user_id'])
+    except User.DoesNotExist:
+        return None
+
+    # Verificar se o usuário tem tenant
+    if not user.tenant:
+        return None
+
+    return user
+
 class JWTAuth:
     """Classe para autenticação JWT com Django Ninja"""
     
@@ -56,6 +74,15 @@ class JWTAuth:
     
     def __call__(self, request):
         """Método chamado pelo Django Ninja para autenticação"""
+        token = self.get_token(request)
+        if not token:
+            return None
+        
+        user = self.authenticate(request, token)
+        return user
+    
+    def get_token(self, request):
+        """Extrai o token do header de autorização (None se ausente/inválido)"""
         
         # Obter o token do header - Django usa HTTP_AUTHORIZATION
         auth_header = request.META.get('HTTP_AUTHORIZATION')
@@ -72,10 +99,7 @@ class JWTAuth:
             return None
         
         # Extrair o token
-        token = auth_header[len(f'{self.prefix} '):] if self.prefix else auth_header
-        
-        user = self.authenticate(request, token)
-        return user
+        return auth_header[len(f'{self.prefix} '):] if self.prefix else auth_header
     
     def authenticate(self, request, token):
         """Autentica a requisição usando o token JWT"""
@@ -84,3 +108,30 @@ class JWTAuth:
         
         user = get_user_from_jwt_token(token)
         return user
+
+
+class AsyncJWTAuth(JWTAuth):
+    """Autenticação JWT para as operações async do Django Ninja"""
+
+    async def __call__(self, request):
+        token = self.get_token(request)
+        if not token:
+            return None
+
+        return await self.authenticate(request, token)
+
+    async def authenticate(self, request, token):
+        if not token:
+            return None
+
+        return await aget_user_from_jwt_token(token)
+
+
+class AsyncJWTQueryAuth(AsyncJWTAuth):
+    """
+    Aceita também o token em ?token= (o EventSource do navegador não envia
+    headers personalizados)
+    """
+
+    def get_token(self, request):
+        return super().get_token(request) or request.GET.get('token')
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.models import Client
+from apps.core.sharding import for_each_tenant
+
+
+class Command(BaseCommand):
+    help = (
+        "Move os projetos concluídos há mais de archive_completed_after_days "
+        "dias (padrão ARCHIVE_COMPLETED_AFTER_DAYS) e as tarefas deles para as "
+        "tabelas de arquivo, em lotes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', action='append', dest='schemas',
+                            help='Schema do tenant (pode repetir; padrão: todos)')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Projetos por lote (cada lote é uma transação; padrão: ARCHIVE_BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        from apps.tasks.archive import archive_projects
+
+        tenants = (
+            Client.objects.exclude(schema_name='public').filter(disabled_at__isnull=True).order_by('schema_name')
+        )
+        if options['schemas']:
+            tenants = tenants.filter(schema_name__in=options['schemas'])
+            missing = set(options['schemas']) - {tenant.schema_name for tenant in tenants}
+            if missing:
+                raise CommandError(f"Tenants não encontrados: {', '.join(sorted(missing))}")
+
+        started = time.monotonic()
+        results = for_each_tenant(
+            lambda tenant: archive_projects(tenant, batch_size=options['batch_size']), tenants,
+        )
+        projects = tasks = 0
+        for schema_name, result in sorted(results.items()):
+            if result['projects']:
+                self.stdout.write(f"{schema_name}: {result['projects']} projetos, {result['tasks']} tarefas")
+            projects += result['projects']
+            tasks += result['tasks']
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{projects} projetos e {tasks} tarefas arquivados em {len(results)} tenants, '
+            f'em {time.monotonic() - started:.1f}s'
+        ))
@@ -0,0 +1,31 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.openapi import build_schema, schema_etag, write_schema
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera o schema OpenAPI da API e grava em OPENAPI_SCHEMA_PATH, servido "
+        "com ETag em /api/openapi.json (rodar no build/deploy)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Arquivo de saída (padrão: OPENAPI_SCHEMA_PATH)')
+        parser.add_argument('--check', action='store_true',
+                            help='Não grava; falha se o arquivo estiver desatualizado (CI)')
+
+    def handle(self, *args, **options):
+        path = Path(options['output'] or settings.OPENAPI_SCHEMA_PATH)
+        if options['check']:
+            if not path.exists() or path.read_bytes() != build_schema():
+                raise CommandError(f'{path} desatualizado; rode "python manage.py build_openapi"')
+            self.stdout.write(self.style.SUCCESS(f'{path} em dia'))
+            return
+
+        path, body = write_schema(path)
+        self.stdout.write(self.style.SUCCESS(
+            f'{path}: {len(body)} bytes, ETag "{schema_etag(body)}"'
+        ))
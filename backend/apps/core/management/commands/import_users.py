@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.models import Client
+from apps.core.user_import import FORMATS, import_users
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa usuários em massa para um tenant a partir de um CSV (com "
+        "cabeçalho) ou JSONL: hash das senhas em processos paralelos e "
+        "bulk_create por lote, com os erros reportados por linha"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('schema_name', help='Schema do tenant')
+        parser.add_argument('path', help='Arquivo CSV ou JSONL')
+        parser.add_argument('--format', choices=FORMATS, help='Padrão: pela extensão do arquivo')
+        parser.add_argument('--chunk-size', type=int, help='Linhas por lote (padrão: USER_IMPORT_CHUNK_SIZE)')
+
+    def handle(self, *args, **options):
+        tenant = Client.objects.filter(schema_name=options['schema_name']).first()
+        if tenant is None:
+            raise CommandError(f"Tenant não encontrado: {options['schema_name']}")
+        if tenant.is_disabled:
+            raise CommandError(f"Tenant desativado: {tenant.schema_name}")
+
+        fmt = options['format'] or ('jsonl' if options['path'].endswith(('.jsonl', '.ndjson')) else 'csv')
+        with open(options['path'], encoding='utf-8-sig', newline='') as lines:
+            for progress in import_users(tenant, lines, fmt, options['chunk_size']):
+                for error in progress.get('errors', ()):
+                    self.stderr.write(f"linha {error['line']} ({error['username'] or '-'}): {error['error']}")
+                if progress.get('error'):
+                    raise CommandError(progress['error'])
+                if progress['done']:
+                    break
+                self.stdout.write(
+                    f"{progress['processed']} linhas processadas, {progress['created']} usuários criados, "
+                    f"{progress['failed']} com erro"
+                )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Importação concluída em {tenant.schema_name}: {progress['created']} usuários criados, "
+            f"{progress['failed']} linhas com erro"
+        ))
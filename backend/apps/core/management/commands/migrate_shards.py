@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.sharding import migrate_shard, shard_aliases
+
+
+class Command(BaseCommand):
+    help = (
+        "Aplica as migrations no schema public e nos schemas de tenant de cada "
+        "shard. Com shards configurados, substitui o migrate_schemas (que só "
+        "conhece o banco default)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shard', action='append', help='Shard a migrar (padrão: todos)')
+
+    def handle(self, *args, **options):
+        aliases = options['shard'] or shard_aliases()
+        for alias in aliases:
+            self.stdout.write(f'Migrando shard {alias}')
+            try:
+                migrate_shard(alias, verbosity=options['verbosity'])
+            except ValueError as error:
+                raise CommandError(str(error))
+        self.stdout.write(self.style.SUCCESS(f'{len(aliases)} shards migrados'))
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.models import Client
+from apps.core.sharding import move_tenant
+
+
+class Command(BaseCommand):
+    help = (
+        "Move o schema de um tenant para outro shard. As leituras continuam "
+        "durante toda a cópia; as escritas ficam congeladas (503) só durante o "
+        "período de carência e a cópia do delta final"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('schema_name', help='Schema do tenant')
+        parser.add_argument('target', help='Alias do shard de destino')
+        parser.add_argument('--grace', type=float, default=2.0,
+                            help='Segundos de espera pelas escritas em andamento após o congelamento')
+        parser.add_argument('--skew', type=float, default=60.0,
+                            help='Margem (s) para transações longas na seleção do delta por archived_at')
+        parser.add_argument('--keep-source', action='store_true', help='Não remove o schema de origem')
+
+    def handle(self, *args, **options):
+        try:
+            tenant = Client.objects.get(schema_name=options['schema_name'])
+        except Client.DoesNotExist:
+            raise CommandError(f"Tenant '{options['schema_name']}' não encontrado")
+
+        started = time.monotonic()
+        source = tenant.shard
+        try:
+            move_tenant(
+                tenant,
+                options['target'],
+                grace=options['grace'],
+                clock_skew=options['skew'],
+                keep_source=options['keep_source'],
+                log=self.stdout.write,
+            )
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{tenant.schema_name} movido de {source} para {tenant.shard} em {time.monotonic() - started:.1f}s'
+        ))
@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.models import Client
+from apps.core.offboarding import offboard_tenant, pending_offboardings
+
+
+class Command(BaseCommand):
+    help = (
+        "Desativa um tenant (410 imediato), arquiva os dados em .tar.gz e "
+        "remove tabelas/linhas em transações curtas com lock_timeout. "
+        "Retomável; com --pending processa a fila (ex.: via cron)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('schema_name', nargs='?', help='Schema do tenant')
+        parser.add_argument('--pending', action='store_true',
+                            help='Processa os tenants desativados com offboarding pendente ou com falha')
+        parser.add_argument('--status', action='store_true', help='Mostra o andamento e sai')
+        parser.add_argument('--archive-dir', help='Diretório dos arquivos (padrão: OFFBOARDING_ARCHIVE_DIR)')
+        parser.add_argument('--chunk-size', type=int, help='Linhas por DELETE nas tabelas compartilhadas')
+        parser.add_argument('--lock-timeout', type=int, help='lock_timeout (ms) de cada DROP/DELETE')
+
+    def handle(self, *args, **options):
+        if options['status']:
+            tenants = Client.objects.filter(disabled_at__isnull=False).order_by('disabled_at')
+            for tenant in tenants:
+                progress = tenant.offboarding_progress
+                self.stdout.write(
+                    f"{tenant.schema_name}: {tenant.offboarding_state or '-'} "
+                    f"(tabelas {progress.get('dropped_tables', 0)}/{progress.get('tables_total', '?')}, "
+                    f"linhas arquivadas {progress.get('archived_rows', 0)})"
+                    + (f" erro: {progress['error']}" if progress.get('error') else '')
+                )
+            return
+
+        if options['pending']:
+            tenants = list(pending_offboardings())
+        elif options['schema_name']:
+            try:
+                tenants = [Client.objects.get(schema_name=options['schema_name'])]
+            except Client.DoesNotExist:
+                raise CommandError(f"Tenant '{options['schema_name']}' não encontrado")
+        else:
+            raise CommandError('Informe o schema do tenant, --pending ou --status')
+
+        for tenant in tenants:
+            started = time.monotonic()
+            try:
+                offboard_tenant(
+                    tenant,
+                    archive_dir=options['archive_dir'],
+                    chunk_size=options['chunk_size'],
+                    lock_timeout=options['lock_timeout'],
+                    log=self.stdout.write,
+                )
+            except ValueError as error:
+                raise CommandError(str(error))
+            self.stdout.write(self.style.SUCCESS(
+                f"{tenant.schema_name} removido em {time.monotonic() - started:.1f}s "
+                f"(arquivo: {tenant.offboarding_progress.get('archive')})"
+            ))
@@ -0,0 +1,83 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Roda em um processo novo (cold start de um worker): django.setup() e a
+# carga do URLconf, que importa os routers da API
+STARTUP_SCRIPT = """
+import json, time
+started = time.perf_counter()
+import django
+django.setup()
+setup_done = time.perf_counter()
+from django.conf import settings
+from django.urls import get_resolver
+get_resolver(settings.ROOT_URLCONF).url_patterns
+urlconf_done = time.perf_counter()
+print(json.dumps({
+    'setup_ms': (setup_done - started) * 1000,
+    'urlconf_ms': (urlconf_done - setup_done) * 1000,
+}))
+"""
+
+PROJECT_PREFIXES = ('apps.', 'project.')
+
+
+def parse_importtime(output):
+    """[(módulo, self_us, cumulative_us)] das linhas do python -X importtime"""
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len('import time:'):].split('|'))
+        if not self_us.isdigit():
+            continue  # cabeçalho
+        imports.append((name, int(self_us), int(cumulative_us)))
+    return imports
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede o cold start de um worker: tempo de django.setup() e da carga do "
+        "URLconf em um processo novo, com os imports mais caros (python -X importtime)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=15, help='Módulos listados em cada ranking')
+        parser.add_argument('--max-ms', type=float,
+                            help='Falha se setup + URLconf passar deste tempo (ex.: no CI)')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'project.settings'))
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(f'Falha ao iniciar o Django:\n{result.stderr[-2000:]}')
+
+        timings = json.loads(result.stdout.strip().splitlines()[-1])
+        imports = parse_importtime(result.stderr)
+        limit = options['limit']
+        # Os tempos incluem o custo do próprio -X importtime
+        total_ms = timings['setup_ms'] + timings['urlconf_ms']
+        self.stdout.write(
+            f"django.setup(): {timings['setup_ms']:.1f} ms | URLconf: {timings['urlconf_ms']:.1f} ms | "
+            f"total: {total_ms:.1f} ms ({len(imports)} módulos importados)"
+        )
+
+        self.stdout.write('\nImports mais caros (tempo próprio):')
+        for name, self_us, cumulative_us in sorted(imports, key=lambda item: -item[1])[:limit]:
+            self.stdout.write(f'  {self_us / 1000:8.1f} ms  {name}')
+
+        self.stdout.write('\nMódulos do projeto (tempo acumulado):')
+        project = [item for item in imports if item[0].startswith(PROJECT_PREFIXES)]
+        for name, self_us, cumulative_us in sorted(project, key=lambda item: -item[2])[:limit]:
+            self.stdout.write(f'  {cumulative_us / 1000:8.1f} ms  {name}')
+
+        if options['max_ms'] is not None and total_ms > options['max_ms']:
+            raise CommandError(f"Cold start de {total_ms:.1f} ms acima do limite de {options['max_ms']:.1f} ms")
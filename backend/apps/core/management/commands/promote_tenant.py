@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.models import Client
+from apps.core.tenancy import promote_tenant
+
+
+class Command(BaseCommand):
+    help = (
+        "Promove um tenant em modo compartilhado para um schema próprio. As "
+        "escritas do tenant ficam congeladas (503) durante a cópia"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('schema_name', help='Schema do tenant')
+        parser.add_argument('--grace', type=float, default=2.0,
+                            help='Segundos de espera pelas escritas em andamento após o congelamento')
+
+    def handle(self, *args, **options):
+        try:
+            tenant = Client.objects.get(schema_name=options['schema_name'])
+        except Client.DoesNotExist:
+            raise CommandError(f"Tenant '{options['schema_name']}' não encontrado")
+
+        started = time.monotonic()
+        try:
+            promote_tenant(tenant, grace=options['grace'], log=self.stdout.write)
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{tenant.schema_name} promovido para schema próprio em {time.monotonic() - started:.1f}s'
+        ))
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.models import Client
+from apps.core.sharding import for_each_tenant
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula os contadores denormalizados (Project.task_count e "
+        "TenantStats) e corrige as divergências, em lotes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', action='append', dest='schemas',
+                            help='Schema do tenant (pode repetir; padrão: todos)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Projetos por lote (cada lote é uma transação)')
+
+    def handle(self, *args, **options):
+        from apps.tasks.stats import reconcile
+
+        tenants = (
+            Client.objects.exclude(schema_name='public').filter(disabled_at__isnull=True).order_by('schema_name')
+        )
+        if options['schemas']:
+            tenants = tenants.filter(schema_name__in=options['schemas'])
+            missing = set(options['schemas']) - {tenant.schema_name for tenant in tenants}
+            if missing:
+                raise CommandError(f"Tenants não encontrados: {', '.join(sorted(missing))}")
+
+        started = time.monotonic()
+        results = for_each_tenant(lambda tenant: reconcile(tenant, options['batch_size']), tenants)
+        drifted = 0
+        for schema_name, result in sorted(results.items()):
+            if result['projects_fixed'] or result['totals_fixed']:
+                drifted += 1
+                self.stdout.write(
+                    f"{schema_name}: {result['projects_fixed']} projetos corrigidos"
+                    + (', totais do tenant corrigidos' if result['totals_fixed'] else '')
+                )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(results)} tenants verificados, {drifted} com divergência, '
+            f'em {time.monotonic() - started:.1f}s'
+        ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.warmup import STEPS, warm_up
+
+
+class Command(BaseCommand):
+    help = (
+        "Roda o warm-up dos workers (cache de tenants, conexões, templates e "
+        "schema OpenAPI) e mostra o tempo de cada etapa; falha se alguma etapa "
+        "falhar (ex.: verificação no deploy)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--step', action='append', choices=[name for name, _ in STEPS], dest='steps',
+                            help='Roda só esta etapa (pode repetir)')
+
+    def handle(self, *args, **options):
+        report = warm_up(options['steps'])
+        for name, step in report.items():
+            if step['ok']:
+                self.stdout.write(f"{name}: {step['result']} ({step['ms']} ms)")
+            else:
+                self.stderr.write(self.style.ERROR(f"{name}: {step['error']} ({step['ms']} ms)"))
+
+        failed = [name for name, step in report.items() if not step['ok']]
+        if failed:
+            raise CommandError(f"Warm-up falhou: {', '.join(failed)}")
+        self.stdout.write(self.style.SUCCESS('Warm-up concluído'))
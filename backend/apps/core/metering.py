@@ -0,0 +1,293 @@
+"""
+Medição de consumo por tenant (cobrança e planejamento de capacidade).
+
+O UsageMeteringMiddleware mede cada requisição de tenant - requisições,
+tempo no banco, linhas lidas/escritas (rowcount de cada statement, em todas
+as conexões: principal, réplica e shards) e bytes de resposta - e soma em
+memória, por (tenant, intervalo de METERING_BUCKET_SECONDS). Uma thread do
+processo grava o acumulado a cada METERING_FLUSH_INTERVAL segundos com um
+único INSERT ... ON CONFLICT DO UPDATE em core_tenantusage (schema public),
+então o custo no banco independe do número de requisições.
+
+Se a gravação falhar, o acumulado volta para a memória e vai no próximo
+flush. O que estiver em memória quando o processo morrer sem atexit se perde:
+a medição é para cobrança/capacidade, não auditoria.
+
+Consulta: GET /api/metering/top?metric=db_time_ms&hours=24&limit=10
+"""
+import atexit
+import logging
+import threading
+import time
+from contextlib import ExitStack
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Sum
+from django.utils import timezone as django_timezone
+from django_tenants.utils import get_public_schema_name
+from ninja import Router
+from psycopg2.extras import execute_values
+
+from . import metrics
+from .models import TenantUsage
+from .query_budget import query_budget
+
+logger = logging.getLogger(__name__)
+
+router = Router(tags=["Metering"])
+
+METRICS = ('requests', 'db_time_ms', 'rows_read', 'rows_written', 'bytes_out')
+READ_STATEMENTS = ('SELECT', 'WITH')
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'COPY')
+
+
+def bucket_start(timestamp, bucket_seconds):
+    return int(timestamp // bucket_seconds * bucket_seconds)
+
+
+class UsageMeter:
+    """Acumulador do processo: {(tenant_id, bucket): [requests, db_time_ms, ...]}"""
+
+    def __init__(self, bucket_seconds=300, flush_interval=10.0):
+        self.bucket_seconds = bucket_seconds
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.flushes = 0
+        self.failures = 0
+        self.rows_flushed = 0
+        self.last_flush_ms = 0.0
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def record(self, tenant_id, requests=0, db_time_ms=0.0, rows_read=0, rows_written=0, bytes_out=0, now=None):
+        key = (tenant_id, bucket_start(now if now is not None else time.time(), self.bucket_seconds))
+        with self.lock:
+            totals = self.pending.get(key)
+            if totals is None:
+                totals = self.pending[key] = [0, 0.0, 0, 0, 0]
+            totals[0] += requests
+            totals[1] += db_time_ms
+            totals[2] += rows_read
+            totals[3] += rows_written
+            totals[4] += bytes_out
+        self.ensure_started()
+
+    def merge(self, entries):
+        with self.lock:
+            for key, values in entries.items():
+                totals = self.pending.setdefault(key, [0, 0.0, 0, 0, 0])
+                for index, value in enumerate(values):
+                    totals[index] += value
+
+    def flush(self):
+        """Grava o acumulado em um único INSERT ... ON CONFLICT; retorna o número de linhas"""
+        with self.lock:
+            entries, self.pending = self.pending, {}
+        if not entries:
+            return 0
+
+        started = time.perf_counter()
+        rows = [
+            (tenant_id, datetime.fromtimestamp(bucket, tz=timezone.utc), *values)
+            for (tenant_id, bucket), values in entries.items()
+        ]
+        table = f'"{get_public_schema_name()}"."{TenantUsage._meta.db_table}"'
+        updates = ', '.join(f'{column} = usage.{column} + EXCLUDED.{column}' for column in METRICS)
+        try:
+            with connections['default'].cursor() as cursor:
+                execute_values(
+                    cursor.cursor,
+                    f'INSERT INTO {table} AS usage (tenant_id, bucket, {", ".join(METRICS)}) VALUES %s '
+                    f'ON CONFLICT (tenant_id, bucket) DO UPDATE SET {updates}',
+                    rows,
+                    page_size=len(rows),
+                )
+        except Exception:
+            self.failures += 1
+            self.merge(entries)
+            logger.exception('Falha ao gravar o consumo dos tenants; mantido em memória para o próximo flush')
+            return 0
+
+        self.flushes += 1
+        self.rows_flushed += len(rows)
+        self.last_flush_ms = (time.perf_counter() - started) * 1000
+        return len(rows)
+
+    def ensure_started(self):
+        if self.thread is not None or not self.flush_interval:
+            return
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self.run, name='usage-meter', daemon=True)
+        self.thread.start()
+        atexit.register(self.stop)
+
+    def run(self):
+        while not self.stopped.wait(self.flush_interval):
+            self.flush()
+        connections['default'].close()
+
+    def stop(self):
+        self.stopped.set()
+        self.flush()
+
+    def snapshot(self):
+        with self.lock:
+            pending = len(self.pending)
+        return {
+            'pending_buckets': pending,
+            'flushes': self.flushes,
+            'failures': self.failures,
+            'rows_flushed': self.rows_flushed,
+            'last_flush_ms': round(self.last_flush_ms, 3),
+        }
+
+
+_meter = None
+_meter_lock = threading.Lock()
+
+
+def get_meter():
+    """Acumulador do processo, criado na primeira utilização"""
+    global _meter
+    if _meter is None:
+        with _meter_lock:
+            if _meter is None:
+                _meter = UsageMeter(
+                    bucket_seconds=settings.METERING_BUCKET_SECONDS,
+                    flush_interval=settings.METERING_FLUSH_INTERVAL,
+                )
+    return _meter
+
+
+metrics.register('metering', lambda: get_meter().snapshot())
+
+
+class RequestUsage:
+    """execute_wrapper que soma tempo e linhas das queries de uma requisição"""
+
+    def __init__(self):
+        self.db_time_ms = 0.0
+        self.rows_read = 0
+        self.rows_written = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time_ms += (time.perf_counter() - started) * 1000
+            rowcount = max(getattr(context['cursor'], 'rowcount', 0) or 0, 0)
+            statement = sql.lstrip()[:6].upper()
+            if statement.startswith(READ_STATEMENTS):
+                self.rows_read += rowcount
+            elif statement.startswith(WRITE_STATEMENTS):
+                self.rows_written += rowcount
+
+
+def count_bytes(content, on_done):
+    """Repassa o conteúdo de uma resposta streaming somando os bytes enviados"""
+    sent = 0
+    try:
+        for chunk in content:
+            sent += len(chunk)
+            yield chunk
+    finally:
+        on_done(sent)
+
+
+async def acount_bytes(content, on_done):
+    sent = 0
+    try:
+        async for chunk in content:
+            sent += len(chunk)
+            yield chunk
+    finally:
+        on_done(sent)
+
+
+class UsageMeteringMiddleware:
+    """
+    Deve ficar depois do TenantMainMiddleware (precisa de request.tenant).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        tenant = getattr(request, 'tenant', None)
+        if (
+            not settings.METERING_ENABLED
+            or tenant is None
+            or tenant.schema_name == get_public_schema_name()
+        ):
+            return self.get_response(request)
+
+        usage = RequestUsage()
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(usage))
+            response = self.get_response(request)
+
+        meter = get_meter()
+        tenant_id = tenant.pk
+        bytes_out = 0
+        if response.streaming:
+            # Os bytes do stream (ex.: SSE) só são conhecidos quando ele termina
+            def on_done(sent):
+                meter.record(tenant_id, bytes_out=sent)
+
+            wrap = acount_bytes if response.is_async else count_bytes
+            response.streaming_content = wrap(response.streaming_content, on_done)
+        else:
+            bytes_out = len(response.content)
+
+        meter.record(
+            tenant_id,
+            requests=1,
+            db_time_ms=usage.db_time_ms,
+            rows_read=usage.rows_read,
+            rows_written=usage.rows_written,
+            bytes_out=bytes_out,
+        )
+        return response
+
+
+def top_tenants(metric='requests', since=None, until=None, limit=10):
+    """Tenants com maior consumo de `metric` no intervalo [since, until)"""
+    until = until or django_timezone.now()
+    since = since or until - timedelta(hours=24)
+    return list(
+        TenantUsage.objects
+        .filter(bucket__gte=since, bucket__lt=until)
+        .values('tenant_id', 'tenant__schema_name', 'tenant__name')
+        .annotate(**{name: Sum(name) for name in METRICS})
+        .order_by(f'-{metric}', 'tenant_id')[:limit]
+    )
+
+
+@router.get("/metering/top", response={200: list[dict], 400: dict, 403: dict})
+@query_budget(1)
+def get_top_tenants(request, metric: str = 'requests', hours: float = 24, limit: int = 10,
+                    until: datetime = None):
+    """Ranking de tenants por consumo (requests, db_time_ms, rows_read, rows_written, bytes_out)"""
+    if not metrics.has_metrics_token(request):
+        return 403, {"error": "Token de métricas inválido"}
+    if metric not in METRICS:
+        return 400, {"error": f"Métrica inválida (use: {', '.join(METRICS)})"}
+
+    until = until or django_timezone.now()
+    rows = top_tenants(metric, until - timedelta(hours=hours), until, max(1, min(limit, 100)))
+    return [
+        {
+            'tenant_id': row['tenant_id'],
+            'schema_name': row['tenant__schema_name'],
+            'name': row['tenant__name'],
+            **{name: row[name] for name in METRICS},
+        }
+        for row in rows
+    ]
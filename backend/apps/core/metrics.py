@@ -0,0 +1,87 @@
+"""
+Registro de métricas em memória do processo, exposto em GET /api/metrics.
+
+Cada componente registra uma função que devolve um dict com o estado atual
+(ex.: o pool de hashing de senhas); o endpoint apenas junta os snapshots.
+
+Os endpoints de observabilidade (/api/metrics, /api/metering/top) só
+respondem com METRICS_TOKEN configurado e enviado no header X-Metrics-Token;
+sem token configurado ficam fechados (403).
+"""
+import hmac
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from ninja import Router
+
+from .query_budget import query_budget
+
+router = Router(tags=["Metrics"])
+
+_collectors = {}
+
+
+def register(name, collector):
+    """Registra `collector()` (retorna um dict) sob `name`"""
+    _collectors[name] = collector
+
+
+def has_metrics_token(request):
+    token = settings.METRICS_TOKEN
+    return bool(token) and hmac.compare_digest(request.headers.get('X-Metrics-Token', ''), token)
+
+
+def collect():
+    return {name: collector() for name, collector in _collectors.items()}
+
+
+class LatencyWindow:
+    """Janela com as últimas N latências (em segundos) para p50/p95/max"""
+
+    def __init__(self, size=1024):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+            self.count += 1
+
+    def snapshot(self):
+        with self.lock:
+            samples = sorted(self.samples)
+            count = self.count
+        if not samples:
+            return {'count': count, 'p50_ms': 0.0, 'p95_ms': 0.0, 'max_ms': 0.0}
+        return {
+            'count': count,
+            'p50_ms': round(samples[len(samples) // 2] * 1000, 3),
+            'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 3),
+            'max_ms': round(samples[-1] * 1000, 3),
+        }
+
+
+class Timer:
+    """Context manager que registra a duração do bloco em uma LatencyWindow"""
+
+    def __init__(self, window):
+        self.window = window
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.window.observe(time.perf_counter() - self.start)
+
+
+@router.get("/metrics", response={200: dict, 403: dict})
+@query_budget(0)
+def get_metrics(request):
+    """Métricas do processo (pools, filas, latências)"""
+    if not has_metrics_token(request):
+        return 403, {"error": "Token de métricas inválido"}
+    return collect()
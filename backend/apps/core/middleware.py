@@ -1,11 +1,37 @@
+import copy
+import logging
+
 from django.utils.deprecation import MiddlewareMixin
 from django.http import JsonResponse
+from django_tenants.middleware.main import TenantMainMiddleware
 from django_tenants.utils import get_tenant
 from django_tenants.models import TenantMixin
-import logging
+
+from .tenant_cache import current_generation, get_cache
 
 logger = logging.getLogger(__name__)
 
+
+class CachedTenantMainMiddleware(TenantMainMiddleware):
+    """
+    TenantMainMiddleware com o tenant de cada hostname em cache no processo
+    (apps.core.tenant_cache): sem a query de Domain + Client enquanto a
+    entrada vale. Com TENANT_CACHE_TTL=0 funciona como o original.
+    """
+
+    def get_tenant(self, domain_model, hostname):
+        tenant_cache = get_cache()
+        if tenant_cache.ttl <= 0:
+            return super().get_tenant(domain_model, hostname)
+
+        tenant_cache.sync_generation(current_generation())
+        tenant = tenant_cache.get(hostname)
+        if tenant is None:
+            tenant = super().get_tenant(domain_model, hostname)
+            tenant_cache.put(hostname, copy.copy(tenant))
+        return tenant
+
+
 class TenantSubdomainMiddleware(MiddlewareMixin):
     """
     Middleware para garantir que o tenant seja identificado corretamente pelo subdomínio
@@ -42,3 +68,46 @@ class TenantSubdomainMiddleware(MiddlewareMixin):
             response['X-Tenant-Host'] = getattr(request, 'tenant_host', 'unknown')
         
         return response
+
+
+class TenantWriteFreezeMiddleware(MiddlewareMixin):
+    """
+    Recusa com 503 as escritas de tenants com writes_frozen (ex.: durante a
+    migração entre shards). Leituras e login continuam funcionando.
+    """
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+    EXEMPT_PREFIXES = ('/api/auth/', '/api/async/auth/')
+    RETRY_AFTER = 5
+
+    def process_request(self, request):
+        tenant = getattr(request, 'tenant', None)
+        if (
+            tenant is None
+            or not getattr(tenant, 'writes_frozen', False)
+            or request.method in self.SAFE_METHODS
+            or request.path.startswith(self.EXEMPT_PREFIXES)
+        ):
+            return None
+
+        logger.info(f"🧊 TenantWriteFreezeMiddleware: Writes frozen for {tenant.schema_name}")
+        response = JsonResponse(
+            {"error": "Tenant temporariamente somente leitura, tente novamente em instantes"},
+            status=503,
+        )
+        response['Retry-After'] = str(self.RETRY_AFTER)
+        return response
+
+
+class TenantDisabledMiddleware(MiddlewareMixin):
+    """
+    Recusa com 410 as requisições de tenants desativados (offboarding), sem
+    nenhuma query: o Client já vem carregado pelo TenantMainMiddleware.
+    """
+
+    def process_request(self, request):
+        tenant = getattr(request, 'tenant', None)
+        if tenant is None or getattr(tenant, 'disabled_at', None) is None:
+            return None
+
+        logger.info(f"⛔ TenantDisabledMiddleware: Tenant {tenant.schema_name} disabled")
+        return JsonResponse({"error": "Tenant desativado"}, status=410)
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.11 on 2026-10-19 01:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_user_tenant'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='max_concurrent_requests',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='rate_limit',
+            field=models.FloatField(blank=True, help_text='Requisições/segundo do tenant', null=True),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='rate_limit_burst',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='user_rate_limit',
+            field=models.FloatField(blank=True, help_text='Requisições/segundo por usuário', null=True),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='user_rate_limit_burst',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.11 on 2026-10-19 01:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_client_rate_limits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='shard',
+            field=models.CharField(db_index=True, default='default', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='writes_frozen',
+            field=models.BooleanField(default=False),
+        ),
+    ]
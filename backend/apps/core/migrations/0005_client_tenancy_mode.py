@@ -0,0 +1,18 @@
+# Generated by Django 5.2.11 on 2026-10-19 01:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_client_shard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='tenancy_mode',
+            field=models.CharField(choices=[('schema', 'Schema próprio'), ('shared', 'Tabelas compartilhadas')], default='schema', max_length=10),
+        ),
+    ]
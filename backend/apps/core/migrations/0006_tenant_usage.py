@@ -0,0 +1,31 @@
+# Generated by Django 5.2.11 on 2026-10-19 02:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_client_tenancy_mode'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TenantUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('requests', models.BigIntegerField(default=0)),
+                ('db_time_ms', models.FloatField(default=0)),
+                ('rows_read', models.BigIntegerField(default=0)),
+                ('rows_written', models.BigIntegerField(default=0)),
+                ('bytes_out', models.BigIntegerField(default=0)),
+                ('tenant', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='usage', to='core.client')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['bucket'], name='core_tenantusage_bucket')],
+                'constraints': [models.UniqueConstraint(fields=('tenant', 'bucket'), name='core_tenantusage_tenant_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.11 on 2026-10-19 02:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_tenant_usage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='disabled_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='offboarding_progress',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='offboarding_state',
+            field=models.CharField(blank=True, choices=[('queued', 'Na fila'), ('archiving', 'Arquivando'), ('dropping', 'Removendo dados'), ('done', 'Concluído'), ('failed', 'Falhou')], default='', max_length=10),
+        ),
+    ]
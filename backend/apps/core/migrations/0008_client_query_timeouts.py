@@ -0,0 +1,28 @@
+# Generated by Django 5.2.11 on 2026-10-19 02:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_client_offboarding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='endpoint_timeouts',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='lock_timeout_ms',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='statement_timeout_ms',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
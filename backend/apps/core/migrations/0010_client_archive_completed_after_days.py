@@ -0,0 +1,18 @@
+# Generated by Django 5.2.11 on 2026-10-19 02:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_idempotency_records'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='archive_completed_after_days',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -3,12 +3,96 @@ from django.db import models
 from django_tenants.models import TenantMixin, DomainMixin
 
 class Client(TenantMixin):
+    # Modos de isolamento dos dados dos apps de tenant (apps.core.tenancy)
+    SCHEMA_MODE = 'schema'  # schema próprio
+    SHARED_MODE = 'shared'  # tabelas compartilhadas do public, filtradas por tenant_id
+    TENANCY_MODES = [
+        (SCHEMA_MODE, 'Schema próprio'),
+        (SHARED_MODE, 'Tabelas compartilhadas'),
+    ]
+
+    # Etapas do offboarding (apps.core.offboarding)
+    OFFBOARDING_QUEUED = 'queued'
+    OFFBOARDING_ARCHIVING = 'archiving'
+    OFFBOARDING_DROPPING = 'dropping'
+    OFFBOARDING_DONE = 'done'
+    OFFBOARDING_FAILED = 'failed'
+    OFFBOARDING_STATES = [
+        (OFFBOARDING_QUEUED, 'Na fila'),
+        (OFFBOARDING_ARCHIVING, 'Arquivando'),
+        (OFFBOARDING_DROPPING, 'Removendo dados'),
+        (OFFBOARDING_DONE, 'Concluído'),
+        (OFFBOARDING_FAILED, 'Falhou'),
+    ]
+
     name = models.CharField(max_length=100)
     created_on = models.DateField(auto_now_add=True)
 
+    # Limites de requisições (apps.core.ratelimit); vazio = padrão do settings,
+    # 0 = sem limite
+    rate_limit = models.FloatField(null=True, blank=True, help_text="Requisições/segundo do tenant")
+    rate_limit_burst = models.PositiveIntegerField(null=True, blank=True)
+    user_rate_limit = models.FloatField(null=True, blank=True, help_text="Requisições/segundo por usuário")
+    user_rate_limit_burst = models.PositiveIntegerField(null=True, blank=True)
+    max_concurrent_requests = models.PositiveIntegerField(null=True, blank=True)
+
+    # Alias em DATABASES do banco (shard) onde fica o schema do tenant. Os
+    # dados públicos (Client, Domain, User) ficam sempre no default.
+    shard = models.CharField(max_length=64, default='default', db_index=True)
+    # Escritas recusadas com 503 (ex.: durante a migração entre shards)
+    writes_frozen = models.BooleanField(default=False)
+    # Tenants pequenos podem ficar em tabelas compartilhadas, sem schema
+    # próprio; promote_tenant move para um schema quando crescem
+    tenancy_mode = models.CharField(max_length=10, choices=TENANCY_MODES, default=SCHEMA_MODE)
+    # Timeouts das queries da API em ms (apps.core.timeouts); vazio = padrão
+    # do settings, 0 = sem limite. endpoint_timeouts sobrescreve por endpoint:
+    # {"list_projects": {"statement_timeout_ms": 10000, "lock_timeout_ms": 500}}
+    statement_timeout_ms = models.PositiveIntegerField(null=True, blank=True)
+    lock_timeout_ms = models.PositiveIntegerField(null=True, blank=True)
+    endpoint_timeouts = models.JSONField(default=dict, blank=True)
+    # Tenant desativado: requisições recusadas com 410 (TenantDisabledMiddleware)
+    # enquanto o offboarding arquiva e remove os dados em segundo plano
+    disabled_at = models.DateTimeField(null=True, blank=True)
+    offboarding_state = models.CharField(max_length=10, choices=OFFBOARDING_STATES, blank=True, default='')
+    offboarding_progress = models.JSONField(default=dict, blank=True)
+    # Dias depois da conclusão para arquivar os projetos (apps.tasks.archive);
+    # vazio = padrão do settings, 0 = nunca arquiva
+    archive_completed_after_days = models.PositiveIntegerField(null=True, blank=True)
+
     # default true, schema will be automatically created and synced when it is saved
     auto_create_schema = True
 
+    @property
+    def is_shared(self):
+        return self.tenancy_mode == self.SHARED_MODE
+
+    @property
+    def is_disabled(self):
+        return self.disabled_at is not None
+
+    def create_schema(self, check_if_exists=False, sync_schema=True, verbosity=1):
+        if self.is_shared:
+            return False
+        from .query_budget import excluded_from_budget
+        # As migrations do schema novo ficam fora do @query_budget do endpoint
+        with excluded_from_budget():
+            if self.shard == 'default':
+                return super().create_schema(check_if_exists, sync_schema, verbosity)
+            from .sharding import create_shard_schema
+            return create_shard_schema(self, self.shard, check_if_exists, sync_schema, verbosity)
+
+    def _drop_schema(self, force_drop=False):
+        if self.is_shared:
+            from .tenancy import delete_shared_rows
+            if self.auto_drop_schema or force_drop:
+                delete_shared_rows(self)
+            return
+        if self.shard == 'default':
+            return super()._drop_schema(force_drop)
+        from .sharding import drop_shard_schema
+        if self.auto_drop_schema or force_drop:
+            drop_shard_schema(self, self.shard)
+
 class Domain(DomainMixin):
     pass
 
@@ -18,3 +102,45 @@ class User(AbstractUser):
     
     def __str__(self):
         return f"{self.username} ({self.tenant.name if self.tenant else 'Sem Tenant'})"
+
+
+class TenantUsage(models.Model):
+    """Consumo agregado de um tenant em um intervalo de tempo (apps.core.metering)"""
+    tenant = models.ForeignKey(
+        Client,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,  # o histórico de cobrança sobrevive à remoção do tenant
+        related_name='usage',
+    )
+    bucket = models.DateTimeField()  # início do intervalo (METERING_BUCKET_SECONDS)
+    requests = models.BigIntegerField(default=0)
+    db_time_ms = models.FloatField(default=0)
+    rows_read = models.BigIntegerField(default=0)
+    rows_written = models.BigIntegerField(default=0)
+    bytes_out = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['tenant', 'bucket'], name='core_tenantusage_tenant_bucket')]
+        indexes = [models.Index(fields=['bucket'], name='core_tenantusage_bucket')]
+
+    def __str__(self):
+        return f'{self.tenant_id} @ {self.bucket:%Y-%m-%d %H:%M}'
+
+
+class IdempotencyRecord(models.Model):
+    """Resposta gravada de uma requisição com Idempotency-Key (apps.core.idempotency)"""
+    tenant = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='idempotency_records')
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)  # sha256 de método, caminho, corpo e Authorization
+    status_code = models.PositiveSmallIntegerField()
+    content_type = models.CharField(max_length=255)
+    body = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['tenant', 'key'], name='core_idempotency_tenant_key')]
+        indexes = [models.Index(fields=['expires_at'], name='core_idempotency_expires_at')]
+
+    def __str__(self):
+        return f'{self.tenant_id}:{self.key}'
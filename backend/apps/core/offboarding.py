@@ -0,0 +1,300 @@
+"""
+Offboarding de tenants: desativação imediata, arquivo dos dados e remoção
+em pedaços.
+
+Apagar um Client remove o schema inteiro (DROP SCHEMA ... CASCADE) e os
+usuários em uma única transação, que segura locks de catálogo enquanto
+durar. O offboarding troca isso por:
+
+  1. desativar: disabled_at preenchido na hora; o TenantDisabledMiddleware
+     recusa as requisições com 410 e o login dos usuários deixa de valer;
+  2. arquivar: cada tabela do tenant (e os usuários, sem o hash de senha)
+     vai por COPY para um .tar.gz em OFFBOARDING_ARCHIVE_DIR, com um
+     manifest.json de contagens;
+  3. remover: uma tabela por transação (DROP TABLE) no schema próprio, ou
+     lotes de OFFBOARDING_CHUNK_SIZE linhas nas tabelas compartilhadas,
+     sempre com lock_timeout - em vez de esperar atrás de uma query longa
+     (e enfileirar todo o resto atrás do DROP), desiste e tenta de novo;
+     depois os usuários e domínios, também em lotes.
+
+O andamento fica em Client.offboarding_state/offboarding_progress; o
+processo é retomável (as etapas já concluídas são puladas). O Client
+continua existindo, desativado, como registro (o consumo em core_tenantusage
+aponta para ele).
+
+    python manage.py offboard_tenant acme      # desativa e processa
+    python manage.py offboard_tenant --pending # fila (ex.: via cron)
+    python manage.py offboard_tenant --status
+"""
+import io
+import json
+import logging
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, connections, transaction
+from django.utils import timezone
+from django_tenants.utils import get_public_schema_name
+from psycopg2 import errorcodes
+
+from .models import Client, Domain
+from .sharding import COPY_SPOOL_BYTES, column_list, qualified, tenant_models
+from .tenancy import _tenants_by_schema, shared_table
+from .tenant_cache import invalidate_tenant, wait_for_propagation
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+
+def disable_tenant(tenant):
+    """Desativa o tenant e o coloca na fila do offboarding"""
+    tenant.disabled_at = tenant.disabled_at or timezone.now()
+    if tenant.offboarding_state in ('', Client.OFFBOARDING_FAILED):
+        tenant.offboarding_state = Client.OFFBOARDING_QUEUED
+    Client.objects.filter(pk=tenant.pk).update(
+        disabled_at=tenant.disabled_at, offboarding_state=tenant.offboarding_state,
+    )
+    invalidate_tenant(tenant)
+    return tenant
+
+
+def report(tenant, state=None, **progress):
+    """Grava a etapa e o andamento do offboarding no Client"""
+    if state is not None:
+        tenant.offboarding_state = state
+    tenant.offboarding_progress = {
+        **tenant.offboarding_progress, **progress, 'updated_at': timezone.now().isoformat(),
+    }
+    Client.objects.filter(pk=tenant.pk).update(
+        offboarding_state=tenant.offboarding_state, offboarding_progress=tenant.offboarding_progress,
+    )
+
+
+def tenant_tables(tenant):
+    """[(nome no arquivo, SELECT das linhas do tenant, params)]"""
+    tables = []
+    for model in tenant_models():
+        if tenant.is_shared:
+            select = f'SELECT {column_list(model)} FROM {shared_table(model)} WHERE "tenant_id" = %s'
+            tables.append((model._meta.db_table, select, [tenant.pk]))
+        else:
+            select = f'SELECT {column_list(model)} FROM {qualified(tenant.schema_name, model)}'
+            tables.append((model._meta.db_table, select, []))
+
+    # Usuários ficam no public (sem a senha: o arquivo não serve para login)
+    columns = ', '.join(
+        f'"{field.column}"' for field in User._meta.concrete_fields if field.name != 'password'
+    )
+    tables.append((
+        User._meta.db_table,
+        f'SELECT {columns} FROM "{get_public_schema_name()}"."{User._meta.db_table}" WHERE "tenant_id" = %s',
+        [tenant.pk],
+    ))
+    return tables
+
+
+def archive_tenant(tenant, archive_dir=None, log=None):
+    """
+    Exporta os dados do tenant para <archive_dir>/<schema>-<data>.tar.gz
+    (um CSV por tabela + manifest.json). O arquivo só ganha o nome final
+    depois de completo. Retorna o caminho.
+    """
+    import tarfile  # só no offboarding: fora do cold start dos workers
+
+    log = log or (lambda message: None)
+    archive_dir = Path(archive_dir or settings.OFFBOARDING_ARCHIVE_DIR)
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    path = archive_dir / f'{tenant.schema_name}-{timezone.now():%Y%m%d%H%M%S}.tar.gz'
+    partial = path.with_name(path.name + '.partial')
+
+    tenant_connection = connections[tenant.shard]
+    tables = {}
+    try:
+        with tarfile.open(partial, 'w:gz') as archive:
+            for name, select, params in tenant_tables(tenant):
+                log(f'Arquivando {name}')
+                db_connection = connections['default'] if name == User._meta.db_table else tenant_connection
+                with tempfile.SpooledTemporaryFile(max_size=COPY_SPOOL_BYTES) as buffer:
+                    with db_connection.cursor() as cursor:
+                        query = cursor.mogrify(select, params).decode() if params else select
+                        cursor.copy_expert(f'COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)', buffer)
+                        tables[name] = cursor.rowcount
+                    info = tarfile.TarInfo(f'{name}.csv')
+                    info.size = buffer.tell()
+                    info.mtime = int(time.time())
+                    buffer.seek(0)
+                    archive.addfile(info, buffer)
+                report(tenant, archived_tables=len(tables), archived_rows=sum(tables.values()))
+
+            manifest = json.dumps({
+                'tenant': {
+                    'id': tenant.pk,
+                    'name': tenant.name,
+                    'schema_name': tenant.schema_name,
+                    'tenancy_mode': tenant.tenancy_mode,
+                    'shard': tenant.shard,
+                    'created_on': tenant.created_on.isoformat(),
+                },
+                'domains': list(Domain.objects.filter(tenant=tenant).values_list('domain', flat=True)),
+                'tables': tables,
+                'archived_at': timezone.now().isoformat(),
+            }, indent=2).encode()
+            info = tarfile.TarInfo('manifest.json')
+            info.size = len(manifest)
+            info.mtime = int(time.time())
+            archive.addfile(info, io.BytesIO(manifest))
+        partial.rename(path)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+    return path
+
+
+def with_lock_timeout(alias, statement, params=None, lock_timeout=None, retries=None, backoff=0.5):
+    """
+    Executa `statement` em uma transação própria com lock_timeout. Se o lock
+    não vier a tempo (outra transação segura a tabela), desfaz e tenta de
+    novo com espera crescente. Retorna o rowcount.
+    """
+    lock_timeout = settings.OFFBOARDING_LOCK_TIMEOUT_MS if lock_timeout is None else lock_timeout
+    retries = settings.OFFBOARDING_LOCK_RETRIES if retries is None else retries
+    for attempt in range(retries + 1):
+        try:
+            with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+                cursor.execute(f'SET LOCAL lock_timeout = {int(lock_timeout)}')
+                cursor.execute(statement, params)
+                return cursor.rowcount
+        except OperationalError as error:
+            if getattr(error.__cause__, 'pgcode', None) != errorcodes.LOCK_NOT_AVAILABLE or attempt == retries:
+                raise
+            logger.info('Lock indisponível (tentativa %s): %s', attempt + 1, statement)
+            time.sleep(backoff * 2 ** attempt)
+
+
+def schema_tables(alias, schema_name):
+    with connections[alias].cursor() as cursor:
+        cursor.execute(
+            'SELECT tablename FROM pg_tables WHERE schemaname = %s ORDER BY tablename', [schema_name],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def delete_in_chunks(alias, table, column, value, chunk_size, lock_timeout=None, on_chunk=None):
+    """DELETE em lotes de `chunk_size` linhas, cada lote na sua transação"""
+    deleted = 0
+    while True:
+        count = with_lock_timeout(
+            alias,
+            f'DELETE FROM {table} WHERE ctid = ANY(ARRAY(SELECT ctid FROM {table} WHERE "{column}" = %s LIMIT %s))',
+            [value, chunk_size],
+            lock_timeout=lock_timeout,
+        )
+        deleted += count
+        if on_chunk:
+            on_chunk(deleted)
+        if count < chunk_size:
+            return deleted
+
+
+def drop_tenant_data(tenant, chunk_size=None, lock_timeout=None, log=None):
+    """Remove os dados do tenant sem uma transação longa (ver o docstring do módulo)"""
+    log = log or (lambda message: None)
+    chunk_size = chunk_size or settings.OFFBOARDING_CHUNK_SIZE
+    alias = tenant.shard
+    deleted = tenant.offboarding_progress.get('deleted_rows', 0)
+
+    if tenant.is_shared:
+        # Mesma ordem do delete_shared_rows: filhos antes dos pais e as
+        # tabelas mantidas pelos triggers das outras por último
+        models_ = sorted(reversed(tenant_models()), key=lambda model: getattr(model, 'trigger_maintained', False))
+        for done, model in enumerate(models_, 1):
+            log(f'Removendo linhas de {model._meta.db_table}')
+            base = deleted
+            deleted = base + delete_in_chunks(
+                alias, shared_table(model), 'tenant_id', tenant.pk, chunk_size, lock_timeout,
+                on_chunk=lambda count: report(tenant, deleted_rows=base + count),
+            )
+            report(tenant, dropped_tables=done, tables_total=len(models_), deleted_rows=deleted)
+    else:
+        tables = schema_tables(alias, tenant.schema_name)
+        # Retomando: as tabelas que já foram não aparecem mais no catálogo
+        total = tenant.offboarding_progress.get('tables_total') or len(tables)
+        for done, table in enumerate(tables, total - len(tables) + 1):
+            log(f'Removendo {tenant.schema_name}.{table}')
+            with_lock_timeout(alias, f'DROP TABLE IF EXISTS "{tenant.schema_name}"."{table}" CASCADE',
+                              lock_timeout=lock_timeout)
+            report(tenant, dropped_tables=done, tables_total=total)
+        # Só sobram funções e sequências soltas: o DROP SCHEMA é curto
+        with_lock_timeout(alias, f'DROP SCHEMA IF EXISTS "{tenant.schema_name}" CASCADE', lock_timeout=lock_timeout)
+
+    log('Removendo usuários e domínios')
+    user_ids = list(User.objects.filter(tenant=tenant).values_list('pk', flat=True))
+    for start in range(0, len(user_ids), chunk_size):
+        with transaction.atomic():
+            User.objects.filter(pk__in=user_ids[start:start + chunk_size]).delete()
+        report(tenant, deleted_users=min(start + chunk_size, len(user_ids)))
+    Domain.objects.filter(tenant=tenant).delete()
+    _tenants_by_schema.pop(tenant.schema_name, None)
+
+
+def offboard_tenant(tenant, archive_dir=None, chunk_size=None, lock_timeout=None, log=None):
+    """
+    Desativa (se ainda não estiver), arquiva e remove os dados do tenant.
+    Retomável: um arquivo já gerado não é refeito.
+    """
+    log = log or (lambda message: None)
+    if tenant.schema_name == get_public_schema_name():
+        raise ValueError('O schema public não pode ser removido')
+    if tenant.offboarding_state == Client.OFFBOARDING_DONE:
+        return tenant
+
+    disable_tenant(tenant)
+    # Processos com o Client antigo em cache ainda atendem (e escrevem) no
+    # tenant: o arquivo só começa quando a desativação vale em todos
+    wait_for_propagation(tenant.disabled_at)
+    try:
+        archive = tenant.offboarding_progress.get('archive')
+        if not archive or not Path(archive).exists():
+            report(tenant, Client.OFFBOARDING_ARCHIVING, started_at=timezone.now().isoformat(), error=None)
+            archive = str(archive_tenant(tenant, archive_dir, log))
+            log(f'Arquivo: {archive}')
+        report(tenant, Client.OFFBOARDING_DROPPING, archive=archive)
+        drop_tenant_data(tenant, chunk_size, lock_timeout, log)
+        report(tenant, Client.OFFBOARDING_DONE, finished_at=timezone.now().isoformat())
+    except Exception as error:
+        report(tenant, Client.OFFBOARDING_FAILED, error=str(error))
+        raise
+    return tenant
+
+
+def start_offboarding(tenant, **options):
+    """
+    Desativa o tenant agora e roda o restante do offboarding em uma thread
+    (ex.: ação do admin). Se o processo morrer no meio, o estado fica salvo e
+    `offboard_tenant --pending` retoma.
+    """
+    disable_tenant(tenant)
+
+    def run():
+        try:
+            offboard_tenant(tenant, **options)
+        except Exception:
+            logger.exception('Offboarding de %s falhou', tenant.schema_name)
+        finally:
+            for db_connection in connections.all(initialized_only=True):
+                db_connection.close()
+
+    thread = threading.Thread(target=run, name=f'offboard-{tenant.schema_name}')
+    thread.start()
+    return thread
+
+
+def pending_offboardings():
+    return Client.objects.filter(disabled_at__isnull=False).exclude(
+        offboarding_state__in=('', Client.OFFBOARDING_DONE),
+    ).order_by('disabled_at')
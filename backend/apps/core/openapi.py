@@ -0,0 +1,90 @@
+"""
+Schema OpenAPI pré-gerado da API.
+
+O Ninja monta o schema a cada GET /api/openapi.json, percorrendo todas as
+operações e gerando o JSON Schema de cada modelo pydantic. Aqui ele é gerado
+uma vez no build (``python manage.py build_openapi`` grava o arquivo
+OPENAPI_SCHEMA_PATH) e servido como arquivo estático: lido uma vez por
+processo, com ETag e Cache-Control, e 304 quando o cliente já tem a versão.
+
+Sem o arquivo, ou com DEBUG (em desenvolvimento o arquivo de um build
+antigo não acompanha o código), o schema é gerado na primeira requisição e
+mantido em memória.
+"""
+import hashlib
+import json
+import logging
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.views.decorators.http import condition, require_GET
+
+logger = logging.getLogger(__name__)
+
+API_PREFIX = '/api/'
+
+_schema = None
+_schema_lock = threading.Lock()
+
+
+def build_schema():
+    """JSON (bytes) do schema OpenAPI atual da API"""
+    from project.apis import api
+
+    schema = api.get_openapi_schema(path_prefix=API_PREFIX)
+    return json.dumps(schema, cls=DjangoJSONEncoder, sort_keys=True, separators=(',', ':')).encode()
+
+
+def schema_etag(body):
+    return hashlib.sha256(body).hexdigest()[:32]
+
+
+def write_schema(path=None):
+    """Gera o schema e grava em `path` (padrão: OPENAPI_SCHEMA_PATH); retorna (caminho, corpo)"""
+    path = Path(path or settings.OPENAPI_SCHEMA_PATH)
+    body = build_schema()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(path.name + '.partial')
+    partial.write_bytes(body)
+    partial.replace(path)
+    return path, body
+
+
+def get_schema():
+    """(corpo, etag) do schema: do arquivo gerado no build ou gerado uma vez por processo"""
+    global _schema
+    if _schema is None:
+        with _schema_lock:
+            if _schema is None:
+                path = Path(settings.OPENAPI_SCHEMA_PATH)
+                if settings.DEBUG:
+                    body = build_schema()
+                elif path.exists():
+                    body = path.read_bytes()
+                else:
+                    logger.warning(
+                        f'{path} não encontrado; gerando o schema OpenAPI em memória '
+                        f'(rode "python manage.py build_openapi" no build)'
+                    )
+                    body = build_schema()
+                _schema = (body, schema_etag(body))
+    return _schema
+
+
+def reset_schema():
+    """Descarta o schema em memória (ex.: depois de regravar o arquivo)"""
+    global _schema
+    with _schema_lock:
+        _schema = None
+
+
+@require_GET
+@condition(etag_func=lambda request: get_schema()[1])
+def openapi_json(request):
+    body, _ = get_schema()
+    response = HttpResponse(body, content_type='application/json')
+    response['Cache-Control'] = f'public, max-age={settings.OPENAPI_SCHEMA_MAX_AGE}'
+    return response
@@ -0,0 +1,157 @@
+"""
+Backend PostgreSQL com reuso de conexão ciente do tenant.
+
+Estende o django_tenants.postgresql_backend com dois modos:
+
+  - Conexão direta (padrão): com CONN_MAX_AGE a conexão física sobrevive entre
+    requisições, e o django-tenants reenviaria o SET search_path a cada
+    set_tenant() do middleware. Aqui o search_path efetivamente aplicado na
+    conexão é lembrado e o SET só é enviado quando muda. Qualquer rollback
+    (que no PostgreSQL desfaz um SET feito dentro da transação), fechamento
+    ou reconexão esquece o valor lembrado.
+
+  - Pooler em modo transação (TENANT_TRANSACTION_POOLING, ex.: PgBouncer):
+    o estado de sessão não sobrevive entre transações, então nada é elidido
+    e o SET vai no mesmo comando de cada statement
+    ("SET search_path = ...; SELECT ..."), que o pooler envia inteiro para a
+    mesma conexão do servidor.
+
+O estado de sessão inclui também o statement_timeout e o lock_timeout da
+operação em andamento (apps.core.timeouts), enviados no mesmo SET.
+"""
+from django.conf import settings
+from django.db import DatabaseError
+from django_tenants.postgresql_backend import base as tenant_backend
+from django_tenants.postgresql_backend.base import original_backend
+
+import psycopg2
+from psycopg2.extensions import cursor as Psycopg2Cursor
+
+from apps.core import metrics
+
+stats = {'connections_opened': 0, 'search_path_sets': 0, 'search_path_elided': 0}
+
+metrics.register('database_session', lambda: dict(stats))
+
+
+def transaction_pooling():
+    return getattr(settings, 'TENANT_TRANSACTION_POOLING', False)
+
+
+def search_path_elision():
+    return getattr(settings, 'TENANT_SEARCH_PATH_ELISION', True) and not transaction_pooling()
+
+
+# Comandos que não podem rodar dentro de um bloco de transação (o que um
+# comando com vários statements vira). Não dependem do search_path; os
+# CONCURRENTLY precisam de nomes qualificados com o schema no modo pooler.
+NON_TRANSACTIONAL_PREFIXES = ('CREATE DATABASE', 'DROP DATABASE', 'VACUUM', 'ALTER SYSTEM')
+
+
+class SessionStateCursor(Psycopg2Cursor):
+    """Cursor que prefixa cada statement com o estado de sessão (modo pooler)"""
+    session_sql = None
+
+    def _with_session(self, query, has_params):
+        if not self.session_sql or not isinstance(query, str):
+            return query
+        if query.lstrip().upper().startswith(NON_TRANSACTIONAL_PREFIXES) or 'CONCURRENTLY' in query.upper():
+            return query
+        session_sql = self.session_sql.replace('%', '%%') if has_params else self.session_sql
+        return f'{session_sql}; {query}'
+
+    def execute(self, query, vars=None):
+        return super().execute(self._with_session(query, vars is not None), vars)
+
+    def executemany(self, query, vars_list):
+        return super().executemany(self._with_session(query, True), vars_list)
+
+
+class DatabaseWrapper(tenant_backend.DatabaseWrapper):
+
+    def __init__(self, *args, **kwargs):
+        # Estado de sessão (search_path, timeouts) efetivamente aplicado na
+        # conexão física atual
+        self.applied_session_state = None
+        # (statement_timeout_ms, lock_timeout_ms) da operação em andamento;
+        # None = padrão do banco (apps.core.timeouts)
+        self.query_timeouts = None
+        super().__init__(*args, **kwargs)
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        if transaction_pooling():
+            connection.cursor_factory = SessionStateCursor
+        stats['connections_opened'] += 1
+        return connection
+
+    def connect(self):
+        self.applied_session_state = None
+        super().connect()
+
+    def close(self):
+        self.applied_session_state = None
+        super().close()
+
+    def _rollback(self):
+        try:
+            return super()._rollback()
+        finally:
+            self.applied_session_state = None
+
+    def _savepoint_rollback(self, sid):
+        # Esquecido depois do ROLLBACK TO SAVEPOINT: o próprio cursor dele
+        # pode ter enviado um SET que o rollback desfaz
+        try:
+            return super()._savepoint_rollback(sid)
+        finally:
+            self.applied_session_state = None
+
+    def session_state(self):
+        return self._get_cursor_search_paths(), self.query_timeouts
+
+    def session_sql(self, state=None):
+        search_paths, timeouts = state or self.session_state()
+        statement_timeout, lock_timeout = (int(value) for value in timeouts) if timeouts else ('DEFAULT', 'DEFAULT')
+        return (
+            'SET search_path = {0}; SET statement_timeout = {1}; SET lock_timeout = {2}'.format(
+                ','.join(f"'{s}'" for s in search_paths), statement_timeout, lock_timeout,
+            )
+        )
+
+    def _cursor(self, name=None):
+        if transaction_pooling():
+            cursor = original_backend.DatabaseWrapper._cursor(self, name)
+            if isinstance(cursor.cursor, SessionStateCursor):
+                cursor.cursor.session_sql = self.session_sql()
+                stats['search_path_sets'] += 1
+            return cursor
+
+        state = self.session_state()
+        if (
+            search_path_elision()
+            and self.connection is not None
+            and self.applied_session_state is not None
+            and self.applied_session_state == state
+        ):
+            stats['search_path_elided'] += 1
+            return original_backend.DatabaseWrapper._cursor(self, name)
+
+        cursor = original_backend.DatabaseWrapper._cursor(self, name)
+        # Um cursor nomeado (server-side) só pode executar uma vez
+        session_cursor = self.connection.cursor() if name else cursor
+        try:
+            session_cursor.execute(self.session_sql(state))
+        except (DatabaseError, psycopg2.DatabaseError):
+            # Transação já abortada: o próximo comando é o rollback (que
+            # esquece o estado) ou falharia de qualquer forma
+            self.search_path_set_schemas = None
+            self.applied_session_state = None
+        else:
+            self.search_path_set_schemas = state[0]
+            self.applied_session_state = state
+            stats['search_path_sets'] += 1
+        finally:
+            if name:
+                session_cursor.close()
+        return cursor
@@ -0,0 +1,168 @@
+"""
+Orçamento de queries por endpoint da API (Django Ninja).
+
+Cada operação decorada com ``@query_budget(n)`` conta as queries executadas
+durante a requisição (autenticação e serialização incluídas). Se o limite for
+ultrapassado, a requisição falha em testes/DEBUG e gera apenas um warning em
+produção - assim padrões O(n) (N+1) são pegos antes do deploy.
+"""
+import inspect
+import logging
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from ninja.utils import contribute_operation_callback
+
+logger = logging.getLogger(__name__)
+
+# Statements de controle de transação e de sessão (SET search_path do
+# django-tenants) não contam para o orçamento: o número deles muda entre
+# testes (savepoints do TestCase) e produção.
+IGNORED_STATEMENTS = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT', 'SET ')
+
+
+class QueryBudgetExceeded(Exception):
+    """Levantada quando um endpoint executa mais queries do que o permitido"""
+
+
+class QueryCounter:
+    """execute_wrapper que conta as queries executadas na conexão"""
+
+    def __init__(self):
+        self.queries = []
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    def __call__(self, execute, sql, params, many, context):
+        if not sql.lstrip().upper().startswith(IGNORED_STATEMENTS):
+            self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def count_queries(counter):
+    """Instala o contador em todas as conexões (principal e réplica)"""
+    with ExitStack() as stack:
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(counter))
+        yield counter
+
+
+def install_counter(counter):
+    for conn in connections.all():
+        conn.execute_wrappers.append(counter)
+
+
+def uninstall_counter(counter):
+    for conn in connections.all():
+        conn.execute_wrappers.remove(counter)
+
+
+@contextmanager
+def excluded_from_budget():
+    """
+    Tira do orçamento as queries do bloco (ex.: as migrations do schema de um
+    tenant novo, que crescem com cada migration e não com a requisição)
+    """
+    saved = {}
+    for conn in connections.all():
+        saved[conn] = list(conn.execute_wrappers)
+        conn.execute_wrappers[:] = [wrapper for wrapper in saved[conn] if not isinstance(wrapper, QueryCounter)]
+    try:
+        yield
+    finally:
+        for conn, wrappers in saved.items():
+            conn.execute_wrappers[:] = wrappers
+
+
+def is_strict():
+    """Em testes e DEBUG o estouro do orçamento levanta exceção"""
+    return getattr(settings, 'QUERY_BUDGET_STRICT', settings.DEBUG)
+
+
+def check_budget(name, counter, max_queries):
+    if counter.count <= max_queries:
+        return
+
+    message = (
+        f"Endpoint '{name}' executou {counter.count} queries "
+        f"(orçamento: {max_queries})"
+    )
+    if is_strict():
+        raise QueryBudgetExceeded(message + ":\n" + "\n".join(counter.queries))
+
+    logger.warning(f"⚠️ QueryBudget: {message}")
+
+
+def query_budget(max_queries):
+    """
+    Define o número máximo de queries de uma operação Ninja.
+
+    Uso (abaixo do decorator do router):
+
+        @router.get("/projects", response=list[ProjectSchema], auth=jwt_auth)
+        @query_budget(3)
+        def list_projects(request):
+            ...
+    """
+    def decorator(view_func):
+        def apply(operation):
+            operation.run = budgeted(operation.run, view_func.__name__)
+
+        if hasattr(view_func, '_ninja_operation'):
+            # Aplicado acima do @router.<method>
+            apply(view_func._ninja_operation)
+        else:
+            contribute_operation_callback(view_func, apply)
+
+        view_func.query_budget = max_queries
+        return view_func
+
+    def budgeted(run, name):
+        if inspect.iscoroutinefunction(run):
+            # O ORM async executa as queries na thread "thread sensitive" do
+            # sync_to_async, então o contador é instalado na conexão dela.
+            async def async_wrapper(request, *args, **kwargs):
+                counter = QueryCounter()
+                await sync_to_async(install_counter)(counter)
+                try:
+                    response = await run(request, *args, **kwargs)
+                finally:
+                    await sync_to_async(uninstall_counter)(counter)
+                check_budget(name, counter, max_queries)
+                return response
+
+            return async_wrapper
+
+        def wrapper(request, *args, **kwargs):
+            counter = QueryCounter()
+            with count_queries(counter):
+                response = run(request, *args, **kwargs)
+            check_budget(name, counter, max_queries)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def budgeted_iterator(iterator, name, max_queries):
+    """
+    Orçamento por item de um gerador consumido depois da view (ex.: o corpo
+    de um StreamingHttpResponse), que o @query_budget não alcança: as queries
+    feitas para produzir cada item não passam de `max_queries`.
+    """
+    iterator = iter(iterator)
+    while True:
+        counter = QueryCounter()
+        with count_queries(counter):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        check_budget(name, counter, max_queries)
+        yield item
@@ -0,0 +1,301 @@
+"""
+Rate limiting e controle de admissão por tenant e por usuário.
+
+O RateLimitMiddleware roda logo depois da resolução do tenant e, antes de
+qualquer trabalho no banco, aplica:
+
+  - token bucket por tenant e por usuário (id lido do JWT, sem query);
+  - limite de requisições simultâneas por tenant.
+
+Requisições recusadas recebem 429 com Retry-After. Os limites vêm dos campos
+de limite do Client (vazio = padrão do settings, 0 = sem limite).
+
+Dois backends (settings.RATE_LIMIT_BACKEND):
+  - 'local': em memória, por processo. O bucket é o GCRA (equivalente ao token
+    bucket com um único float por chave), atualizado sob um lock; chaves
+    ociosas (bucket cheio de novo) são descartadas periodicamente.
+  - 'cache': cache do Django compartilhado entre os nós (Redis/Memcached),
+    com contadores atômicos (add/incr) por janela.
+"""
+import math
+import threading
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from django_tenants.utils import get_public_schema_name
+
+from . import metrics
+from .jwt_utils import decode_jwt_token
+
+
+@dataclass(frozen=True)
+class Limit:
+    rate: float  # requisições por segundo
+    burst: int
+
+    @property
+    def enabled(self):
+        return self.rate > 0 and self.burst > 0
+
+
+@dataclass(frozen=True)
+class TenantLimits:
+    tenant: Limit
+    user: Limit
+    max_concurrent: int
+
+    @classmethod
+    def for_tenant(cls, tenant):
+        def value(field, default):
+            configured = getattr(tenant, field, None)
+            return default if configured is None else configured
+
+        return cls(
+            tenant=Limit(
+                value('rate_limit', settings.RATE_LIMIT_TENANT_RATE),
+                value('rate_limit_burst', settings.RATE_LIMIT_TENANT_BURST),
+            ),
+            user=Limit(
+                value('user_rate_limit', settings.RATE_LIMIT_USER_RATE),
+                value('user_rate_limit_burst', settings.RATE_LIMIT_USER_BURST),
+            ),
+            max_concurrent=value('max_concurrent_requests', settings.RATE_LIMIT_TENANT_MAX_CONCURRENT),
+        )
+
+
+class LocalRateLimiter:
+    """Buckets e contadores de concorrência em memória do processo"""
+    # De quanto em quanto tempo (s) as chaves ociosas são descartadas
+    SWEEP_INTERVAL = 60
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            # chave -> "theoretical arrival time" do GCRA
+            self.arrivals = {}
+            # chave -> (limite, semáforo)
+            self.slots = {}
+            self.swept_at = time.monotonic()
+
+    def sweep(self, now):
+        # Chegada teórica no passado = bucket cheio, igual a uma chave ausente
+        self.arrivals = {key: arrival for key, arrival in self.arrivals.items() if arrival > now}
+        self.swept_at = now
+
+    def hit(self, key, limit, now=None):
+        """Consome um token; retorna 0 se admitido ou os segundos até o próximo"""
+        now = time.monotonic() if now is None else now
+        interval = 1.0 / limit.rate
+        tolerance = interval * (limit.burst - 1)
+        with self.lock:
+            if now - self.swept_at >= self.SWEEP_INTERVAL:
+                self.sweep(now)
+            arrival = max(self.arrivals.get(key, now), now)
+            if arrival - now > tolerance:
+                return arrival - now - tolerance
+            self.arrivals[key] = arrival + interval
+            return 0
+
+    def acquire(self, key, limit):
+        with self.lock:
+            current = self.slots.get(key)
+            if current is None or current[0] != limit:
+                # Limite do Client mudou: vale sem reiniciar o processo, e as
+                # vagas do limite antigo ainda ocupadas deixam de contar
+                current = self.slots[key] = (limit, threading.BoundedSemaphore(limit))
+        return current[1].acquire(blocking=False)
+
+    def release(self, key, limit):
+        with self.lock:
+            current = self.slots.get(key)
+        # Vaga de um limite já substituído: o semáforo dela foi descartado
+        if current is not None and current[0] == limit:
+            current[1].release()
+
+
+class CacheRateLimiter:
+    """
+    Limites compartilhados entre os nós via cache do Django. Janela fixa de
+    `burst / rate` segundos com até `burst` requisições (mesma taxa média do
+    token bucket).
+    """
+    # Proteção contra vagas de concorrência "vazadas" por um processo que morreu
+    SLOT_TIMEOUT = 60
+
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+
+    def reset(self):
+        self.cache.clear()
+
+    def hit(self, key, limit, now=None):
+        now = time.time() if now is None else now
+        window = limit.burst / limit.rate
+        slot = int(now // window)
+        cache_key = f'ratelimit:{key}:{slot}'
+        self.cache.add(cache_key, 0, timeout=math.ceil(window) + 1)
+        if self.cache.incr(cache_key) > limit.burst:
+            return (slot + 1) * window - now
+        return 0
+
+    def acquire(self, key, limit):
+        cache_key = f'ratelimit:concurrency:{key}'
+        self.cache.add(cache_key, 0, timeout=self.SLOT_TIMEOUT)
+        try:
+            count = self.cache.incr(cache_key)
+        except ValueError:
+            # A chave expirou entre o add e o incr
+            count = 1 if self.cache.add(cache_key, 1, timeout=self.SLOT_TIMEOUT) else self.cache.incr(cache_key)
+        # O TTL conta da última entrada: sob carga contínua a chave não expira
+        # no meio de requisições em andamento
+        self.cache.touch(cache_key, self.SLOT_TIMEOUT)
+        if count > limit:
+            self.cache.decr(cache_key)
+            return False
+        return True
+
+    def release(self, key, limit):
+        cache_key = f'ratelimit:concurrency:{key}'
+        try:
+            count = self.cache.decr(cache_key)
+        except ValueError:
+            # Chave expirou durante a requisição
+            return
+        if count < 0:
+            # Liberações de vagas que a chave expirada já tinha esquecido
+            self.cache.incr(cache_key, -count)
+
+
+_limiters = {}
+
+
+def get_limiter():
+    backend = settings.RATE_LIMIT_BACKEND
+    if backend not in _limiters:
+        if backend == 'cache':
+            _limiters[backend] = CacheRateLimiter(settings.RATE_LIMIT_CACHE_ALIAS)
+        else:
+            _limiters[backend] = LocalRateLimiter()
+    return _limiters[backend]
+
+
+rejections = {'tenant': 0, 'user': 0, 'concurrency': 0}
+
+metrics.register('rate_limit', lambda: {'rejected': dict(rejections)})
+
+
+def get_jwt_user_id(request):
+    """Id do usuário do token JWT da requisição (sem acessar o banco)"""
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if not header.startswith('Bearer '):
+        return None
+    payload = decode_jwt_token(header[len('Bearer '):])
+    return payload.get('user_id') if payload else None
+
+
+def too_many_requests(reason, retry_after):
+    rejections[reason] += 1
+    response = JsonResponse(
+        {"error": "Limite de requisições excedido", "reason": reason},
+        status=429,
+    )
+    response['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+class HeldStream:
+    """
+    Conteúdo de uma resposta streaming que segura a vaga de concorrência até
+    o stream terminar ou a resposta ser fechada (response.close(), chamado
+    pelo servidor também quando o cliente desconecta antes do fim)
+    """
+
+    def __init__(self, content, release):
+        self.content = content
+        self._release = release
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            release, self._release = self._release, None
+        if release is not None:
+            release()
+
+    def __iter__(self):
+        try:
+            yield from self.content
+        finally:
+            self.close()
+
+
+class AsyncHeldStream(HeldStream):
+    __iter__ = None
+
+    async def __aiter__(self):
+        try:
+            async for chunk in self.content:
+                yield chunk
+        finally:
+            self.close()
+
+
+class RateLimitMiddleware:
+    """
+    Deve ficar depois do TenantMainMiddleware (precisa de request.tenant).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        tenant = getattr(request, 'tenant', None)
+        if (
+            not settings.RATE_LIMIT_ENABLED
+            or tenant is None
+            or tenant.schema_name == get_public_schema_name()
+        ):
+            return self.get_response(request)
+
+        limiter = get_limiter()
+        limits = TenantLimits.for_tenant(tenant)
+        tenant_key = f'tenant:{tenant.schema_name}'
+
+        if limits.tenant.enabled:
+            retry_after = limiter.hit(tenant_key, limits.tenant)
+            if retry_after:
+                return too_many_requests('tenant', retry_after)
+
+        if limits.user.enabled:
+            user_id = get_jwt_user_id(request)
+            if user_id is not None:
+                retry_after = limiter.hit(f'user:{tenant.schema_name}:{user_id}', limits.user)
+                if retry_after:
+                    return too_many_requests('user', retry_after)
+
+        if not limits.max_concurrent:
+            return self.get_response(request)
+
+        if not limiter.acquire(tenant_key, limits.max_concurrent):
+            return too_many_requests('concurrency', settings.RATE_LIMIT_CONCURRENCY_RETRY_AFTER)
+
+        def release():
+            limiter.release(tenant_key, limits.max_concurrent)
+
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            release()
+            raise
+        if response.streaming:
+            # O trabalho de um stream (SSE, import NDJSON) roda depois daqui
+            held = AsyncHeldStream if response.is_async else HeldStream
+            response.streaming_content = held(response.streaming_content, release)
+        else:
+            release()
+        return response
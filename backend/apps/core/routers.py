@@ -0,0 +1,160 @@
+"""
+Roteamento de shards e de leituras para a réplica, mantendo o schema do tenant.
+
+TenantShardRouter (primeiro da lista): models dos apps de tenant vão para o
+banco do shard do tenant ativo (Client.shard); tenants no shard default
+seguem para os routers seguintes. Ver apps.core.sharding.
+
+TenantReadReplicaRouter: fica antes do django_tenants.routers.TenantSyncRouter (que só decide
+migrations). Apenas as rotas marcadas com @read_only_route leem da réplica:
+
+    @router.get("/projects", response=list[ProjectSchema], auth=jwt_auth)
+    @query_budget(3)
+    @read_only_route
+    def list_projects(request):
+        ...
+
+Antes da view, a conexão da réplica recebe o mesmo tenant da requisição
+(set_tenant), então o search_path aplicado nela é o mesmo da principal.
+
+Read-your-writes: toda escrita em um schema de tenant marca o tenant como
+"sticky" no cache REPLICA_STICKY_CACHE_ALIAS por REPLICA_STICKY_SECONDS; nesse
+intervalo as rotas de leitura dele continuam no banco principal, sem depender
+do atraso de replicação. A marca precisa valer para todos os workers: com a
+réplica ligada, o cache tem de ser compartilhado (Redis/Memcached) - um cache
+local do processo só é aceito com DEBUG e nos testes.
+"""
+import functools
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django_tenants.routers import TenantSyncRouter
+from django_tenants.utils import get_public_schema_name
+
+REPLICA_ALIAS = 'replica'
+
+_read_only = ContextVar('tenant_read_only_route', default=False)
+
+
+def replica_enabled():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+LOCAL_CACHE_BACKENDS = ('django.core.cache.backends.locmem', 'django.core.cache.backends.dummy')
+
+
+def sticky_cache():
+    return caches[settings.REPLICA_STICKY_CACHE_ALIAS]
+
+
+def check_sticky_cache():
+    """Chamado no boot: a réplica exige um cache compartilhado entre os workers"""
+    if not replica_enabled() or settings.DEBUG or settings.TESTING:
+        return
+    if sticky_cache().__class__.__module__.startswith(LOCAL_CACHE_BACKENDS):
+        raise ImproperlyConfigured(
+            f"A réplica de leitura exige um cache compartilhado em CACHES['{settings.REPLICA_STICKY_CACHE_ALIAS}'] "
+            "(REPLICA_STICKY_CACHE_ALIAS): com um cache local, uma escrita em um worker não "
+            "deixa as leituras dos outros no banco principal"
+        )
+
+
+def sticky_key(schema_name):
+    return f'replica:sticky:{schema_name}'
+
+
+def mark_tenant_write(schema_name):
+    if schema_name and schema_name != get_public_schema_name():
+        sticky_cache().set(sticky_key(schema_name), True, settings.REPLICA_STICKY_SECONDS)
+
+
+def is_sticky(schema_name):
+    return sticky_cache().get(sticky_key(schema_name)) is not None
+
+
+def read_only_route(view_func):
+    """Executa a view com as leituras roteadas para a réplica (se houver)"""
+    @functools.wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        tenant = getattr(request, 'tenant', None) or connection.tenant
+        if not replica_enabled() or is_sticky(tenant.schema_name):
+            return view_func(request, *args, **kwargs)
+
+        replica = connections[REPLICA_ALIAS]
+        if replica.schema_name != tenant.schema_name:
+            replica.set_tenant(tenant)
+
+        token = _read_only.set(True)
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            _read_only.reset(token)
+
+    return wrapper
+
+
+class TenantShardRouter(TenantSyncRouter):
+    """Models de tenant no banco do shard do tenant ativo na conexão default"""
+
+    def db_for_model(self, model):
+        from .sharding import is_tenant_model
+
+        tenant = getattr(connection, 'tenant', None)
+        alias = getattr(tenant, 'shard', DEFAULT_DB_ALIAS)
+        if alias == DEFAULT_DB_ALIAS or not is_tenant_model(model):
+            return None
+
+        shard = connections[alias]
+        if shard.schema_name != tenant.schema_name:
+            shard.set_tenant(tenant)
+        return alias
+
+    def db_for_read(self, model, **hints):
+        return self.db_for_model(model)
+
+    def db_for_write(self, model, **hints):
+        return self.db_for_model(model)
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # O TenantSyncRouter só migra o banco default; nos shards vale a mesma
+        # regra (SHARED_APPS no public, TENANT_APPS nos schemas de tenant). As
+        # tabelas públicas de um shard ficam vazias: o catálogo é o default.
+        if db == DEFAULT_DB_ALIAS or db not in settings.TENANT_SHARDS:
+            return None
+        if connections[db].schema_name == get_public_schema_name():
+            installed_apps = settings.SHARED_APPS
+        else:
+            installed_apps = settings.TENANT_APPS
+        return self.app_in_list(app_label, installed_apps)
+
+
+class TenantReadReplicaRouter:
+    """Leituras de rotas read-only na réplica; escritas sempre no principal"""
+
+    def db_for_read(self, model, **hints):
+        if _read_only.get():
+            return REPLICA_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        if not replica_enabled():
+            return None
+        mark_tenant_write(connection.schema_name)
+        # Explícito: um objeto lido da réplica nunca deve ser salvo nela
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, REPLICA_ALIAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # A réplica recebe o schema por replicação; o resto fica com o
+        # TenantSyncRouter
+        if db == REPLICA_ALIAS:
+            return False
+        return None
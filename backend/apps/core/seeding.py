@@ -0,0 +1,272 @@
+"""
+Geração rápida e determinística de tenants e dados sintéticos.
+
+Em vez de criar cada tenant pelo fluxo normal (CREATE SCHEMA + todas as
+migrations por tenant), as migrations rodam uma única vez em um schema
+template e o SQL executado por elas é gravado (SchemaScript). Cada tenant novo
+recebe apenas a reexecução desse SQL - inclusive os registros da tabela
+django_migrations - sem carregar o grafo de migrations de novo. As linhas de
+projetos e tarefas são inseridas com COPY, com ids explícitos, em workers
+paralelos.
+
+O conteúdo de cada tenant depende apenas de (seed, schema_name), então duas
+rodadas com a mesma seed geram exatamente os mesmos dados, independente do
+número de workers.
+"""
+import csv
+import io
+import multiprocessing
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django_tenants.utils import schema_context
+
+from .models import Client, Domain, User
+
+TEMPLATE_SCHEMA = '_seed_template'
+BASE_DATE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+COPY_CHUNK_ROWS = 50_000
+
+PROJECT_COLUMNS = ('id', 'name', 'description', 'is_completed', 'created_at', 'updated_at')
+TASK_COLUMNS = ('id', 'project_id', 'name', 'description', 'created_at', 'updated_at')
+
+# Triggers por linha que o COPY do seed dispensa: ninguém escuta o NOTIFY de
+# um schema que acabou de nascer. change_id e completed_at continuam (o feed e
+# o arquivamento dependem deles), assim como os contadores, que são por
+# comando - não por linha - e dispensam a reconciliação depois
+SEED_DISABLED_TRIGGERS = (
+    ('tasks_project', 'tasks_project_notify'),
+    ('tasks_task', 'tasks_task_notify'),
+)
+
+
+@dataclass
+class SeedResult:
+    created: list = field(default_factory=list)
+    skipped: list = field(default_factory=list)
+    errors: dict = field(default_factory=dict)
+
+
+class SchemaScript:
+    """
+    SQL executado pelas migrations em um schema de tenant, gravado para ser
+    reaplicado em outros schemas (o search_path aponta para o schema novo).
+    """
+    # search_path é definido na reexecução; savepoints não fazem sentido fora
+    # da transação original
+    SKIPPED = ('SET SEARCH_PATH', 'SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not sql.lstrip().upper().startswith(self.SKIPPED):
+            self.statements.append((sql, params, many))
+        return execute(sql, params, many, context)
+
+    def apply(self, schema_name):
+        """Cria o schema e reexecuta o SQL das migrations dentro dele"""
+        connection.set_schema_to_public()
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(f'CREATE SCHEMA "{schema_name}"')
+            connection.set_schema(schema_name)
+            try:
+                with connection.cursor() as cursor:
+                    for sql, params, many in self.statements:
+                        if many:
+                            cursor.executemany(sql, params)
+                        else:
+                            cursor.execute(sql, params)
+            finally:
+                connection.set_schema_to_public()
+
+
+def prepare_template(template=TEMPLATE_SCHEMA):
+    """
+    Migra um schema template vazio gravando o SQL executado; roda uma vez por
+    seed. O template é recriado a cada chamada para que o script contenha
+    todas as migrations.
+    """
+    connection.set_schema_to_public()
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP SCHEMA IF EXISTS "{template}" CASCADE')
+        cursor.execute(f'CREATE SCHEMA "{template}"')
+
+    script = SchemaScript()
+    with connection.execute_wrapper(script):
+        call_command('migrate_schemas', tenant=True, schema_name=template,
+                     interactive=False, verbosity=0)
+    connection.set_schema_to_public()
+    return script
+
+
+def project_rows(rng, projects):
+    for project_id in range(1, projects + 1):
+        created_at = BASE_DATE + timedelta(minutes=rng.randrange(525_600))
+        yield (
+            project_id,
+            f'Projeto {project_id}',
+            f'Projeto sintético {project_id} ({rng.getrandbits(32):08x})',
+            't' if rng.random() < 0.25 else 'f',
+            created_at.isoformat(),
+            (created_at + timedelta(minutes=rng.randrange(1, 10_000))).isoformat(),
+        )
+
+
+def task_rows(rng, projects, tasks):
+    task_id = 0
+    for project_id in range(1, projects + 1):
+        for _ in range(tasks):
+            task_id += 1
+            created_at = BASE_DATE + timedelta(minutes=rng.randrange(525_600))
+            yield (
+                task_id,
+                project_id,
+                f'Tarefa {task_id}',
+                f'Tarefa sintética {task_id} ({rng.getrandbits(32):08x})',
+                created_at.isoformat(),
+                created_at.isoformat(),
+            )
+
+
+def copy_rows(cursor, table, columns, rows):
+    """COPY em blocos de COPY_CHUNK_ROWS para não montar tudo em memória"""
+    sql = f'COPY {table} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)'
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    pending = 0
+
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending == COPY_CHUNK_ROWS:
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+
+    if pending:
+        buffer.seek(0)
+        cursor.copy_expert(sql, buffer)
+
+
+def fill_schema(schema_name, projects, tasks, seed):
+    """Insere os projetos e tarefas do tenant via COPY e ajusta as sequences"""
+    rng = random.Random(f'{seed}:{schema_name}')
+
+    with schema_context(schema_name), transaction.atomic():
+        with connection.cursor() as cursor:
+            for table, trigger in SEED_DISABLED_TRIGGERS:
+                cursor.execute(f'ALTER TABLE {table} DISABLE TRIGGER {trigger}')
+            copy_rows(cursor, 'tasks_project', PROJECT_COLUMNS, project_rows(rng, projects))
+            copy_rows(cursor, 'tasks_task', TASK_COLUMNS, task_rows(rng, projects, tasks))
+            # As FKs do Django são DEFERRABLE: com eventos pendentes o ALTER
+            # TABLE falha, então são checadas antes de religar os triggers
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+            for table, trigger in SEED_DISABLED_TRIGGERS:
+                cursor.execute(f'ALTER TABLE {table} ENABLE TRIGGER {trigger}')
+            cursor.execute('SET CONSTRAINTS ALL DEFERRED')
+            for table in ('tasks_project', 'tasks_task'):
+                cursor.execute(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                    f"GREATEST((SELECT MAX(id) FROM {table}), 1))"
+                )
+
+
+def seed_schema(args):
+    """Unidade de trabalho de um worker: aplica o script e preenche o schema"""
+    schema_name, projects, tasks, seed, script = args
+    try:
+        script.apply(schema_name)
+        fill_schema(schema_name, projects, tasks, seed)
+    except Exception as e:
+        connection.set_schema_to_public()
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP SCHEMA IF EXISTS "{schema_name}" CASCADE')
+        return schema_name, str(e)
+    return schema_name, None
+
+
+def seed_schema_in_worker(args):
+    try:
+        return seed_schema(args)
+    finally:
+        connections.close_all()
+
+
+def create_public_rows(schema_names, password_hash):
+    """Cria Client, Domain e um usuário por tenant em poucas queries"""
+    connection.set_schema_to_public()
+    with transaction.atomic():
+        # bulk_create não chama save(), então nenhum schema é criado aqui
+        tenants = Client.objects.bulk_create(
+            Client(name=schema_name, schema_name=schema_name)
+            for schema_name in schema_names
+        )
+        Domain.objects.bulk_create(
+            Domain(domain=f'{tenant.schema_name}.localhost', tenant=tenant, is_primary=True)
+            for tenant in tenants
+        )
+        User.objects.bulk_create(
+            User(
+                username=tenant.schema_name,
+                email=f'{tenant.schema_name}@seed.localhost',
+                password=password_hash,
+                tenant=tenant,
+            )
+            for tenant in tenants
+        )
+
+
+def seed_tenants(count, projects, tasks, seed=0, prefix='seed', workers=1,
+                 password='seed-pass-123', template=TEMPLATE_SCHEMA, progress=None):
+    """
+    Cria `count` tenants `<prefix><i>` com `projects` projetos e `tasks`
+    tarefas por projeto. Tenants que já existem são mantidos como estão.
+    """
+    result = SeedResult()
+    schema_names = [f'{prefix}{i}' for i in range(count)]
+
+    existing = set(
+        Client.objects.filter(schema_name__in=schema_names).values_list('schema_name', flat=True)
+    )
+    result.skipped = [name for name in schema_names if name in existing]
+    pending = [name for name in schema_names if name not in existing]
+    if not pending:
+        return result
+
+    script = prepare_template(template)
+    create_public_rows(pending, make_password(password))
+
+    jobs = [(name, projects, tasks, seed, script) for name in pending]
+    if workers > 1:
+        # Os processos filhos não podem herdar conexões abertas do pai
+        connections.close_all()
+        with multiprocessing.get_context('fork').Pool(workers) as pool:
+            outcomes = pool.imap_unordered(seed_schema_in_worker, jobs)
+            _collect(outcomes, result, len(jobs), progress)
+    else:
+        _collect(map(seed_schema, jobs), result, len(jobs), progress)
+
+    if result.errors:
+        # Remove os registros públicos dos tenants cujo schema falhou
+        Client.objects.filter(schema_name__in=list(result.errors)).delete()
+
+    connection.set_schema_to_public()
+    return result
+
+
+def _collect(outcomes, result, total, progress):
+    for done, (schema_name, error) in enumerate(outcomes, start=1):
+        if error:
+            result.errors[schema_name] = error
+        else:
+            result.created.append(schema_name)
+        if progress:
+            progress(done, total, schema_name, error)
@@ -0,0 +1,440 @@
+"""
+Sharding de tenants entre bancos PostgreSQL.
+
+Cada Client tem um `shard` (alias em DATABASES) onde fica o schema dele; os
+dados públicos (Client, Domain, User) ficam sempre no default, que funciona
+como catálogo. O TenantShardRouter (apps.core.routers) manda as queries dos
+models de TENANT_APPS para o shard do tenant ativo na conexão default.
+
+Preparar um shard novo (banco vazio):
+
+    python manage.py migrate_shards --shard shard1
+
+Mover um tenant entre shards sem indisponibilidade de leitura:
+
+    python manage.py move_tenant_shard acme shard1
+"""
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from functools import lru_cache
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connections, transaction
+from django_tenants.postgresql_backend.base import _check_schema_name
+from django_tenants.utils import schema_exists, tenant_context
+
+from .models import Client
+from .tenant_cache import invalidate_tenant, max_staleness, wait_for_propagation
+
+# Linhas de COPY acima disso vão para arquivo temporário em disco
+COPY_SPOOL_BYTES = 64 * 1024 * 1024
+
+
+def shard_aliases():
+    return list(settings.TENANT_SHARDS)
+
+
+def validate_shard(alias):
+    if alias not in shard_aliases():
+        raise ValueError(f"Shard '{alias}' não configurado (disponíveis: {', '.join(shard_aliases())})")
+
+
+@lru_cache(maxsize=None)
+def tenant_app_labels():
+    return frozenset(
+        app_config.label
+        for app_config in apps.get_app_configs()
+        if app_config.name in settings.TENANT_APPS
+    )
+
+
+def is_tenant_model(model):
+    return model._meta.app_label in tenant_app_labels()
+
+
+def tenant_models():
+    """Models dos apps de tenant, pais antes dos filhos (ordem das FKs)"""
+    pending = [
+        model for model in apps.get_models(include_auto_created=True)
+        if is_tenant_model(model) and model._meta.managed and not model._meta.proxy
+    ]
+    ordered = []
+    while pending:
+        for model in pending:
+            parents = {
+                field.related_model for field in model._meta.concrete_fields
+                if field.is_relation and field.related_model is not model
+                and is_tenant_model(field.related_model)
+            }
+            if parents.issubset(ordered):
+                ordered.append(model)
+                pending.remove(model)
+                break
+        else:
+            raise RuntimeError(f'Dependência circular entre os models de tenant: {pending}')
+    return ordered
+
+
+def create_shard_schema(tenant, alias, check_if_exists=False, sync_schema=True, verbosity=1):
+    """Equivalente de TenantMixin.create_schema em outro banco"""
+    _check_schema_name(tenant.schema_name)
+    connection = connections[alias]
+    if check_if_exists and schema_exists(tenant.schema_name, alias):
+        return False
+
+    connection.set_schema_to_public()
+    with connection.cursor() as cursor:
+        cursor.execute(f'CREATE SCHEMA "{tenant.schema_name}"')
+    if sync_schema:
+        call_command('migrate_schemas', tenant=True, schema_name=tenant.schema_name,
+                     database=alias, interactive=False, verbosity=verbosity)
+    connection.set_schema_to_public()
+    return True
+
+
+def drop_shard_schema(tenant, alias):
+    connection = connections[alias]
+    connection.set_schema_to_public()
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP SCHEMA IF EXISTS "{tenant.schema_name}" CASCADE')
+
+
+def migrate_shard(alias, verbosity=1):
+    """Migra o schema public do shard e os schemas dos tenants dele"""
+    validate_shard(alias)
+    call_command('migrate_schemas', shared=True, database=alias, interactive=False, verbosity=verbosity)
+    for schema_name in Client.objects.filter(shard=alias).values_list('schema_name', flat=True):
+        if schema_exists(schema_name, alias):
+            call_command('migrate_schemas', tenant=True, schema_name=schema_name,
+                         database=alias, interactive=False, verbosity=verbosity)
+
+
+# ---------------------------------------------------------------------------
+# Consultas entre shards
+# ---------------------------------------------------------------------------
+
+def tenants_by_shard(tenants=None):
+    """{alias: [tenants]} (padrão: todos os tenants ativos, exceto o public)"""
+    if tenants is None:
+        # Desativados (offboarding) podem já não ter dados
+        tenants = (
+            Client.objects.exclude(schema_name='public').filter(disabled_at__isnull=True).order_by('schema_name')
+        )
+    grouped = {}
+    for tenant in tenants:
+        grouped.setdefault(tenant.shard, []).append(tenant)
+    return grouped
+
+
+def for_each_tenant(func, tenants=None, parallel=True):
+    """
+    Executa `func(tenant)` dentro do contexto de cada tenant e devolve
+    {schema_name: resultado}. Com `parallel`, cada shard é percorrido em uma
+    thread própria (com as suas conexões), então o tempo total fica próximo do
+    shard mais lento em vez da soma de todos.
+    """
+    results = {}
+    errors = []
+    lock = threading.Lock()
+
+    def run(shard_tenants):
+        try:
+            for tenant in shard_tenants:
+                with tenant_context(tenant):
+                    result = func(tenant)
+                with lock:
+                    results[tenant.schema_name] = result
+        except Exception as error:
+            errors.append(error)
+        finally:
+            if parallel:
+                for connection in connections.all(initialized_only=True):
+                    connection.close()
+
+    groups = list(tenants_by_shard(tenants).values())
+    parallel = parallel and len(groups) > 1
+    if not parallel:
+        for group in groups:
+            run(group)
+    else:
+        threads = [threading.Thread(target=run, args=(group,)) for group in groups]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
+    return results
+
+
+def tenant_summary(tenant):
+    from apps.tasks.stats import tenant_stats
+
+    # Contadores mantidos por trigger: uma query por tenant, sem COUNT
+    stats = tenant_stats()
+    return {
+        'projects': stats['projects'],
+        'completed': stats['completed_projects'],
+        'tasks': stats['tasks'],
+        'shard': tenant.shard,
+    }
+
+
+def admin_report(tenants=None, parallel=True):
+    """Projetos, projetos concluídos e tarefas de cada tenant, em todos os shards"""
+    return for_each_tenant(tenant_summary, tenants, parallel=parallel)
+
+
+# ---------------------------------------------------------------------------
+# Migração de tenant entre shards
+# ---------------------------------------------------------------------------
+
+def qualified(schema_name, model):
+    return f'"{schema_name}"."{model._meta.db_table}"'
+
+
+def column_list(model):
+    return ', '.join(f'"{field.column}"' for field in model._meta.concrete_fields)
+
+
+def change_id_column(model):
+    """
+    Coluna com o id da transação da última escrita (change_id, gravado por
+    trigger a cada INSERT/UPDATE, qualquer que seja o caminho da escrita);
+    None se o model não tiver
+    """
+    return 'change_id' if any(field.column == 'change_id' for field in model._meta.concrete_fields) else None
+
+
+def changed_at_column(model):
+    """
+    Coluna com a hora da última escrita gravada pelo banco, para models sem
+    change_id que a declaram em `changed_at_column` (ex.: archived_at, com
+    db_default=Now()); None se não houver. updated_at não serve: vem do
+    Python, e um update() ou SQL direto não o altera.
+    """
+    column = getattr(model, 'changed_at_column', None)
+    return column if any(field.column == column for field in model._meta.concrete_fields) else None
+
+
+def copy_between(source, target, schema_name, model, since=None, since_change_id=None, upsert=False):
+    """
+    Copia as linhas de `model` do shard de origem para o de destino com COPY.
+    Com `upsert`, grava por INSERT ... ON CONFLICT na PK; com `since_change_id`
+    (ou `since`), copia só as linhas escritas a partir dele (change_id_column()
+    ou changed_at_column()).
+    """
+    columns = column_list(model)
+    query = f'SELECT {columns} FROM {qualified(schema_name, model)}'
+    params = []
+    if since_change_id is not None:
+        query += f' WHERE "{change_id_column(model)}" >= %s'
+        params.append(since_change_id)
+    elif since is not None:
+        query += f' WHERE "{changed_at_column(model)}" >= %s'
+        params.append(since)
+
+    with tempfile.SpooledTemporaryFile(max_size=COPY_SPOOL_BYTES) as buffer:
+        with source.cursor() as cursor:
+            sql = cursor.mogrify(query, params).decode() if params else query
+            cursor.copy_expert(f'COPY ({sql}) TO STDOUT WITH (FORMAT binary)', buffer)
+        buffer.seek(0)
+
+        with target.cursor() as cursor:
+            if not upsert:
+                cursor.copy_expert(
+                    f'COPY {qualified(schema_name, model)} ({columns}) FROM STDIN WITH (FORMAT binary)',
+                    buffer,
+                )
+                return
+
+            staging = f'_move_{model._meta.db_table}'
+            pk = model._meta.pk.column
+            updates = ', '.join(
+                f'"{field.column}" = EXCLUDED."{field.column}"'
+                for field in model._meta.concrete_fields if not field.primary_key
+            )
+            cursor.execute(
+                f'CREATE TEMP TABLE "{staging}" (LIKE {qualified(schema_name, model)}) ON COMMIT DROP'
+            )
+            cursor.copy_expert(f'COPY "{staging}" ({columns}) FROM STDIN WITH (FORMAT binary)', buffer)
+            cursor.execute(
+                f'INSERT INTO {qualified(schema_name, model)} ({columns}) '
+                f'SELECT {columns} FROM "{staging}" '
+                f'ON CONFLICT ("{pk}") DO UPDATE SET {updates}'
+            )
+
+
+@contextmanager
+def triggers_disabled(connection, schema_name, models):
+    """
+    Desliga os triggers de usuário das tabelas durante uma cópia: as linhas
+    chegam com change_id, contadores e tombstones da origem, que os triggers
+    recalculariam (contando tudo de novo). Precisa de uma transação; o ALTER
+    TABLE trava as tabelas até o commit.
+    """
+    with connection.cursor() as cursor:
+        for model in models:
+            cursor.execute(f'ALTER TABLE {qualified(schema_name, model)} DISABLE TRIGGER USER')
+    yield
+    with connection.cursor() as cursor:
+        # As FKs do Django são DEFERRABLE: checadas agora, senão ficam como
+        # eventos pendentes que impedem o ALTER TABLE
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        for model in models:
+            cursor.execute(f'ALTER TABLE {qualified(schema_name, model)} ENABLE TRIGGER USER')
+        cursor.execute('SET CONSTRAINTS ALL DEFERRED')
+
+
+def primary_keys(connection, schema_name, model):
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT "{model._meta.pk.column}" FROM {qualified(schema_name, model)}')
+        return {row[0] for row in cursor.fetchall()}
+
+
+def reset_sequences(connection, schema_name, models):
+    with connection.cursor() as cursor:
+        for model in models:
+            pk = model._meta.pk
+            if pk.get_internal_type() not in ('AutoField', 'BigAutoField', 'SmallAutoField'):
+                continue
+            table = qualified(schema_name, model)
+            cursor.execute(
+                f"SELECT setval(pg_get_serial_sequence(%s, %s), COALESCE(MAX(\"{pk.column}\"), 1), "
+                f"MAX(\"{pk.column}\") IS NOT NULL) FROM {table}",
+                [table, pk.column],
+            )
+
+
+@contextmanager
+def snapshot(connection):
+    """
+    Transação REPEATABLE READ READ ONLY na conexão: todas as leituras dentro
+    dela veem o mesmo snapshot, então tabelas lidas uma depois da outra são
+    coerentes entre si (nenhuma tarefa sem o seu projeto). Dentro de uma
+    transação já aberta (ex.: nos testes) vale o snapshot dela.
+    """
+    outermost = not connection.in_atomic_block
+    with transaction.atomic(using=connection.alias):
+        if outermost:
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY')
+        yield
+
+
+def database_now(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT now()')
+        return cursor.fetchone()[0]
+
+
+def snapshot_xmin(connection):
+    """
+    xmin do snapshot atual: toda transação que o snapshot não enxerga (em
+    andamento ou futura) tem id, e portanto change_id, maior ou igual a ele
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint')
+        return cursor.fetchone()[0]
+
+
+def move_tenant(tenant, target, grace=2.0, clock_skew=60.0, keep_source=False, log=None):
+    """
+    Move o schema de `tenant` para o shard `target` sem parar as leituras:
+
+      1. cria o schema no destino e copia tudo de um único snapshot da origem
+         (escritas continuam na origem);
+      2. congela as escritas do tenant (503 no TenantWriteFreezeMiddleware),
+         espera `grace` segundos pelas requisições em andamento e copia o
+         delta: linhas com change_id a partir do xmin do snapshot (vale para
+         save(), update() e SQL direto), as de changed_at_column() desde o
+         início da cópia (menos `clock_skew`, para transações longas), as
+         tabelas sem nenhum dos dois inteiras, e as remoções; o task_count
+         dos projetos é recontado no destino;
+      3. troca o shard do Client e descongela. O schema antigo é removido
+         (salvo com `keep_source`) quando a troca já vale em todos os
+         processos (tenant_cache.wait_for_propagation).
+    """
+    from apps.tasks.stats import recount_project_tasks
+
+    log = log or (lambda message: None)
+    validate_shard(target)
+    source_alias = tenant.shard
+    if source_alias == target:
+        raise ValueError(f"Tenant '{tenant.schema_name}' já está no shard '{target}'")
+    if schema_exists(tenant.schema_name, target):
+        raise ValueError(f"Schema '{tenant.schema_name}' já existe no shard '{target}'")
+
+    source, destination = connections[source_alias], connections[target]
+    models = tenant_models()
+    schema_name = tenant.schema_name
+    frozen = False
+
+    log(f'Criando schema {schema_name} em {target}')
+    create_shard_schema(tenant, target, verbosity=0)
+    try:
+        # O que o snapshot não enxerga tem change_id >= xmin, ou foi escrito
+        # depois de now() (o início da transação): entra no delta
+        with snapshot(source):
+            started_at = database_now(source)
+            xmin = snapshot_xmin(source)
+            with transaction.atomic(using=target), triggers_disabled(destination, schema_name, models):
+                for model in models:
+                    log(f'Copiando {model._meta.db_table}')
+                    copy_between(source, destination, schema_name, model)
+
+        log(f'Congelando escritas de {schema_name} por até {grace}s + delta')
+        Client.objects.filter(pk=tenant.pk).update(writes_frozen=True)
+        invalidate_tenant(tenant)
+        frozen = True
+        # Workers com o tenant em cache local só veem o congelamento quando a entrada expira
+        time.sleep(grace + max_staleness())
+
+        # Tabelas sem change_id nem changed_at_column são copiadas inteiras de novo
+        since = started_at - timedelta(seconds=clock_skew)
+        with transaction.atomic(using=target), triggers_disabled(destination, schema_name, models):
+            for model in models:
+                if change_id_column(model):
+                    copy_between(source, destination, schema_name, model, since_change_id=xmin, upsert=True)
+                else:
+                    copy_between(source, destination, schema_name, model,
+                                 since=since if changed_at_column(model) else None, upsert=True)
+            for model in reversed(models):
+                removed = primary_keys(destination, schema_name, model) - primary_keys(source, schema_name, model)
+                if removed:
+                    with destination.cursor() as cursor:
+                        cursor.execute(
+                            f'DELETE FROM {qualified(schema_name, model)} '
+                            f'WHERE "{model._meta.pk.column}" = ANY(%s)',
+                            [list(removed)],
+                        )
+            # Tarefas criadas ou removidas mudam o task_count do projeto sem
+            # tocar o updated_at dele: o delta não traz esse valor
+            recount_project_tasks(destination, schema_name)
+            reset_sequences(destination, schema_name, models)
+
+        Client.objects.filter(pk=tenant.pk).update(shard=target, writes_frozen=False)
+        invalidate_tenant(tenant)
+        frozen = False
+    except BaseException:
+        if frozen:
+            Client.objects.filter(pk=tenant.pk).update(writes_frozen=False)
+            invalidate_tenant(tenant)
+        drop_shard_schema(tenant, target)
+        raise
+
+    tenant.shard = target
+    if not keep_source:
+        # Processos com o Client antigo em cache ainda leem da origem
+        wait_for_propagation()
+        log(f'Removendo schema {schema_name} de {source_alias}')
+        source.set_schema_to_public()
+        with source.cursor() as cursor:
+            cursor.execute(f'DROP SCHEMA "{schema_name}" CASCADE')
+    return tenant
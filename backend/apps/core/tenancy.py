@@ -0,0 +1,208 @@
+"""
+Tenancy híbrida: schema próprio ou tabelas compartilhadas.
+
+Os models dos apps de tenant herdam de TenantScopedModel. As tabelas deles
+existem em cada schema de tenant e também no public (o app está em
+SHARED_APPS e TENANT_APPS). Tenants com tenancy_mode='shared' não têm schema:
+o search_path "<schema>, public" cai nas tabelas do public (o PostgreSQL
+ignora schemas inexistentes) e o manager filtra as linhas pelo tenant_id.
+
+O filtro é decidido na compilação do SQL, com o tenant da conexão que executa
+a query (a do shard ou da réplica, a da thread do ORM async):
+
+  - schema próprio: nenhum filtro (o schema já isola os dados);
+  - compartilhado: WHERE tenant_id = <id do tenant>;
+  - schema public (sem tenant): nenhuma linha.
+
+Quando um tenant compartilhado cresce:
+
+    python manage.py promote_tenant acme
+"""
+import time
+
+from django.core.exceptions import EmptyResultSet, FullResultSet
+from django.db import connection, connections, models, transaction
+from django.db.models import BooleanField, Expression, F
+from django_tenants.utils import get_public_schema_name
+
+from .models import Client
+from .tenant_cache import invalidate_tenant, max_staleness, wait_for_propagation
+
+# schema_name -> (id, modo) dos tenants ativados por schema_context(), que
+# só carrega o nome do schema. Um tenant promovido pode ficar com o modo
+# antigo aqui: as linhas continuam com o tenant_id, então o filtro segue certo.
+_tenants_by_schema = {}
+
+
+def active_tenant(db_connection=None):
+    """(id, compartilhado?) do tenant ativo na conexão; id None no public"""
+    db_connection = db_connection or connection
+    schema_name = db_connection.schema_name
+    if schema_name == get_public_schema_name():
+        return None, False
+
+    tenant = db_connection.tenant
+    if isinstance(tenant, Client):
+        return tenant.pk, tenant.is_shared
+
+    if schema_name not in _tenants_by_schema:
+        row = Client.objects.filter(schema_name=schema_name).values_list('pk', 'tenancy_mode').first()
+        _tenants_by_schema[schema_name] = (row[0], row[1] == Client.SHARED_MODE) if row else (None, False)
+    return _tenants_by_schema[schema_name]
+
+
+class TenantScope(Expression):
+    """Condição do WHERE que restringe as linhas ao tenant ativo"""
+    conditional = True
+
+    def __init__(self, column='tenant_id'):
+        super().__init__(output_field=BooleanField())
+        self.column = F(column)
+
+    def get_source_expressions(self):
+        return [self.column]
+
+    def set_source_expressions(self, exprs):
+        (self.column,) = exprs
+
+    def as_sql(self, compiler, connection):
+        if connection.schema_name == get_public_schema_name():
+            raise EmptyResultSet
+        tenant_id, shared = active_tenant(connection)
+        if not shared:
+            raise FullResultSet
+        sql, params = compiler.compile(self.column)
+        return f'{sql} = %s', (*params, tenant_id)
+
+
+class TenantScopedQuerySet(models.QuerySet):
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        tenant_id, _ = active_tenant()
+        for obj in objs:
+            if obj.tenant_id is None:
+                obj.tenant_id = tenant_id
+        return super().bulk_create(objs, *args, **kwargs)
+
+
+class TenantScopedManager(models.Manager.from_queryset(TenantScopedQuerySet)):
+
+    def get_queryset(self):
+        return super().get_queryset().filter(TenantScope())
+
+
+class TenantScopedModel(models.Model):
+    """
+    Base dos models de tenant. `objects` já vem filtrado pelo tenant ativo;
+    `unscoped` enxerga todas as linhas da tabela (uso administrativo).
+    """
+    tenant = models.ForeignKey(
+        Client,
+        null=True,
+        blank=True,
+        editable=False,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,  # a tabela pode estar em um schema de tenant ou em outro shard
+        related_name='+',
+    )
+
+    objects = TenantScopedManager()
+    unscoped = models.Manager()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        # Preenchido em todos os modos: mantém o filtro correto depois de
+        # uma promoção para schema próprio
+        if self.tenant_id is None:
+            self.tenant_id, _ = active_tenant()
+        super().save(*args, **kwargs)
+
+
+def shared_table(model):
+    return f'"{get_public_schema_name()}"."{model._meta.db_table}"'
+
+
+def delete_shared_rows(tenant):
+    """Remove as linhas de um tenant compartilhado das tabelas do public"""
+    from .sharding import tenant_models
+
+    # Filhos antes dos pais; por último as tabelas em que os triggers das
+    # outras escrevem (tombstones, estatísticas), senão as exclusões anteriores
+    # deixariam linhas novas nelas
+    models_ = sorted(reversed(tenant_models()), key=lambda model: getattr(model, 'trigger_maintained', False))
+    with transaction.atomic(using=tenant.shard):
+        with connections[tenant.shard].cursor() as cursor:
+            for model in models_:
+                cursor.execute(f'DELETE FROM {shared_table(model)} WHERE "tenant_id" = %s', [tenant.pk])
+
+
+def promote_tenant(tenant, grace=2.0, log=None):
+    """
+    Move um tenant compartilhado para um schema próprio:
+
+      1. congela as escritas (503) e espera `grace` segundos pelas
+         requisições em andamento;
+      2. cria e migra o schema com um nome temporário, que é renomeado na
+         mesma transação da cópia das linhas - antes do commit as leituras
+         continuam nas tabelas compartilhadas, depois já encontram o schema;
+      3. troca o tenancy_mode, descongela e, quando a troca já vale em todos
+         os processos, apaga as linhas compartilhadas.
+    """
+    from .sharding import column_list, qualified, reset_sequences, tenant_models, triggers_disabled
+
+    log = log or (lambda message: None)
+    if not tenant.is_shared:
+        raise ValueError(f"Tenant '{tenant.schema_name}' já tem schema próprio")
+
+    alias = tenant.shard
+    db_connection = connections[alias]
+    staging = Client(schema_name=f'_promote_{tenant.pk}', shard=alias)
+    models_ = tenant_models()
+
+    log(f'Congelando escritas de {tenant.schema_name} por {grace}s')
+    Client.objects.filter(pk=tenant.pk).update(writes_frozen=True)
+    invalidate_tenant(tenant)
+    try:
+        # Workers com o tenant em cache local só veem o congelamento quando a entrada expira
+        time.sleep(grace + max_staleness())
+        log(f'Criando schema {tenant.schema_name}')
+        staging.create_schema(verbosity=0)
+        try:
+            with transaction.atomic(using=alias):
+                db_connection.set_schema_to_public()
+                with db_connection.cursor() as cursor:
+                    cursor.execute(f'ALTER SCHEMA "{staging.schema_name}" RENAME TO "{tenant.schema_name}"')
+                with triggers_disabled(db_connection, tenant.schema_name, models_), db_connection.cursor() as cursor:
+                    for model in models_:
+                        log(f'Copiando {model._meta.db_table}')
+                        columns = column_list(model)
+                        cursor.execute(
+                            f'INSERT INTO {qualified(tenant.schema_name, model)} ({columns}) '
+                            f'SELECT {columns} FROM {shared_table(model)} WHERE "tenant_id" = %s',
+                            [tenant.pk],
+                        )
+                reset_sequences(db_connection, tenant.schema_name, models_)
+        except BaseException:
+            db_connection.set_schema_to_public()
+            with db_connection.cursor() as cursor:
+                cursor.execute(f'DROP SCHEMA IF EXISTS "{staging.schema_name}" CASCADE')
+            raise
+
+        Client.objects.filter(pk=tenant.pk).update(tenancy_mode=Client.SCHEMA_MODE, writes_frozen=False)
+        invalidate_tenant(tenant)
+    except BaseException:
+        Client.objects.filter(pk=tenant.pk).update(writes_frozen=False)
+        invalidate_tenant(tenant)
+        raise
+
+    tenant.tenancy_mode = Client.SCHEMA_MODE
+    tenant.writes_frozen = False
+    _tenants_by_schema.pop(tenant.schema_name, None)
+    # Processos com o Client antigo em cache ainda leem as linhas compartilhadas
+    wait_for_propagation()
+    log('Removendo linhas das tabelas compartilhadas')
+    delete_shared_rows(tenant)
+    return tenant
@@ -0,0 +1,182 @@
+"""
+Cache hostname -> tenant do processo (CachedTenantMainMiddleware).
+
+O TenantMainMiddleware do django-tenants faz um SELECT de Domain + Client em
+toda requisição. Aqui o Client resolvido fica em memória por
+TENANT_CACHE_TTL segundos (0 desliga o cache), e o warm-up
+(apps.core.warmup) pré-carrega os domínios dos tenants mais ativos.
+
+Invalidação:
+
+  * save/delete de Client e Domain (signals) e as mudanças feitas com
+    .update() (congelamento de escritas, troca de shard, promoção,
+    desativação) chamam invalidate_tenant();
+  * invalidate_tenant() incrementa uma geração no cache do Django: com um
+    cache compartilhado (ex.: Redis) todos os processos descartam as entradas
+    na próxima requisição. Com o cache local padrão, os outros processos só
+    veem a mudança quando a entrada expira - max_staleness() diz quanto
+    esperar (usado antes de copiar dados com as escritas congeladas), e
+    wait_for_propagation() espera esse tempo antes dos passos destrutivos
+    (remover o schema de origem, as linhas compartilhadas, arquivar).
+"""
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import metrics
+from .models import Client, Domain
+
+GENERATION_KEY = 'tenant-cache:generation'
+LOCAL_CACHE_BACKENDS = ('django.core.cache.backends.locmem', 'django.core.cache.backends.dummy')
+
+
+class TenantCache:
+    """{hostname: (tenant, expira_em)} com limite de tamanho"""
+
+    def __init__(self, ttl=30.0, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.generation = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, hostname, now=None):
+        """Cópia do tenant em cache (o objeto vai para request.tenant) ou None"""
+        now = now if now is not None else time.monotonic()
+        with self.lock:
+            entry = self.entries.get(hostname)
+            if entry is None or entry[1] <= now:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return copy.copy(entry[0])
+
+    def put(self, hostname, tenant, now=None):
+        if self.ttl <= 0:
+            return
+        now = now if now is not None else time.monotonic()
+        with self.lock:
+            if len(self.entries) >= self.max_size and hostname not in self.entries:
+                # Cheio: descarta as expiradas e, se preciso, a mais antiga
+                self.entries = {host: entry for host, entry in self.entries.items() if entry[1] > now}
+                if len(self.entries) >= self.max_size:
+                    self.entries.pop(min(self.entries, key=lambda host: self.entries[host][1]))
+            self.entries[hostname] = (tenant, now + self.ttl)
+
+    def invalidate(self, tenant_id=None):
+        """Remove as entradas de um tenant (ou todas, com tenant_id None)"""
+        with self.lock:
+            self.invalidations += 1
+            if tenant_id is None:
+                self.entries = {}
+            else:
+                self.entries = {
+                    host: entry for host, entry in self.entries.items() if entry[0].pk != tenant_id
+                }
+
+    def sync_generation(self, generation):
+        """Descarta tudo se outro processo invalidou algum tenant desde a última requisição"""
+        if generation == self.generation:
+            return
+        with self.lock:
+            if self.generation is not None:
+                self.invalidations += 1
+                self.entries = {}
+            self.generation = generation
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'ttl': self.ttl,
+                'size': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Cache do processo, criado na primeira utilização"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TenantCache(ttl=settings.TENANT_CACHE_TTL, max_size=settings.TENANT_CACHE_MAX_SIZE)
+    return _cache
+
+
+metrics.register('tenant_cache', lambda: get_cache().snapshot())
+
+
+def current_generation():
+    return cache.get(GENERATION_KEY, 0)
+
+
+def invalidate_tenant(tenant=None):
+    """Descarta o tenant (ou todos) neste processo e avisa os demais pela geração"""
+    get_cache().invalidate(getattr(tenant, 'pk', tenant))
+    if cache.add(GENERATION_KEY, 1, timeout=None):
+        return
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        # Expulsa do cache entre o add e o incr
+        cache.add(GENERATION_KEY, 1, timeout=None)
+
+
+def max_staleness():
+    """Segundos até uma mudança no Client valer em todos os processos"""
+    if settings.TENANT_CACHE_TTL <= 0:
+        return 0
+    # `cache` é um proxy: o backend é o de caches['default']
+    if caches['default'].__class__.__module__.startswith(LOCAL_CACHE_BACKENDS):
+        return settings.TENANT_CACHE_TTL
+    return 0
+
+
+def wait_for_propagation(changed_at=None):
+    """
+    Espera uma mudança no Client (feita em `changed_at`; padrão: agora) valer
+    em todos os processos: os que ainda têm o Client antigo em cache seguiriam
+    lendo (ou escrevendo) onde o passo seguinte vai apagar
+    """
+    remaining = max_staleness()
+    if changed_at is not None:
+        remaining -= (timezone.now() - changed_at).total_seconds()
+    if remaining > 0:
+        time.sleep(remaining)
+
+
+def preload(domains):
+    """Coloca no cache os Domain (com tenant carregado); retorna quantos"""
+    tenant_cache = get_cache()
+    count = 0
+    for domain in domains:
+        tenant_cache.put(domain.domain, domain.tenant)
+        count += 1
+    return count
+
+
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+def client_changed(sender, instance, **kwargs):
+    invalidate_tenant(instance)
+
+
+@receiver(post_save, sender=Domain)
+@receiver(post_delete, sender=Domain)
+def domain_changed(sender, instance, **kwargs):
+    invalidate_tenant(instance.tenant_id)
@@ -1,30 +1,60 @@
 """
 Testes para os endpoints da API de autenticação
 """
-from django.test import TestCase, Client as TestClient, override_settings
+import asyncio
+import io
+import json
+import shutil
+import tarfile
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+import psycopg2
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.core.signals import request_finished
+from django.db import (
+    DEFAULT_DB_ALIAS, IntegrityError, OperationalError, close_old_connections, connection, connections, transaction,
+)
+from django.http import StreamingHttpResponse
+from django.test import Client as DjangoClient
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from apps.core.models import Client, Domain
+from django.utils import timezone
+from django_tenants.utils import schema_exists, tenant_context
+from apps.core import (
+    hashing, idempotency, metering, offboarding, openapi, routers, sharding, tenant_cache, timeouts, user_import, warmup,
+)
+from apps.core import api as auth_api
+from apps.core.hashing import CredentialHasher, HashingPoolSaturated
+from apps.core.jwt_utils import generate_jwt_token
+from apps.core.management.commands.profile_startup import parse_importtime
+from apps.core.postgresql_backend import base as postgresql_backend
+from apps.core.models import Client, Domain, IdempotencyRecord, TenantUsage
+from apps.core.query_budget import QueryBudgetExceeded, QueryCounter
+from apps.core.ratelimit import CacheRateLimiter, Limit, LocalRateLimiter, RateLimitMiddleware, get_limiter
+from apps.core.seeding import SchemaScript
+from apps.core.testing import FastTenantSchemaMixin, TenantAPITestCase
+from apps.tasks import archive
+from apps.tasks.models import ArchivedProject, Project, Task, TenantStats
+from project.apis import api
 
 User = get_user_model()
 
 
-@override_settings(
-    ALLOWED_HOSTS=['testserver', 'localhost', '127.0.0.1'],
-    MIDDLEWARE=[
-        'corsheaders.middleware.CorsMiddleware',
-        'django.middleware.security.SecurityMiddleware',
-        'django.contrib.sessions.middleware.SessionMiddleware',
-        'django.middleware.common.CommonMiddleware',
-        'django.middleware.csrf.CsrfViewMiddleware',
-        'django.contrib.auth.middleware.AuthenticationMiddleware',
-        'django.contrib.messages.middleware.MessageMiddleware',
-        'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    ]
-)
-class AuthenticationAPITestCase(TestCase):
+class AuthenticationAPITestCase(TenantAPITestCase):
     def setUp(self):
-        self.test_client = TestClient()
+        super().setUp()
+        # Requisições passam pelo roteamento de tenant (domínio do tenant de teste)
+        self.test_client = self.client
         self.api_base_url = '/api/auth'
         
         # Dados de teste
@@ -113,6 +143,70 @@ class AuthenticationAPITestCase(TestCase):
         self.assertFalse(data['success'])
         self.assertEqual(data['message'], 'Nome de usuário já existe')
 
+    def user_queries(self, queries):
+        return [query['sql'].split()[0] for query in queries if '"core_user"' in query['sql']]
+
+    def test_register_touches_users_table_twice(self):
+        """Uma query de unicidade e um único INSERT já com o tenant, sem UPDATE nem recarga"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.test_client.post(
+                f'{self.api_base_url}/register-jwt', self.test_user_data, content_type='application/json',
+            )
+        self.assertTrue(response.json()['success'])
+        self.assertEqual(self.user_queries(queries), ['SELECT', 'INSERT'])
+        self.assertEqual(response.json()['user']['tenant']['name'], 'Test Organization')
+        self.assertEqual(User.objects.get(username='testuser').tenant.name, 'Test Organization')
+
+    def test_register_budget_excludes_schema_migrations(self):
+        """O orçamento não cresce com o número de migrations do schema novo"""
+        apply = SchemaScript.apply
+
+        def apply_with_more_migrations(script, schema_name):
+            apply(script, schema_name)
+            with connection.cursor() as cursor:
+                for _ in range(200):
+                    cursor.execute('SELECT 1')
+
+        with mock.patch.object(SchemaScript, 'apply', apply_with_more_migrations):
+            for index, path in enumerate(('/api/auth/register', '/api/auth/register-jwt', '/api/async/auth/register-jwt')):
+                payload = dict(self.test_user_data, username=f'user{index}', email=f'user{index}@example.com',
+                               organization=f'Org{index}')
+                response = self.test_client.post(path, payload, content_type='application/json')
+                self.assertTrue(response.json()['success'], path)
+
+    def test_register_duplicate_email(self):
+        User.objects.create_user(username='other', email='test@example.com', password='existingpass')
+        response = self.test_client.post(
+            f'{self.api_base_url}/register', self.test_user_data, content_type='application/json',
+        )
+        self.assertEqual(response.json()['message'], 'E-mail já está em uso')
+
+    def test_register_failure_rolls_back_tenant(self):
+        """Tenant, domínio e usuário são criados na mesma transação"""
+        with mock.patch.object(User, 'save', side_effect=IntegrityError('username duplicado')):
+            response = self.test_client.post(
+                f'{self.api_base_url}/register', self.test_user_data, content_type='application/json',
+            )
+        self.assertFalse(response.json()['success'])
+        self.assertFalse(Client.objects.filter(name='Test Organization').exists())
+        self.assertFalse(schema_exists('test organization'))
+
+    def test_create_user_for_tenant_query_count(self):
+        owner = User.objects.create_user(username='owner', password='testpass123', tenant=self.tenant)
+        payload = {
+            'username': 'member', 'email': 'member@example.com',
+            'password': 'testpass123', 'password_confirm': 'testpass123',
+        }
+        # Autenticação, unicidade e INSERT (orçamento do endpoint: 3)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.test_client.post(
+                f'{self.api_base_url}/create-user-tenant', payload, content_type='application/json',
+                HTTP_AUTHORIZATION=f'Bearer {generate_jwt_token(owner)}',
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['tenant']['id'], self.tenant.pk)
+        self.assertEqual(self.user_queries(queries), ['SELECT', 'SELECT', 'INSERT'])
+
     def test_login_success(self):
         """Testa login bem-sucedido"""
         # Criar usuário primeiro
@@ -123,15 +217,7 @@ class AuthenticationAPITestCase(TestCase):
         )
         
         # Criar tenant para o usuário
-        tenant = Client.objects.create(
-            name='Test Org',
-            schema_name='test_org'
-        )
-        Domain.objects.create(
-            domain='testorg.localhost',
-            tenant=tenant,
-            is_primary=True
-        )
+        tenant = self.create_tenant('Test Org', 'test_org', 'testorg.localhost')
         user.tenant = tenant
         user.save()
         
@@ -184,15 +270,7 @@ class AuthenticationAPITestCase(TestCase):
             password='testpass123'
         )
         
-        tenant = Client.objects.create(
-            name='Test Org',
-            schema_name='test_org'
-        )
-        Domain.objects.create(
-            domain='testorg.localhost',
-            tenant=tenant,
-            is_primary=True
-        )
+        tenant = self.create_tenant('Test Org', 'test_org', 'testorg.localhost')
         user.tenant = tenant
         user.save()
         
@@ -219,15 +297,7 @@ class AuthenticationAPITestCase(TestCase):
             password='testpass123'
         )
         
-        tenant = Client.objects.create(
-            name='Test Org',
-            schema_name='test_org'
-        )
-        Domain.objects.create(
-            domain='testorg.localhost',
-            tenant=tenant,
-            is_primary=True
-        )
+        tenant = self.create_tenant('Test Org', 'test_org', 'testorg.localhost')
         user.tenant = tenant
         user.save()
         
@@ -247,3 +317,1111 @@ def test_logout(self):
     data = response.json()
     self.assertTrue(data['success'])
     self.assertEqual(data['message'], 'Logout realizado com sucesso')
+
+
+class CredentialHasherTestCase(SimpleTestCase):
+    """Pool limitado de hashing de senhas"""
+
+    def setUp(self):
+        self.release = threading.Event()
+        self.hasher = CredentialHasher(workers=1, queue_size=1, timeout=5, retry_after=3)
+        self.addCleanup(self.hasher.shutdown)
+        self.addCleanup(self.release.set)
+
+    def fill_pool(self):
+        """Ocupa o worker e a única vaga da fila"""
+        return [self.hasher.submit(self.release.wait) for _ in range(2)]
+
+    def test_rejects_when_queue_is_full(self):
+        self.fill_pool()
+        with self.assertRaises(HashingPoolSaturated) as ctx:
+            self.hasher.submit(make_password, 'senha')
+        self.assertEqual(ctx.exception.retry_after, 3)
+        self.assertEqual(self.hasher.snapshot()['rejected'], 1)
+
+    def test_metrics_report_queue_depth_and_latency(self):
+        futures = self.fill_pool()
+        snapshot = self.hasher.snapshot()
+        self.assertEqual(snapshot['running'] + snapshot['queue_depth'], 2)
+
+        self.release.set()
+        for future in futures:
+            future.result()
+        snapshot = self.hasher.snapshot()
+        self.assertEqual(snapshot['queue_depth'], 0)
+        self.assertEqual(snapshot['hash_latency']['count'], 2)
+
+    def test_cancelled_request_frees_its_slot(self):
+        self.hasher.timeout = 0.01
+        self.hasher.submit(self.release.wait)
+        with self.assertRaises(HashingPoolSaturated):
+            self.hasher.run(make_password, 'senha')
+        # A requisição que desistiu não fica segurando a vaga da fila
+        self.hasher.submit(make_password, 'senha')
+
+
+class CredentialHashingAPITestCase(TenantAPITestCase):
+    def test_login_returns_503_when_pool_is_saturated(self):
+        User.objects.create_user(username='storm', password='testpass123', tenant=self.tenant)
+        saturated = CredentialHasher(workers=1, queue_size=0)
+        release = threading.Event()
+        self.addCleanup(saturated.shutdown)
+        self.addCleanup(release.set)
+        saturated.submit(release.wait)
+
+        with mock.patch.object(hashing, '_hasher', saturated):
+            response = self.client.post(
+                '/api/auth/login-jwt',
+                {'username': 'storm', 'password': 'testpass123'},
+                content_type='application/json',
+            )
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_endpoint_exposes_hashing_pool(self):
+        response = self.client.get('/api/metrics', HTTP_X_METRICS_TOKEN='secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('queue_depth', response.json()['credential_hashing'])
+
+
+class LocalRateLimiterTestCase(SimpleTestCase):
+    def setUp(self):
+        self.limiter = LocalRateLimiter()
+
+    def test_allows_burst_then_refills_at_rate(self):
+        limit = Limit(rate=2, burst=3)
+        self.assertEqual([self.limiter.hit('k', limit, now=0) for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(self.limiter.hit('k', limit, now=0), 0.5)
+        # Depois de 0.5s entra mais um token
+        self.assertEqual(self.limiter.hit('k', limit, now=0.5), 0)
+        self.assertGreater(self.limiter.hit('k', limit, now=0.5), 0)
+
+    def test_concurrency_slots(self):
+        self.assertTrue(self.limiter.acquire('k', 1))
+        self.assertFalse(self.limiter.acquire('k', 1))
+        self.limiter.release('k', 1)
+        self.assertTrue(self.limiter.acquire('k', 1))
+
+    def test_idle_buckets_are_evicted(self):
+        limit = Limit(rate=1, burst=2)
+        self.limiter.swept_at = 0
+        self.limiter.hit('user:a:1', limit, now=0)
+        self.limiter.hit('user:a:2', limit, now=59.5)
+        self.limiter.hit('user:a:3', limit, now=LocalRateLimiter.SWEEP_INTERVAL)
+        # A chegada teórica de 1 ficou no passado; a de 2 ainda não
+        self.assertEqual(set(self.limiter.arrivals), {'user:a:2', 'user:a:3'})
+
+    def test_changed_limit_replaces_slots(self):
+        self.assertTrue(self.limiter.acquire('k', 1))
+        self.assertTrue(self.limiter.acquire('k', 2))
+        self.assertEqual(list(self.limiter.slots), ['k'])
+        # Liberação de uma vaga do limite antigo não mexe no semáforo novo
+        self.limiter.release('k', 1)
+        self.assertTrue(self.limiter.acquire('k', 2))
+        self.assertFalse(self.limiter.acquire('k', 2))
+
+
+class CacheRateLimiterTestCase(SimpleTestCase):
+    def setUp(self):
+        self.limiter = CacheRateLimiter()
+        self.limiter.reset()
+        self.key = 'ratelimit:concurrency:k'
+
+    def test_concurrency_slots(self):
+        self.assertTrue(self.limiter.acquire('k', 1))
+        self.assertFalse(self.limiter.acquire('k', 1))
+        self.limiter.release('k', 1)
+        self.assertTrue(self.limiter.acquire('k', 1))
+
+    def test_acquire_refreshes_ttl(self):
+        with mock.patch.object(self.limiter.cache, 'touch') as touch:
+            self.limiter.acquire('k', 2)
+        touch.assert_called_once_with(self.key, CacheRateLimiter.SLOT_TIMEOUT)
+
+    def test_release_after_expiry_does_not_go_negative(self):
+        self.assertTrue(self.limiter.acquire('k', 2))
+        self.assertTrue(self.limiter.acquire('k', 2))
+        # Expira e uma requisição nova recria a chave antes das liberações
+        self.limiter.cache.delete(self.key)
+        self.assertTrue(self.limiter.acquire('k', 2))
+        for _ in range(3):
+            self.limiter.release('k', 2)
+        self.assertEqual(self.limiter.cache.get(self.key), 0)
+        self.assertTrue(self.limiter.acquire('k', 2))
+        self.assertTrue(self.limiter.acquire('k', 2))
+        self.assertFalse(self.limiter.acquire('k', 2))
+
+    def test_acquire_survives_expiry_between_add_and_incr(self):
+        incr = self.limiter.cache.incr
+
+        def expire_then_incr(key, delta=1):
+            self.limiter.cache.delete(key)
+            return incr(key, delta)
+
+        with mock.patch.object(self.limiter.cache, 'incr', side_effect=expire_then_incr):
+            self.assertTrue(self.limiter.acquire('k', 1))
+        self.assertEqual(self.limiter.cache.get(self.key), 1)
+
+
+@override_settings(RATE_LIMIT_ENABLED=True, RATE_LIMIT_BACKEND='local')
+class RateLimitMiddlewareTestCase(TenantAPITestCase):
+    def setUp(self):
+        super().setUp()
+        get_limiter().reset()
+        self.addCleanup(get_limiter().reset)
+        user = User.objects.create_user(username='limited', password='testpass123', tenant=self.tenant)
+        self.headers = {'HTTP_AUTHORIZATION': f'Bearer {generate_jwt_token(user)}'}
+
+    def set_limits(self, **fields):
+        Client.objects.filter(pk=self.tenant.pk).update(**fields)
+
+    def test_tenant_limit_returns_429_with_retry_after(self):
+        self.set_limits(rate_limit=1, rate_limit_burst=2)
+        statuses = [self.client.get('/api/projects', **self.headers).status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+
+        response = self.client.get('/api/projects', **self.headers)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(response.json()['reason'], 'tenant')
+
+    def test_user_limit(self):
+        self.set_limits(rate_limit=0, user_rate_limit=1, user_rate_limit_burst=1)
+        self.assertEqual(self.client.get('/api/projects', **self.headers).status_code, 200)
+        response = self.client.get('/api/projects', **self.headers)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.json()['reason'], 'user')
+
+    def test_concurrency_cap_sheds_without_querying(self):
+        self.set_limits(rate_limit=0, user_rate_limit=0, max_concurrent_requests=1)
+        get_limiter().acquire(f'tenant:{self.tenant.schema_name}', 1)
+
+        client = DjangoClient(HTTP_HOST=self.domain.domain)
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = client.get('/api/projects', **self.headers)
+        self.assertEqual(response.status_code, 429)
+        # Só a query de resolução do domínio (TenantMainMiddleware)
+        self.assertEqual(counter.count, 1)
+        self.assertEqual(response.json()['reason'], 'concurrency')
+
+    def stream_through_middleware(self, content):
+        self.set_limits(rate_limit=0, user_rate_limit=0, max_concurrent_requests=1)
+        request = RequestFactory().get('/')
+        request.tenant = Client.objects.get(pk=self.tenant.pk)
+        self.slot_key = f'tenant:{self.tenant.schema_name}'
+        return RateLimitMiddleware(lambda request: StreamingHttpResponse(content))(request)
+
+    def test_streaming_response_holds_slot_until_consumed(self):
+        response = self.stream_through_middleware(iter([b'a', b'b']))
+        self.assertFalse(get_limiter().acquire(self.slot_key, 1))
+        self.assertEqual(b''.join(response), b'ab')
+        self.assertTrue(get_limiter().acquire(self.slot_key, 1))
+
+    def test_streaming_response_closed_unread_frees_slot(self):
+        # Cliente desconectou antes do primeiro chunk: o servidor só fecha a resposta
+        response = self.stream_through_middleware(iter([b'a']))
+        self.assertFalse(get_limiter().acquire(self.slot_key, 1))
+        # Como no test client: o request_finished fecharia a conexão da transação do teste
+        request_finished.disconnect(close_old_connections)
+        try:
+            response.close()
+        finally:
+            request_finished.connect(close_old_connections)
+        self.assertTrue(get_limiter().acquire(self.slot_key, 1))
+
+    def test_async_streaming_response_holds_slot_until_consumed(self):
+        async def content():
+            yield b'a'
+
+        async def consume(response):
+            return [chunk async for chunk in response]
+
+        response = self.stream_through_middleware(content())
+        self.assertFalse(get_limiter().acquire(self.slot_key, 1))
+        self.assertEqual(asyncio.run(consume(response)), [b'a'])
+        self.assertTrue(get_limiter().acquire(self.slot_key, 1))
+
+
+@override_settings(METERING_ENABLED=True)
+class UsageMeteringTestCase(TenantAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.meter = metering.UsageMeter(bucket_seconds=300, flush_interval=0)
+        patcher = mock.patch.object(metering, '_meter', self.meter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        user = User.objects.create_user(username='metered', password='testpass123', tenant=self.tenant)
+        self.headers = {'HTTP_AUTHORIZATION': f'Bearer {generate_jwt_token(user)}'}
+
+    def test_requests_are_buffered_and_flushed_in_one_upsert(self):
+        Project.objects.create(name='Medido', tenant=self.tenant)
+        responses = [self.client.get('/api/projects', **self.headers) for _ in range(3)]
+        created = self.client.post(
+            '/api/projects', {'name': 'Novo', 'description': ''}, content_type='application/json', **self.headers,
+        )
+        self.assertEqual(created.status_code, 200)
+        self.assertFalse(TenantUsage.objects.exists())
+
+        self.assertEqual(self.meter.flush(), 1)
+        self.assertEqual(self.meter.snapshot()['flushes'], 1)
+
+        usage = TenantUsage.objects.get(tenant=self.tenant)
+        self.assertEqual(usage.requests, 4)
+        self.assertGreater(usage.db_time_ms, 0)
+        self.assertGreaterEqual(usage.rows_read, 3)
+        self.assertGreaterEqual(usage.rows_written, 1)
+        self.assertGreater(usage.bytes_out, sum(len(r.content) for r in responses))
+
+        # Flush seguinte no mesmo intervalo soma sobre a linha existente
+        self.client.get('/api/projects', **self.headers)
+        self.meter.flush()
+        usage.refresh_from_db()
+        self.assertEqual(usage.requests, 5)
+
+    def test_failed_flush_keeps_usage_in_memory(self):
+        self.meter.record(self.tenant.pk, requests=2, now=0)
+        with mock.patch.object(metering, 'execute_values', side_effect=RuntimeError('down')), \
+                self.assertLogs('apps.core.metering', 'ERROR'):
+            self.assertEqual(self.meter.flush(), 0)
+        self.assertEqual(self.meter.snapshot()['failures'], 1)
+        self.assertEqual(self.meter.flush(), 1)
+        self.assertEqual(TenantUsage.objects.get(tenant=self.tenant).requests, 2)
+
+    def test_top_tenants(self):
+        other = self.create_tenant(
+            'metered_other', 'test_metered_other', 'metered-other.test.localhost', tenancy_mode=Client.SHARED_MODE,
+        )
+        now = metering.time.time()
+        self.meter.record(self.tenant.pk, requests=5, db_time_ms=10, now=now)
+        self.meter.record(other.pk, requests=2, db_time_ms=50, now=now)
+        self.meter.record(other.pk, requests=100, now=now - 3 * 86400)  # fora da janela
+        self.meter.flush()
+
+        headers = {'HTTP_X_METRICS_TOKEN': 'secret'}
+        with override_settings(METRICS_TOKEN='secret'):
+            response = self.client.get('/api/metering/top?metric=requests', **headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([(row['tenant_id'], row['requests']) for row in response.json()],
+                             [(self.tenant.pk, 5), (other.pk, 2)])
+
+            response = self.client.get('/api/metering/top?metric=db_time_ms&limit=1', **headers)
+            self.assertEqual([row['schema_name'] for row in response.json()], ['test_metered_other'])
+
+            self.assertEqual(self.client.get('/api/metering/top?metric=nope', **headers).status_code, 400)
+            self.assertEqual(self.client.get('/api/metering/top').status_code, 403)
+
+    def test_observability_endpoints_are_closed_without_token(self):
+        for token in (None, ''):
+            with self.subTest(token=token), override_settings(METRICS_TOKEN=token):
+                for path in ('/api/metrics', '/api/metering/top'):
+                    response = self.client.get(path, HTTP_X_METRICS_TOKEN='')
+                    self.assertEqual(response.status_code, 403, path)
+
+
+class ReadReplicaRouterTestCase(TenantAPITestCase):
+    """
+    Sem uma réplica real nos testes, o alias da réplica aponta para o próprio
+    default; o que se verifica aqui é a decisão de roteamento.
+    """
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        patcher = mock.patch.object(routers, 'REPLICA_ALIAS', DEFAULT_DB_ALIAS)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.router = routers.TenantReadReplicaRouter()
+        self.request = RequestFactory().get('/')
+        self.request.tenant = self.tenant
+
+        @routers.read_only_route
+        def view(request):
+            return self.router.db_for_read(Project)
+
+        self.view = view
+
+    def test_read_only_route_reads_from_replica_with_tenant_schema(self):
+        self.assertEqual(self.view(self.request), routers.REPLICA_ALIAS)
+        self.assertEqual(connections[routers.REPLICA_ALIAS].schema_name, self.tenant.schema_name)
+        # Fora da rota, as leituras seguem o roteamento padrão
+        self.assertIsNone(self.router.db_for_read(Project))
+
+    def test_tenant_write_keeps_reads_on_primary(self):
+        Project.objects.create(name='Novo')
+        self.assertTrue(routers.is_sticky(self.tenant.schema_name))
+        self.assertIsNone(self.view(self.request))
+
+    def test_writes_never_go_to_replica(self):
+        self.assertEqual(self.router.db_for_write(Project), DEFAULT_DB_ALIAS)
+
+    @override_settings(TESTING=False)
+    def test_replica_requires_shared_sticky_cache(self):
+        with self.assertRaises(ImproperlyConfigured):
+            routers.check_sticky_cache()
+
+        shared = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp/sticky'}
+        with override_settings(CACHES={**settings.CACHES, 'shared': shared}, REPLICA_STICKY_CACHE_ALIAS='shared'):
+            routers.check_sticky_cache()
+
+
+class SearchPathElisionTestCase(TenantAPITestCase):
+    """O SET search_path só é reenviado quando o schema da conexão muda"""
+
+    def sets_during(self, func):
+        before = postgresql_backend.stats['search_path_sets']
+        func()
+        return postgresql_backend.stats['search_path_sets'] - before
+
+    def query(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+
+    def test_same_tenant_does_not_reset_search_path(self):
+        self.query()
+        # O middleware chama set_tenant a cada requisição
+        connection.set_tenant(self.tenant)
+        self.assertEqual(self.sets_during(self.query), 0)
+
+    def test_switching_schema_sets_search_path(self):
+        self.query()
+        connection.set_schema_to_public()
+        self.assertEqual(self.sets_during(self.query), 1)
+        connection.set_tenant(self.tenant)
+        self.assertEqual(self.sets_during(self.query), 1)
+
+    def test_rollback_forgets_applied_search_path(self):
+        def rolled_back():
+            with self.assertRaises(ValueError):
+                with transaction.atomic():
+                    self.query()
+                    raise ValueError
+
+        self.query()
+        # O primeiro cursor depois do ROLLBACK TO SAVEPOINT (o RELEASE do
+        # atomic) reenvia o SET
+        self.assertEqual(self.sets_during(rolled_back), 1)
+        self.assertEqual(self.sets_during(self.query), 0)
+
+
+class QueryTimeoutTestCase(TenantAPITestCase):
+    def setUp(self):
+        super().setUp()
+        user = User.objects.create_user(username='impatient', password='testpass123', tenant=self.tenant)
+        self.headers = {'HTTP_AUTHORIZATION': f'Bearer {generate_jwt_token(user)}'}
+        self.addCleanup(timeouts.apply_timeouts, None)
+
+    def show(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SHOW {name}')
+            return cursor.fetchone()[0]
+
+    def test_precedence(self):
+        tenant = Client(statement_timeout_ms=3000, endpoint_timeouts={'search': {'lock_timeout_ms': 10}})
+        with override_settings(QUERY_STATEMENT_TIMEOUT_MS=5000, QUERY_LOCK_TIMEOUT_MS=2000):
+            self.assertEqual(timeouts.resolve_timeouts(tenant, 'list_projects'), (3000, 2000))
+            self.assertEqual(timeouts.resolve_timeouts(Client(), 'list_projects'), (5000, 2000))
+            # O tenant sobrescreve o padrão do endpoint só onde configurou
+            self.assertEqual(
+                timeouts.resolve_timeouts(tenant, 'search', {'statement_timeout_ms': 15000, 'lock_timeout_ms': 0}),
+                (15000, 10),
+            )
+
+    def test_timeouts_go_with_the_search_path(self):
+        self.show('statement_timeout')
+        before = postgresql_backend.stats['search_path_sets']
+        timeouts.apply_timeouts((1234, 567))
+        self.assertEqual(self.show('statement_timeout'), '1234ms')
+        self.assertEqual(self.show('lock_timeout'), '567ms')
+        # Um único SET para search_path + timeouts; sem mudança, nenhum
+        self.assertEqual(postgresql_backend.stats['search_path_sets'] - before, 1)
+        timeouts.apply_timeouts(None)
+        self.assertEqual(self.show('statement_timeout'), '0')
+
+    def test_statement_timeout_raises_query_timeout(self):
+        @timeouts.with_query_timeouts
+        def slow(request):
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute('SELECT pg_sleep(1)')
+
+        request = RequestFactory().get('/')
+        request.tenant = Client(endpoint_timeouts={'slow': {'statement_timeout_ms': 20}})
+        before = timeouts.snapshot()['statement_timeouts']
+        with self.assertRaises(timeouts.QueryTimeout) as raised:
+            slow(request)
+        self.assertEqual(raised.exception.kind, 'statement')
+        self.assertEqual(timeouts.snapshot()['statement_timeouts'], before + 1)
+        self.assertIsNone(connection.query_timeouts)
+
+    def test_lock_timeout_returns_503(self):
+        Client.objects.filter(pk=self.tenant.pk).update(lock_timeout_ms=50)
+        params = connection.get_connection_params()
+        params.pop('cursor_factory', None)
+        blocker = psycopg2.connect(**params)
+        self.addCleanup(blocker.close)
+        with blocker.cursor() as cursor:
+            cursor.execute("SET lock_timeout = '5s'")
+            cursor.execute(f'LOCK TABLE "{self.tenant.schema_name}"."tasks_project" IN ACCESS EXCLUSIVE MODE')
+
+        before = timeouts.snapshot()['by_endpoint'].get('list_projects', 0)
+        response = self.client.get('/api/projects', **self.headers)
+        blocker.rollback()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(response.json()['timeout'], 'lock')
+        self.assertEqual(timeouts.snapshot()['by_endpoint']['list_projects'], before + 1)
+
+
+class TenantWriteFreezeTestCase(TenantAPITestCase):
+    def setUp(self):
+        super().setUp()
+        user = User.objects.create_user(username='frozen', password='testpass123', tenant=self.tenant)
+        self.headers = {'HTTP_AUTHORIZATION': f'Bearer {generate_jwt_token(user)}'}
+        Client.objects.filter(pk=self.tenant.pk).update(writes_frozen=True)
+
+    def test_writes_are_rejected_while_frozen(self):
+        response = self.client.post(
+            '/api/projects', {'name': 'Novo', 'description': ''},
+            content_type='application/json', **self.headers,
+        )
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+        self.assertFalse(Project.objects.exists())
+
+    def test_reads_and_login_keep_working(self):
+        self.assertEqual(self.client.get('/api/projects', **self.headers).status_code, 200)
+        response = self.client.post(
+            '/api/auth/login-jwt',
+            {'username': 'frozen', 'password': 'testpass123'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class IdempotencyTestCase(TenantAPITestCase):
+    def setUp(self):
+        super().setUp()
+        user = User.objects.create_user(username='retrier', password='testpass123', tenant=self.tenant)
+        self.headers = {'HTTP_AUTHORIZATION': f'Bearer {generate_jwt_token(user)}'}
+        self.payload = {'name': 'Offline', 'description': 'criado no metrô'}
+
+    def create_project(self, key, payload=None):
+        headers = dict(self.headers, HTTP_IDEMPOTENCY_KEY=key) if key else self.headers
+        return self.client.post(
+            '/api/projects', payload or self.payload, content_type='application/json', **headers,
+        )
+
+    def blocker(self):
+        """Conexão de outra "requisição" com a mesma chave"""
+        params = connection.get_connection_params()
+        params.pop('cursor_factory', None)
+        blocker = psycopg2.connect(**params)
+        blocker.autocommit = True
+        self.addCleanup(blocker.close)
+        return blocker
+
+    def test_replay_returns_stored_response(self):
+        first = self.create_project('retry-1')
+        self.assertEqual(first.status_code, 200)
+
+        with CaptureQueriesContext(connection) as queries:
+            replay = self.create_project('retry-1')
+        # Só o lookup: sem advisory lock e sem tocar nos models do tenant
+        executed = ' '.join(query['sql'] for query in queries)
+        self.assertNotIn('pg_advisory', executed)
+        self.assertNotIn('tasks_project', executed)
+        self.assertEqual(replay.status_code, 200)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(replay.json(), first.json())
+        self.assertEqual(Project.objects.count(), 1)
+
+    def test_requests_without_key_are_not_deduplicated(self):
+        self.create_project(None)
+        response = self.create_project(None)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertEqual(Project.objects.count(), 2)
+
+    def test_key_reused_with_other_payload_is_rejected(self):
+        self.create_project('retry-1')
+        response = self.create_project('retry-1', {'name': 'Outro', 'description': ''})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Project.objects.count(), 1)
+
+    def test_expired_key_runs_again(self):
+        self.create_project('retry-1')
+        IdempotencyRecord.objects.filter(key='retry-1').update(expires_at=timezone.now())
+        response = self.create_project('retry-1')
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertEqual(Project.objects.count(), 2)
+        self.assertEqual(idempotency.purge_expired(), 0)
+        self.assertEqual(IdempotencyRecord.objects.filter(key='retry-1').count(), 1)
+
+    def test_in_flight_duplicate_returns_409(self):
+        blocker = self.blocker()
+        with blocker.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_advisory_lock(hashtextextended(%s, 0))',
+                [idempotency.lock_name(self.tenant.pk, 'retry-1')],
+            )
+
+        with override_settings(IDEMPOTENCY_LOCK_TIMEOUT_MS=50):
+            response = self.create_project('retry-1')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(Project.objects.exists())
+
+    def test_concurrent_duplicate_waits_and_replays(self):
+        # A primeira requisição (outra conexão) grava a resposta e libera o
+        # lock enquanto a segunda espera: a segunda não executa a view.
+        request = RequestFactory().post(
+            '/api/projects', json.dumps(self.payload), content_type='application/json', **self.headers,
+        )
+        blocker = self.blocker()
+        lock = idempotency.lock_name(self.tenant.pk, 'retry-1')
+        with blocker.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_lock(hashtextextended(%s, 0))', [lock])
+
+        def finish_first():
+            with blocker.cursor() as cursor:
+                cursor.execute(
+                    'INSERT INTO public.core_idempotencyrecord '
+                    '(tenant_id, key, fingerprint, status_code, content_type, body, created_at, expires_at) '
+                    "VALUES (%s, 'retry-1', %s, 200, 'application/json', %s, now(), now() + interval '1 hour')",
+                    [self.tenant.pk, idempotency.fingerprint(request), b'{"id": 42}'],
+                )
+                cursor.execute('SELECT pg_advisory_unlock(hashtextextended(%s, 0))', [lock])
+
+        def cleanup():
+            with blocker.cursor() as cursor:
+                cursor.execute("DELETE FROM public.core_idempotencyrecord WHERE key = 'retry-1'")
+
+        self.addCleanup(cleanup)
+        timer = threading.Timer(0.2, finish_first)
+        timer.start()
+        response = self.create_project('retry-1')
+        timer.join()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'id': 42})
+        self.assertFalse(Project.objects.exists())
+
+    def test_register_retry_does_not_provision_twice(self):
+        payload = {
+            'username': 'mobile', 'email': 'mobile@example.com', 'password': 'testpass123',
+            'password_confirm': 'testpass123', 'organization': 'Mobile Org',
+        }
+        responses = [
+            self.client.post('/api/auth/register-jwt', payload, content_type='application/json',
+                        HTTP_IDEMPOTENCY_KEY='signup-1')
+            for _ in range(2)
+        ]
+        self.assertTrue(responses[0].json()['success'])
+        self.assertEqual(responses[1].json(), responses[0].json())
+        self.assertEqual(Client.objects.filter(name='Mobile Org').count(), 1)
+
+
+class UserImportTestCase(TenantAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username='owner', email='owner@example.com',
+                                              password='testpass123', tenant=self.tenant)
+        self.headers = {'HTTP_AUTHORIZATION': f'Bearer {generate_jwt_token(self.owner)}'}
+
+    def post_import(self, body, content_type='text/csv'):
+        response = self.client.post('/api/auth/import-users', body, content_type=content_type, **self.headers)
+        self.assertEqual(response.status_code, 200)
+        return [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    @override_settings(USER_IMPORT_CHUNK_SIZE=2, USER_IMPORT_HASH_WORKERS=1)
+    def test_csv_import_reports_row_errors(self):
+        body = (
+            'username,email,password,first_name,tenant\n'
+            'ana,ana@example.com,senha1,Ana,outro\n'
+            'bruno,bruno@example.com,senha2,Bruno,\n'
+            'ana,ana2@example.com,senha3,,\n'
+            'owner,novo@example.com,senha4,,\n'
+            'carla,sem-arroba,senha5,,\n'
+            'davi,davi@example.com,,,\n'
+        )
+        events = self.post_import(body)
+
+        self.assertEqual([event['done'] for event in events], [False, False, False, True])
+        self.assertEqual(events[-1], {'processed': 6, 'created': 2, 'failed': 4, 'done': True})
+        errors = [error for event in events for error in event.get('errors', [])]
+        self.assertEqual([error['line'] for error in errors], [4, 5, 6, 7])
+        self.assertEqual(errors[0]['error'], 'Nome de usuário repetido no arquivo')
+        self.assertEqual(errors[1]['error'], 'Nome de usuário já existe')
+        self.assertIn('password', errors[3]['error'])
+
+        # Todos no tenant do importador, com a senha utilizável
+        ana = User.objects.get(username='ana')
+        self.assertEqual(ana.tenant_id, self.tenant.pk)
+        self.assertEqual(ana.first_name, 'Ana')
+        self.assertTrue(ana.check_password('senha1'))
+        self.assertEqual(User.objects.filter(tenant=self.tenant).count(), 3)
+
+    @override_settings(USER_IMPORT_HASH_WORKERS=1)
+    def test_jsonl_import_inserts_each_chunk_in_one_query(self):
+        lines = [json.dumps({'username': f'user{n}', 'email': f'user{n}@example.com', 'password': 'x'})
+                 for n in range(5)]
+        lines.insert(2, '{quebrado')
+        with CaptureQueriesContext(connection) as queries:
+            events = self.post_import('\n'.join(lines), content_type='application/x-ndjson')
+        self.assertEqual(events[-1], {'processed': 6, 'created': 5, 'failed': 1, 'done': True})
+        self.assertIn('JSON inválido', events[0]['errors'][0]['error'])
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "core_user"')]
+        self.assertEqual(len(inserts), 1)
+
+    def test_rejects_unknown_format(self):
+        response = self.client.post('/api/auth/import-users', 'x', content_type='text/plain', **self.headers)
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(USER_IMPORT_HASH_WORKERS=1)
+    def test_batches_are_held_to_the_query_budget(self):
+        # O corpo é gerado depois da view: o orçamento vale por lote
+        with mock.patch.object(auth_api, 'IMPORT_BATCH_QUERY_BUDGET', 1):
+            response = self.client.post('/api/auth/import-users', 'username,email,password\nana,ana@example.com,x\n',
+                                        content_type='text/csv', **self.headers)
+            with self.assertRaises(QueryBudgetExceeded):
+                b''.join(response.streaming_content)
+
+    def test_batches_run_under_endpoint_timeouts(self):
+        Client.objects.filter(pk=self.tenant.pk).update(
+            endpoint_timeouts={'import_users_endpoint': {'statement_timeout_ms': 20}},
+        )
+
+        def slow(valid, errors):
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute('SELECT pg_sleep(1)')
+
+        with mock.patch.object(user_import.UserImport, 'exclude_existing', side_effect=slow):
+            events = self.post_import('username,email,password\nana,ana@example.com,x\n')
+        self.assertEqual(events[-1]['timeout'], 'statement')
+        self.assertTrue(events[-1]['done'])
+
+    @override_settings(USER_IMPORT_HASH_WORKERS=2)
+    def test_passwords_are_hashed_in_worker_processes(self):
+        self.addCleanup(user_import.shutdown)
+        hashes = user_import.hash_passwords(['um', 'dois', 'três'])
+        self.assertIsNotNone(user_import._pool)  # sem cair no hash local
+        self.assertEqual(len(set(hashes)), 3)
+        self.assertTrue(all(check_password(password, encoded)
+                            for password, encoded in zip(['um', 'dois', 'três'], hashes)))
+
+
+class OpenAPISchemaTestCase(TenantAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.build_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.build_dir)
+        self.path = f'{self.build_dir}/openapi.json'
+        settings_override = override_settings(OPENAPI_SCHEMA_PATH=self.path)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        openapi.reset_schema()
+        self.addCleanup(openapi.reset_schema)
+
+    def test_serves_built_file_with_etag(self):
+        call_command('build_openapi', stdout=io.StringIO())
+        with open(self.path, 'rb') as built:
+            body = built.read()
+
+        response = self.client.get('/api/openapi.json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, body)
+        self.assertEqual(response['ETag'], f'"{openapi.schema_etag(body)}"')
+        self.assertIn('max-age=', response['Cache-Control'])
+        self.assertIn('/api/projects', response.json()['paths'])
+
+        response = self.client.get('/api/openapi.json', HTTP_IF_NONE_MATCH=f'"{openapi.schema_etag(body)}"')
+        self.assertEqual(response.status_code, 304)
+
+    def test_without_file_schema_is_built_once(self):
+        with mock.patch.object(openapi, 'build_schema', wraps=openapi.build_schema) as build, \
+                self.assertLogs('apps.core.openapi', 'WARNING'):
+            first = self.client.get('/api/openapi.json')
+            second = self.client.get('/api/openapi.json')
+        self.assertEqual(build.call_count, 1)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(json.loads(first.content), json.loads(json.dumps(api.get_openapi_schema(path_prefix='/api/'))))
+
+    @override_settings(DEBUG=True)
+    def test_debug_ignores_built_file(self):
+        with open(self.path, 'w') as stale:
+            stale.write('{}')
+        response = self.client.get('/api/openapi.json')
+        self.assertIn('/api/projects', response.json()['paths'])
+
+    def test_check_detects_stale_file(self):
+        call_command('build_openapi', stdout=io.StringIO())
+        call_command('build_openapi', '--check', stdout=io.StringIO())
+        with open(self.path, 'w') as stale:
+            stale.write('{}')
+        with self.assertRaises(CommandError):
+            call_command('build_openapi', '--check', stdout=io.StringIO())
+
+
+class StartupProfileTestCase(SimpleTestCase):
+    def test_parse_importtime(self):
+        output = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |   apps.core.utils\n'
+            'import time:      4000 |       5200 | project.apis\n'
+            '{"setup_ms": 1}\n'
+        )
+        self.assertEqual(
+            parse_importtime(output),
+            [('apps.core.utils', 120, 120), ('project.apis', 4000, 5200)],
+        )
+
+
+class TenantCacheTestCase(TenantAPITestCase):
+    # O warm-up valida as conexões de todos os bancos (shards, réplica)
+    databases = '__all__'
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(tenant_cache, '_cache', tenant_cache.TenantCache(ttl=60))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.delete(tenant_cache.GENERATION_KEY)
+        user = User.objects.create_user(username='cached', password='testpass123', tenant=self.tenant)
+        self.headers = {'HTTP_AUTHORIZATION': f'Bearer {generate_jwt_token(user)}'}
+
+    def domain_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get('/api/projects', **self.headers).status_code, 200)
+        return [query['sql'] for query in queries if '"core_domain"."domain" =' in query['sql']]
+
+    def create_project(self):
+        return self.client.post(
+            '/api/projects', {'name': 'Novo', 'description': ''},
+            content_type='application/json', **self.headers,
+        )
+
+    @override_settings(TENANT_CACHE_TTL=30)
+    def test_wait_for_propagation_covers_the_rest_of_the_ttl(self):
+        with mock.patch.object(tenant_cache.time, 'sleep') as sleep:
+            tenant_cache.wait_for_propagation()
+            tenant_cache.wait_for_propagation(timezone.now() - timedelta(seconds=10))
+            tenant_cache.wait_for_propagation(timezone.now() - timedelta(minutes=5))
+        self.assertEqual(sleep.call_count, 2)
+        self.assertEqual(sleep.call_args_list[0].args[0], 30)
+        self.assertAlmostEqual(sleep.call_args_list[1].args[0], 20, delta=1)
+
+    def test_cached_hostname_skips_domain_query(self):
+        self.assertEqual(len(self.domain_queries()), 1)
+        self.assertEqual(self.domain_queries(), [])
+        self.assertEqual(tenant_cache.get_cache().snapshot()['hits'], 1)
+
+    def test_client_save_invalidates(self):
+        self.domain_queries()
+        self.tenant.writes_frozen = True
+        self.tenant.save()
+        self.assertEqual(self.create_project().status_code, 503)
+
+    def test_update_with_invalidate_tenant(self):
+        self.domain_queries()
+        Client.objects.filter(pk=self.tenant.pk).update(writes_frozen=True)
+        # Sem invalidação, o tenant em cache ainda aceita escritas
+        self.assertEqual(self.create_project().status_code, 200)
+        tenant_cache.invalidate_tenant(self.tenant)
+        self.assertEqual(self.create_project().status_code, 503)
+
+    def test_generation_bump_from_other_process_clears_cache(self):
+        self.domain_queries()
+        generation = tenant_cache.current_generation()
+        cache.set(tenant_cache.GENERATION_KEY, generation + 1, timeout=None)
+        self.assertEqual(len(self.domain_queries()), 1)
+
+    def test_warm_up_report(self):
+        TenantUsage.objects.create(tenant=self.tenant, bucket=timezone.now(), requests=10)
+        build_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, build_dir)
+        openapi.reset_schema()
+        self.addCleanup(openapi.reset_schema)
+
+        with override_settings(OPENAPI_SCHEMA_PATH=f'{build_dir}/openapi.json'):
+            call_command('build_openapi', stdout=io.StringIO())
+            report = warmup.warm_up()
+
+        self.assertTrue(all(step['ok'] for step in report.values()), report)
+        self.assertEqual(report['tenants']['result'], 1)
+        self.assertIn(DEFAULT_DB_ALIAS, report['connections']['result'])
+        self.assertIn('core/login.html', report['templates']['result'])
+        self.assertIn('project_list.html', report['templates']['result'])
+        self.assertGreater(report['openapi']['result'], 0)
+        self.assertEqual(self.domain_queries(), [])
+
+    def test_failed_step_does_not_stop_others(self):
+        with mock.patch.object(openapi, 'get_schema', side_effect=OSError('sem disco')), \
+                self.assertLogs('apps.core.warmup', 'ERROR'):
+            report = warmup.warm_up(['connections', 'openapi'])
+        self.assertEqual(list(report), ['connections', 'openapi'])
+        self.assertTrue(report['connections']['ok'])
+        self.assertEqual(report['openapi'], {'ok': False, 'error': 'sem disco', 'ms': report['openapi']['ms']})
+        with self.assertRaises(CommandError):
+            with mock.patch.object(openapi, 'get_schema', side_effect=OSError('sem disco')):
+                call_command('warmup', '--step', 'openapi', stdout=io.StringIO(), stderr=io.StringIO())
+
+
+class TenantOffboardingTestCase(TenantAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir)
+
+    def create_populated_tenant(self, name, **fields):
+        tenant = self.create_tenant(name, f'test_{name}', f'{name}.test.localhost', **fields)
+        User.objects.create_user(username=name, password='testpass123', tenant=tenant)
+        with tenant_context(tenant):
+            project = Project.objects.create(name='Arquivado')
+            project.tasks.create(name='Tarefa 1')
+            project.tasks.create(name='Tarefa 2')
+        return tenant
+
+    def read_archive(self, path):
+        with tarfile.open(path) as archive:
+            manifest = json.load(archive.extractfile('manifest.json'))
+            users = archive.extractfile(f'{User._meta.db_table}.csv').read().decode()
+        return manifest, users
+
+    def test_disabled_tenant_is_rejected_and_cannot_login(self):
+        user = User.objects.create_user(username='leaving', password='testpass123', tenant=self.tenant)
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {generate_jwt_token(user)}'}
+        offboarding.disable_tenant(Client.objects.get(pk=self.tenant.pk))
+
+        client = DjangoClient(HTTP_HOST=self.domain.domain)
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = client.get('/api/projects', **headers)
+        self.assertEqual(response.status_code, 410)
+        # Só a query de resolução do domínio (TenantMainMiddleware)
+        self.assertEqual(counter.count, 1)
+
+        self.assertIsNone(hashing.authenticate_credentials('leaving', 'testpass123'))
+
+    def test_offboard_shared_tenant_archives_and_deletes_in_chunks(self):
+        tenant = self.create_populated_tenant('leaving_shared', tenancy_mode=Client.SHARED_MODE)
+        offboarding.offboard_tenant(tenant, archive_dir=self.archive_dir, chunk_size=1)
+
+        tenant.refresh_from_db()
+        self.assertTrue(tenant.is_disabled)
+        self.assertEqual(tenant.offboarding_state, Client.OFFBOARDING_DONE)
+        # 1 projeto, 2 tarefas, 3 tombstones e a linha de estatísticas
+        self.assertEqual(tenant.offboarding_progress['deleted_rows'], 7)
+        self.assertFalse(Project.unscoped.filter(tenant_id=tenant.pk).exists())
+        self.assertFalse(Task.unscoped.filter(tenant_id=tenant.pk).exists())
+        self.assertFalse(TenantStats.unscoped.filter(tenant_id=tenant.pk).exists())
+        self.assertFalse(User.objects.filter(tenant=tenant).exists())
+        self.assertFalse(Domain.objects.filter(tenant=tenant).exists())
+
+        manifest, users = self.read_archive(tenant.offboarding_progress['archive'])
+        self.assertEqual(manifest['tables']['tasks_project'], 1)
+        self.assertEqual(manifest['tables']['tasks_task'], 2)
+        self.assertEqual(manifest['tables'][User._meta.db_table], 1)
+        self.assertEqual(manifest['domains'], ['leaving_shared.test.localhost'])
+        self.assertIn('username', users.splitlines()[0])
+        self.assertNotIn('password', users.splitlines()[0])
+
+    @override_settings(TENANT_CACHE_TTL=30)
+    def test_archive_waits_for_disable_to_propagate(self):
+        tenant = self.create_populated_tenant('leaving_wait', tenancy_mode=Client.SHARED_MODE)
+        steps = []
+
+        def archive(*args):
+            steps.append('archive')
+            raise RuntimeError('interrompido')
+
+        with mock.patch.object(tenant_cache.time, 'sleep', side_effect=lambda seconds: steps.append('wait')), \
+                mock.patch.object(offboarding, 'archive_tenant', side_effect=archive), \
+                self.assertRaises(RuntimeError):
+            offboarding.offboard_tenant(tenant, archive_dir=self.archive_dir)
+        self.assertEqual(steps, ['wait', 'archive'])
+
+    def test_offboard_schema_tenant_drops_schema(self):
+        tenant = self.create_populated_tenant('leaving_schema')
+        self.assertTrue(schema_exists(tenant.schema_name))
+        # Fora do teste cada DROP tem a sua transação; aqui as FKs pendentes
+        # da transação do teste impediriam o DROP TABLE
+        with connection.cursor() as cursor:
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        offboarding.offboard_tenant(tenant, archive_dir=self.archive_dir)
+
+        tenant.refresh_from_db()
+        self.assertEqual(tenant.offboarding_state, Client.OFFBOARDING_DONE)
+        self.assertFalse(schema_exists(tenant.schema_name))
+        progress = tenant.offboarding_progress
+        self.assertEqual(progress['dropped_tables'], progress['tables_total'])
+        manifest, _ = self.read_archive(progress['archive'])
+        self.assertEqual(manifest['tables']['tasks_task'], 2)
+        # Fica fora dos relatórios entre tenants
+        self.assertNotIn(tenant.schema_name, sharding.admin_report())
+
+    def test_lock_timeout_retries_then_gives_up(self):
+        class LockNotAvailable(Exception):
+            pgcode = '55P03'
+
+        error = OperationalError('lock timeout')
+        error.__cause__ = LockNotAvailable()
+        with mock.patch.object(offboarding.transaction, 'atomic', side_effect=error), \
+                mock.patch.object(offboarding.time, 'sleep') as sleep:
+            with self.assertRaises(OperationalError):
+                offboarding.with_lock_timeout(DEFAULT_DB_ALIAS, 'SELECT 1', retries=2)
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [0.5, 1.0])
+
+
+class TenantShardRouterTestCase(TenantAPITestCase):
+    def test_default_shard_uses_next_routers(self):
+        router = routers.TenantShardRouter()
+        self.assertIsNone(router.db_for_read(Project))
+        self.assertIsNone(router.db_for_write(Project))
+
+    def test_tenant_models_are_ordered_parents_first(self):
+        models = sharding.tenant_models()
+        self.assertLess(models.index(Project), models.index(Task))
+        self.assertNotIn(Client, models)
+
+    def test_admin_report(self):
+        project = Project.objects.create(name='Relatório', is_completed=True)
+        project.tasks.create(name='Tarefa')
+        report = sharding.admin_report(Client.objects.filter(pk=self.tenant.pk))
+        self.assertEqual(
+            report[self.tenant.schema_name],
+            {'projects': 1, 'completed': 1, 'tasks': 1, 'shard': 'default'},
+        )
+
+
+SHARD_ALIAS = next((alias for alias in settings.TENANT_SHARDS if alias != DEFAULT_DB_ALIAS), None)
+
+
+@skipUnless(SHARD_ALIAS, 'Nenhum shard configurado (DB_SHARDS)')
+class TenantShardMoveTestCase(TenantAPITestCase):
+    databases = {DEFAULT_DB_ALIAS, SHARD_ALIAS} if SHARD_ALIAS else {DEFAULT_DB_ALIAS}
+
+    def test_move_tenant_copies_data_and_routes_to_shard(self):
+        tenant = self.create_tenant('Sharded', 'test_sharded', 'sharded.test.localhost')
+        with tenant_context(tenant):
+            project = Project.objects.create(name='Movido')
+            project.tasks.create(name='Tarefa')
+
+        # keep_source: o DROP do schema de origem não roda dentro da
+        # transação do teste (há eventos de FK adiados pendentes)
+        sharding.move_tenant(tenant, SHARD_ALIAS, grace=0, keep_source=True)
+
+        tenant.refresh_from_db()
+        self.assertEqual(tenant.shard, SHARD_ALIAS)
+        self.assertFalse(tenant.writes_frozen)
+        self.assertTrue(schema_exists(tenant.schema_name, SHARD_ALIAS))
+        with tenant_context(tenant):
+            moved = Project.objects.get()
+            self.assertEqual(moved._state.db, SHARD_ALIAS)
+            self.assertEqual(moved.tasks.get().name, 'Tarefa')
+            # Sequências ajustadas: novos ids continuam depois dos copiados
+            self.assertGreater(Project.objects.create(name='Novo').pk, moved.pk)
+
+
+@skipUnless(SHARD_ALIAS, 'Nenhum shard configurado (DB_SHARDS)')
+class TenantShardMoveSnapshotTestCase(FastTenantSchemaMixin, TransactionTestCase):
+    """
+    Escritas reais (commitadas por outra conexão) durante a cópia inicial:
+    precisa de TransactionTestCase, a transação de um TestCase esconderia os
+    dados do tenant das outras conexões.
+    """
+    databases = {DEFAULT_DB_ALIAS, SHARD_ALIAS} if SHARD_ALIAS else {DEFAULT_DB_ALIAS}
+
+    def setUp(self):
+        self.tenant = Client.objects.create(name='Snapshot', schema_name='test_snapshot')
+        self.addCleanup(sharding.drop_shard_schema, self.tenant, DEFAULT_DB_ALIAS)
+        self.addCleanup(sharding.drop_shard_schema, self.tenant, SHARD_ALIAS)
+        with tenant_context(self.tenant):
+            Project.objects.create(name='Antes').tasks.create(name='Tarefa antes')
+
+    def write_from_other_connection(self, write=None):
+        def create_project():
+            Project.objects.create(name='Durante').tasks.create(name='Tarefa durante')
+
+        def run():
+            try:
+                with tenant_context(self.tenant):
+                    (write or create_project)()
+            finally:
+                connections.close_all()
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+
+    def test_tables_are_copied_from_one_snapshot(self):
+        copy_between = sharding.copy_between
+
+        def copy_then_write(source, target, schema_name, model, **kwargs):
+            copy_between(source, target, schema_name, model, **kwargs)
+            # Projeto e tarefa novos entre a cópia de tasks_project e a de
+            # tasks_task: a tarefa não pode chegar sem o projeto
+            if model is Project and not kwargs:
+                self.write_from_other_connection()
+
+        with mock.patch.object(sharding, 'copy_between', side_effect=copy_then_write):
+            sharding.move_tenant(self.tenant, SHARD_ALIAS, grace=0)
+
+        with tenant_context(self.tenant):
+            self.assertEqual(
+                sorted(Task.objects.values_list('project__name', 'name')),
+                [('Antes', 'Tarefa antes'), ('Durante', 'Tarefa durante')],
+            )
+
+    def test_task_count_follows_tasks_written_before_the_freeze(self):
+        def add_task():
+            Project.objects.get(name='Antes').tasks.create(name='Outra tarefa')
+
+        # Escrita depois da cópia inicial, ainda na origem: o delta traz a
+        # tarefa, mas o projeto dela (criado antes da cópia) não muda o
+        # change_id quando só o task_count muda
+        def write_during_grace(seconds):
+            self.write_from_other_connection(add_task)
+
+        with mock.patch.object(sharding.time, 'sleep', side_effect=write_during_grace):
+            sharding.move_tenant(self.tenant, SHARD_ALIAS, grace=0, clock_skew=0)
+
+        with tenant_context(self.tenant):
+            self.assertEqual(Project.objects.get(name='Antes').task_count, 2)
+
+    def test_project_restored_during_copy_survives_the_move(self):
+        with tenant_context(self.tenant):
+            project = Project.objects.create(name='Arquivado', is_completed=True)
+            project.tasks.create(name='Tarefa arquivada')
+            Project.objects.filter(pk=project.pk).update(completed_at=timezone.now() - timedelta(days=365))
+            self.assertEqual(archive.archive_projects(self.tenant)['projects'], 1)
+
+        copy_between = sharding.copy_between
+
+        def copy_then_restore(source, target, schema_name, model, **kwargs):
+            copy_between(source, target, schema_name, model, **kwargs)
+            # Depois da cópia do snapshot e antes do delta: restaurado na
+            # origem, com os updated_at de antes do arquivamento
+            if model is Task and not kwargs:
+                self.write_from_other_connection(lambda: archive.restore_project(self.tenant, project.pk))
+
+        with mock.patch.object(sharding, 'copy_between', side_effect=copy_then_restore):
+            sharding.move_tenant(self.tenant, SHARD_ALIAS, grace=0, clock_skew=0)
+
+        with tenant_context(self.tenant):
+            self.assertFalse(ArchivedProject.objects.exists())
+            self.assertEqual(Project.objects.get(pk=project.pk).tasks.get().name, 'Tarefa arquivada')
+
+    def test_delta_includes_writes_that_keep_updated_at(self):
+        # update() não passa pelo auto_now: só o change_id (trigger) marca a escrita
+        def rename():
+            Project.objects.filter(name='Antes').update(name='Renomeado')
+
+        def write_during_grace(seconds):
+            self.write_from_other_connection(rename)
+
+        with mock.patch.object(sharding.time, 'sleep', side_effect=write_during_grace):
+            sharding.move_tenant(self.tenant, SHARD_ALIAS, grace=0, clock_skew=0)
+
+        with tenant_context(self.tenant):
+            self.assertEqual(list(Project.objects.values_list('name', flat=True)), ['Renomeado'])
@@ -0,0 +1,261 @@
+"""
+Utilitários de teste compartilhados entre os apps
+"""
+import multiprocessing
+import re
+from unittest import mock
+
+from django.conf import settings
+from django.db import connection
+from django.db.backends.base.creation import TEST_DATABASE_PREFIX
+from django.test import TestCase
+from django.test import runner as test_runner
+from django_tenants.test.client import TenantClient
+from django_tenants.utils import schema_context, schema_exists
+from ninja.utils import normalize_path
+
+from .models import Client, Domain
+from .query_budget import QueryCounter, count_queries, excluded_from_budget
+from .seeding import prepare_template
+
+PATH_PARAM = re.compile(r'\{(?:\w+:)?(\w+)\}')
+
+
+def iter_api_routes(api, method='GET'):
+    """Retorna (path, operation) de todas as rotas registradas na NinjaAPI"""
+    for prefix, router in api._routers:
+        for path, path_view in router.path_operations.items():
+            for operation in path_view.operations:
+                if method in operation.methods:
+                    yield normalize_path('/'.join([prefix, path])), operation
+
+
+class QueryBudgetTestMixin:
+    """
+    Exercita as rotas da API com dados semeados e garante que o número de
+    queries de cada uma não cresce junto com os dados.
+
+    Todas as rotas GET são exercitadas; as de escrita (POST, PUT, PATCH,
+    DELETE), só as que têm payload em `write_payloads`. Cada rota de escrita
+    roda sobre dados semeados de novo, então um DELETE não some com o projeto
+    da rota seguinte.
+
+    A classe de teste deve implementar:
+      - seed_data(scale): cria dados proporcionais a `scale` e retorna um dict
+        com os valores dos parâmetros de path (ex.: {'project_id': 1})
+      - get_request_kwargs(): kwargs extras para o client (ex.: headers JWT)
+    """
+    api = None
+    api_prefix = '/api'
+    small_scale = 1
+    large_scale = 10
+    # Rotas (paths relativos à API) que não devem ser exercitadas
+    skip_routes = ()
+    # Rotas de escrita a exercitar: {'PUT /projects/{project_id}': fábrica},
+    # onde a fábrica recebe os parâmetros de path e retorna o corpo JSON (ou
+    # None para rotas sem corpo)
+    write_payloads = {}
+    write_methods = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+    def seed_data(self, scale):
+        raise NotImplementedError
+
+    def get_request_kwargs(self):
+        return {}
+
+    def get_api(self):
+        if self.api is None:
+            from project.apis import api
+            return api
+        return self.api
+
+    def get_routes(self):
+        """[(método, path, operation)]: GETs primeiro, depois as escritas com payload"""
+        api = self.get_api()
+        routes = [('GET', path, operation) for path, operation in iter_api_routes(api)]
+        for method in self.write_methods:
+            routes += [
+                (method, path, operation)
+                for path, operation in iter_api_routes(api, method)
+                if f'{method} {path}' in self.write_payloads
+            ]
+        return [route for route in routes if route[1] not in self.skip_routes]
+
+    def count_route_queries(self, method, path, params):
+        url = normalize_path(self.api_prefix + '/' + PATH_PARAM.sub(
+            lambda match: str(params[match.group(1)]), path
+        ))
+        kwargs = self.get_request_kwargs()
+        if method != 'GET':
+            payload = self.write_payloads[f'{method} {path}'](params)
+            if payload is not None:
+                kwargs = {'data': payload, 'content_type': 'application/json', **kwargs}
+        with count_queries(QueryCounter()) as counter:
+            response = getattr(self.client, method.lower())(url, **kwargs)
+        self.assertLess(response.status_code, 500, f"{method} {url} retornou {response.status_code}")
+        return counter.count
+
+    def count_queries_at(self, routes, scale):
+        params = self.seed_data(scale)
+        counts = {}
+        for method, path, _ in routes:
+            if method != 'GET':
+                params = self.seed_data(scale)
+            counts[method, path] = self.count_route_queries(method, path, params)
+        return counts
+
+    def assertQueryCountsStable(self):
+        routes = self.get_routes()
+        small_counts = self.count_queries_at(routes, self.small_scale)
+        large_counts = self.count_queries_at(routes, self.large_scale)
+
+        for method, path, operation in routes:
+            with self.subTest(route=f'{method} {path}'):
+                self.assertEqual(
+                    small_counts[method, path],
+                    large_counts[method, path],
+                    f"'{operation.view_func.__name__}' executa queries proporcionais aos dados",
+                )
+
+
+# Banco de teste de um worker do --parallel: o do processo principal com o
+# índice do worker como sufixo (test_tenancy_3)
+WORKER_DATABASE_NAME = re.compile(rf'{re.escape(TEST_DATABASE_PREFIX)}.*_(\d+)')
+
+
+def worker_namespace():
+    """
+    Namespace de schemas do processo atual: `w0` sem --parallel, `w1`, `w2`...
+    em cada worker do `manage.py test --parallel`, pelo nome do banco de teste.
+    """
+    if multiprocessing.parent_process() is None:
+        return 'w0'
+    match = WORKER_DATABASE_NAME.fullmatch(connection.settings_dict['NAME'])
+    if match:
+        return f'w{match[1]}'
+    # TEST NAME sem o prefixo padrão: índice interno do runner, se houver
+    return f'w{getattr(test_runner, "_worker_id", 0)}'
+
+
+_schema_scripts = {}
+
+
+def get_schema_script():
+    """
+    SQL das migrations de tenant, gravado uma única vez por processo de teste
+    em um schema template do namespace do worker.
+    """
+    template = f'_test_template_{worker_namespace()}'
+    if template not in _schema_scripts:
+        with schema_context('public'):
+            _schema_scripts[template] = prepare_template(template)
+    return _schema_scripts[template]
+
+
+def fast_create_schema(tenant, check_if_exists=False, sync_schema=True, verbosity=1):
+    """
+    Substituto de TenantMixin.create_schema nos testes: reaplica o SQL gravado
+    das migrations em vez de rodá-las. Roda dentro da transação do teste (DDL é
+    transacional no PostgreSQL), então o schema some no rollback.
+    """
+    if tenant.is_shared:
+        return False
+
+    # Como em Client.create_schema: fora do @query_budget do endpoint
+    with excluded_from_budget():
+        if check_if_exists and schema_exists(tenant.schema_name):
+            return False
+        if sync_schema:
+            get_schema_script().apply(tenant.schema_name)
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute(f'CREATE SCHEMA "{tenant.schema_name}"')
+    connection.set_schema_to_public()
+    return True
+
+
+class FastTenantSchemaMixin:
+    """
+    Faz com que todo tenant criado durante os testes (inclusive pelo registro
+    via API) receba o SQL gravado das migrations, sem rodar o migrate.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        get_schema_script()
+        cls._create_schema_patch = mock.patch.object(Client, 'create_schema', fast_create_schema)
+        cls._create_schema_patch.start()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._create_schema_patch.stop()
+
+
+class TenantAPITestCase(FastTenantSchemaMixin, TestCase):
+    """
+    TestCase que exercita o roteamento real por tenant (TenantMainMiddleware).
+
+    Cada processo de teste cria um único tenant (a partir do script gravado) e o
+    reaproveita em todas as classes; cada teste roda dentro de uma transação
+    que é desfeita no final. Com --parallel, cada worker usa o seu próprio
+    namespace de schema e domínio.
+
+    `self.client` é um TenantClient apontando para o domínio do tenant e a
+    conexão fica no schema do tenant durante os testes.
+    """
+    tenant = None
+    domain = None
+
+    @classmethod
+    def get_test_schema_name(cls):
+        return f'test_{worker_namespace()}'
+
+    @classmethod
+    def get_test_tenant_domain(cls):
+        return f'{cls.get_test_schema_name().replace("_", "-")}.test.localhost'
+
+    @classmethod
+    def setUpClass(cls):
+        get_schema_script()
+        cls.tenant, cls.domain = cls.get_or_create_test_tenant()
+        if cls.domain.domain not in settings.ALLOWED_HOSTS:
+            settings.ALLOWED_HOSTS += [cls.domain.domain]
+        super().setUpClass()
+        connection.set_tenant(cls.tenant)
+
+    @classmethod
+    def tearDownClass(cls):
+        connection.set_schema_to_public()
+        super().tearDownClass()
+
+    @classmethod
+    def get_or_create_test_tenant(cls):
+        """Criado fora da transação das classes, então vale para a sessão inteira"""
+        schema_name = cls.get_test_schema_name()
+        with schema_context('public'):
+            tenant = Client.objects.filter(schema_name=schema_name).first()
+            if tenant is None:
+                tenant = Client(name=schema_name, schema_name=schema_name)
+                tenant.auto_create_schema = False
+                tenant.save()
+            if not schema_exists(schema_name):
+                get_schema_script().apply(schema_name)
+            domain, _ = Domain.objects.get_or_create(
+                domain=cls.get_test_tenant_domain(),
+                defaults={'tenant': tenant, 'is_primary': True},
+            )
+        return tenant, domain
+
+    def setUp(self):
+        super().setUp()
+        connection.set_tenant(self.tenant)
+        self.client = TenantClient(self.tenant)
+
+    def create_tenant(self, name, schema_name, domain, **fields):
+        """Cria outro tenant (no schema public) durante um teste"""
+        with schema_context('public'):
+            tenant = Client.objects.create(name=name, schema_name=schema_name, **fields)
+            Domain.objects.create(domain=domain, tenant=tenant, is_primary=True)
+        return tenant
@@ -0,0 +1,183 @@
+"""
+statement_timeout e lock_timeout por tenant e por endpoint da API.
+
+Durante cada operação Ninja os timeouts valem para todas as conexões
+(principal, réplica, shards): o backend (apps.core.postgresql_backend) os
+envia no mesmo comando do SET search_path, e só quando mudam. Fora das
+requisições (comandos, migrations, threads de fundo) fica o padrão do
+banco.
+
+Ordem de precedência (em ms; 0 = sem limite):
+
+  1. Client.endpoint_timeouts[<nome da view>] (ex.: {"list_projects":
+     {"statement_timeout_ms": 10000}});
+  2. @query_timeout(...) no endpoint;
+  3. Client.statement_timeout_ms / lock_timeout_ms;
+  4. QUERY_STATEMENT_TIMEOUT_MS / QUERY_LOCK_TIMEOUT_MS do settings.
+
+Uma query cancelada por timeout vira 503 + Retry-After (QueryTimeout,
+tratada em project/apis.py) e é contada em GET /api/metrics.
+"""
+import functools
+import inspect
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import OperationalError, connections
+from psycopg2 import errorcodes
+
+from . import metrics
+
+STATEMENT = 'statement_timeout_ms'
+LOCK = 'lock_timeout_ms'
+
+# pgcode -> tipo de timeout
+TIMEOUT_ERRORS = {
+    errorcodes.QUERY_CANCELED: 'statement',
+    errorcodes.LOCK_NOT_AVAILABLE: 'lock',
+}
+
+
+class QueryTimeout(Exception):
+    """Query cancelada por statement_timeout ou lock_timeout"""
+
+    def __init__(self, kind, endpoint, retry_after=1):
+        super().__init__(f'Consulta excedeu o tempo limite ({kind}_timeout)')
+        self.kind = kind
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+_lock = threading.Lock()
+_counts = {'statement': 0, 'lock': 0}
+_by_endpoint = {}
+
+
+def record_timeout(kind, endpoint):
+    with _lock:
+        _counts[kind] += 1
+        _by_endpoint[endpoint] = _by_endpoint.get(endpoint, 0) + 1
+
+
+def snapshot():
+    with _lock:
+        return {
+            'statement_timeouts': _counts['statement'],
+            'lock_timeouts': _counts['lock'],
+            'by_endpoint': dict(_by_endpoint),
+        }
+
+
+metrics.register('query_timeouts', snapshot)
+
+
+def query_timeout(statement_timeout_ms=None, lock_timeout_ms=None):
+    """
+    Timeouts padrão de um endpoint (ex.: exportações mais lentas). Os
+    tenants ainda podem sobrescrever por Client.endpoint_timeouts.
+
+        @router.get("/search", ...)
+        @query_timeout(statement_timeout_ms=15000)
+        def search(request, q: str):
+            ...
+    """
+    def decorator(view_func):
+        view_func.query_timeouts = {
+            key: value for key, value in ((STATEMENT, statement_timeout_ms), (LOCK, lock_timeout_ms))
+            if value is not None
+        }
+        return view_func
+
+    return decorator
+
+
+def resolve_timeouts(tenant, endpoint, endpoint_defaults=None):
+    """(statement_timeout_ms, lock_timeout_ms) de `endpoint` para `tenant`"""
+    timeouts = {STATEMENT: settings.QUERY_STATEMENT_TIMEOUT_MS, LOCK: settings.QUERY_LOCK_TIMEOUT_MS}
+    for key in timeouts:
+        value = getattr(tenant, key, None)
+        if value is not None:
+            timeouts[key] = value
+    timeouts.update(endpoint_defaults or {})
+    overrides = (getattr(tenant, 'endpoint_timeouts', None) or {}).get(endpoint) or {}
+    timeouts.update({key: int(value) for key, value in overrides.items() if key in timeouts})
+    return timeouts[STATEMENT], timeouts[LOCK]
+
+
+def apply_timeouts(timeouts):
+    """Timeouts das próximas queries em todas as conexões da thread (None = padrão do banco)"""
+    for db_connection in connections.all():
+        db_connection.query_timeouts = timeouts
+
+
+def as_query_timeout(error, endpoint):
+    kind = TIMEOUT_ERRORS.get(getattr(error.__cause__, 'pgcode', None))
+    if kind is None:
+        return None
+    record_timeout(kind, endpoint)
+    return QueryTimeout(kind, endpoint, settings.QUERY_TIMEOUT_RETRY_AFTER)
+
+
+def stream_with_timeouts(iterator, tenant, endpoint, endpoint_defaults=None):
+    """
+    Timeouts do endpoint enquanto um gerador é consumido depois da view (ex.:
+    o corpo de um StreamingHttpResponse), quando o with_query_timeouts já
+    saiu. Valem só durante cada next(); um timeout vira QueryTimeout.
+    """
+    timeouts = resolve_timeouts(tenant, endpoint, endpoint_defaults)
+    iterator = iter(iterator)
+    while True:
+        apply_timeouts(timeouts)
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        except OperationalError as error:
+            timeout = as_query_timeout(error, endpoint)
+            if timeout is None:
+                raise
+            raise timeout from error
+        finally:
+            apply_timeouts(None)
+        yield item
+
+
+def with_query_timeouts(view_func):
+    """Decorator de todas as operações (api.add_decorator em project/apis.py)"""
+    endpoint = view_func.__name__
+    defaults = getattr(view_func, 'query_timeouts', None)
+
+    if inspect.iscoroutinefunction(view_func):
+        # O ORM async roda na thread do sync_to_async: os timeouts vão nas
+        # conexões dela
+        @functools.wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            timeouts = resolve_timeouts(getattr(request, 'tenant', None), endpoint, defaults)
+            await sync_to_async(apply_timeouts)(timeouts)
+            try:
+                return await view_func(request, *args, **kwargs)
+            except OperationalError as error:
+                timeout = as_query_timeout(error, endpoint)
+                if timeout is None:
+                    raise
+                raise timeout from error
+            finally:
+                await sync_to_async(apply_timeouts)(None)
+
+        return async_wrapper
+
+    @functools.wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        apply_timeouts(resolve_timeouts(getattr(request, 'tenant', None), endpoint, defaults))
+        try:
+            return view_func(request, *args, **kwargs)
+        except OperationalError as error:
+            timeout = as_query_timeout(error, endpoint)
+            if timeout is None:
+                raise
+            raise timeout from error
+        finally:
+            apply_timeouts(None)
+
+    return wrapper
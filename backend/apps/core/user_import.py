@@ -0,0 +1,273 @@
+"""
+Importação em massa dos usuários de um tenant (onboarding de organizações).
+
+O arquivo (CSV com cabeçalho ou JSONL, um objeto por linha) é lido em
+streaming e processado em lotes de USER_IMPORT_CHUNK_SIZE linhas:
+
+  * cada linha é validada (campos obrigatórios, username, e-mail, repetições
+    no próprio arquivo) e os usuários já existentes são buscados em uma única
+    query por lote;
+  * as senhas do lote são geradas em paralelo em USER_IMPORT_HASH_WORKERS
+    processos (o PBKDF2 ocupa a CPU; processos separados não disputam com o
+    pool de hashing dos logins);
+  * os válidos entram com um bulk_create por lote, em uma transação.
+
+Todos os usuários ficam ligados ao tenant do importador (User.tenant); o
+arquivo não escolhe tenant, colunas extras são ignoradas. Cada lote gera um
+evento de progresso com os erros por linha; um erro não interrompe a
+importação.
+
+Uso: POST /api/auth/import-users (corpo CSV/JSONL, resposta em NDJSON) ou
+``python manage.py import_users <schema> <arquivo>``.
+"""
+import atexit
+import csv
+import json
+import threading
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from . import hash_worker
+from .models import User
+
+FORMATS = ('csv', 'jsonl')
+CONTENT_TYPES = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'jsonl',
+    'application/jsonl': 'jsonl',
+}
+REQUIRED_FIELDS = ('username', 'email', 'password')
+NAME_FIELDS = ('first_name', 'last_name')
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hash_pool():
+    """Pool de processos do hash das senhas, criado na primeira importação"""
+    global _pool
+    if _pool is None:
+        # Importados só na primeira importação: fora do cold start dos workers
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        with _pool_lock:
+            if _pool is None:
+                # spawn: o processo web tem threads e conexões abertas, que
+                # não devem ser herdadas por fork
+                _pool = ProcessPoolExecutor(
+                    max_workers=settings.USER_IMPORT_HASH_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=hash_worker.init,
+                    initargs=(settings.PASSWORD_HASHERS,),
+                )
+                atexit.register(shutdown)
+    return _pool
+
+
+def shutdown():
+    """Encerra o pool de hash (no fim do processo; a próxima importação cria outro)"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+
+
+def hash_passwords(passwords):
+    """make_password de cada senha, em paralelo nos processos do pool"""
+    workers = settings.USER_IMPORT_HASH_WORKERS
+    if workers <= 1 or len(passwords) < 2:
+        return [make_password(password) for password in passwords]
+
+    from concurrent.futures.process import BrokenProcessPool
+
+    global _pool
+    try:
+        chunksize = max(1, len(passwords) // (workers * 4))
+        return list(get_hash_pool().map(make_password, passwords, chunksize=chunksize))
+    except BrokenProcessPool:
+        # Um worker morreu (ex.: OOM): o próximo lote recria o pool
+        with _pool_lock:
+            _pool = None
+        return [make_password(password) for password in passwords]
+
+
+def detect_format(content_type):
+    return CONTENT_TYPES.get((content_type or '').split(';')[0].strip().lower())
+
+
+def parse_rows(lines, fmt):
+    """(número da linha, dict da linha, erro) de cada registro do arquivo"""
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield number, None, f'JSON inválido: {e}'
+            continue
+        if not isinstance(row, dict):
+            yield number, None, 'Cada linha deve ser um objeto JSON'
+            continue
+        yield number, row, None
+
+
+def clean_row(row):
+    """(campos normalizados, erro) de uma linha"""
+    values = {field: str(row.get(field) or '').strip() for field in REQUIRED_FIELDS + NAME_FIELDS}
+    missing = [field for field in REQUIRED_FIELDS if not values[field]]
+    if missing:
+        return values, f"Campo obrigatório ausente: {', '.join(missing)}"
+
+    values['username'] = User.normalize_username(values['username'])
+    values['email'] = User.objects.normalize_email(values['email'])
+    try:
+        User.username_validator(values['username'])
+        validate_email(values['email'])
+    except ValidationError as e:
+        return values, ' '.join(e.messages)
+    for field in ('username',) + NAME_FIELDS:
+        if len(values[field]) > User._meta.get_field(field).max_length:
+            return values, f'{field} muito longo'
+    return values, None
+
+
+class UserImport:
+    """Estado de uma importação: totais e usernames/e-mails já vistos no arquivo"""
+
+    def __init__(self, tenant, chunk_size=None):
+        self.tenant = tenant
+        self.chunk_size = chunk_size or settings.USER_IMPORT_CHUNK_SIZE
+        self.processed = 0
+        self.created = 0
+        self.failed = 0
+        self.usernames = set()
+        self.emails = set()
+
+    def progress(self, **extra):
+        return {'processed': self.processed, 'created': self.created, 'failed': self.failed, **extra}
+
+    def run(self, lines, fmt):
+        """Gera um evento de progresso por lote e um final com done=True"""
+        rows = parse_rows(lines, fmt)
+        try:
+            while True:
+                chunk = list(islice(rows, self.chunk_size))
+                if not chunk:
+                    break
+                errors = self.import_chunk(chunk)
+                yield self.progress(done=False, errors=errors)
+        except (csv.Error, UnicodeDecodeError) as e:
+            yield self.progress(done=True, error=f'Arquivo inválido: {e}')
+            return
+        yield self.progress(done=True)
+
+    def import_chunk(self, chunk):
+        errors = []
+        valid = []
+        for line, row, error in chunk:
+            values = {}
+            if error is None:
+                values, error = clean_row(row)
+            if error is None and values['username'] in self.usernames:
+                error = 'Nome de usuário repetido no arquivo'
+            elif error is None and values['email'] in self.emails:
+                error = 'E-mail repetido no arquivo'
+            if error is not None:
+                errors.append({'line': line, 'username': values.get('username'), 'error': error})
+                continue
+            self.usernames.add(values['username'])
+            self.emails.add(values['email'])
+            valid.append((line, values))
+
+        if valid:
+            valid = self.exclude_existing(valid, errors)
+        created = self.insert(valid, errors) if valid else 0
+
+        self.processed += len(chunk)
+        self.created += created
+        self.failed += len(errors)
+        return sorted(errors, key=lambda error: error['line'])
+
+    def exclude_existing(self, valid, errors):
+        """Remove (e reporta) os usuários que já existem - uma query por lote"""
+        usernames = [values['username'] for _, values in valid]
+        emails = [values['email'] for _, values in valid]
+        existing = list(
+            User.objects.filter(Q(username__in=usernames) | Q(email__in=emails)).values_list('username', 'email')
+        )
+        taken_usernames = {username for username, _ in existing}
+        taken_emails = {email for _, email in existing}
+
+        remaining = []
+        for line, values in valid:
+            if values['username'] in taken_usernames:
+                errors.append({'line': line, 'username': values['username'], 'error': 'Nome de usuário já existe'})
+            elif values['email'] in taken_emails:
+                errors.append({'line': line, 'username': values['username'], 'error': 'E-mail já está em uso'})
+            else:
+                remaining.append((line, values))
+        return remaining
+
+    def insert(self, valid, errors):
+        hashes = hash_passwords([values['password'] for _, values in valid])
+        users = [
+            User(
+                username=values['username'],
+                email=values['email'],
+                first_name=values['first_name'],
+                last_name=values['last_name'],
+                password=password,
+                tenant=self.tenant,
+            )
+            for (_, values), password in zip(valid, hashes)
+        ]
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create(users)
+            return len(users)
+        except IntegrityError:
+            pass
+
+        # Outro cadastro criou um desses usernames no meio do caminho: insere
+        # um a um para isolar o conflito
+        created = 0
+        for (line, values), user in zip(valid, users):
+            try:
+                with transaction.atomic():
+                    user.save(force_insert=True)
+                created += 1
+            except IntegrityError:
+                errors.append({'line': line, 'username': values['username'], 'error': 'Nome de usuário já existe'})
+        return created
+
+
+def import_users(tenant, lines, fmt='csv', chunk_size=None):
+    """Importa os usuários de `lines` (iterável de str) no tenant; gera o progresso"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato inválido (use: {', '.join(FORMATS)})")
+    return UserImport(tenant, chunk_size).run(lines, fmt)
+
+
+def decode_lines(stream):
+    """Linhas de texto de um stream binário (ex.: request), sem ler tudo em memória"""
+    first = True
+    for line in stream:
+        text = line.decode('utf-8-sig' if first else 'utf-8')
+        first = False
+        yield text
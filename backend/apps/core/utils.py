@@ -1,28 +1,59 @@
+import functools
+
+from asgiref.sync import sync_to_async
+from django.db import connection, transaction
+from django.db.models import Q
+from django_tenants.utils import schema_context
+
 from .models import Client, Domain, User
 
 def create_tenant_with_domain(organization_name, user):
     """
-    Cria um tenant e domínio automaticamente para um usuário
+    Cria um tenant e domínio automaticamente para um usuário.
+
+    Tenant, domínio e usuário vão em uma única transação no schema public:
+    se algo falhar (ex.: username criado por outra requisição no meio do
+    caminho), nada fica pela metade. Um usuário ainda não salvo (ver
+    hashing.build_user) é inserido já com o tenant, em uma única escrita.
     """
-    # Criar o tenant (Client)
-    tenant = Client.objects.create(
-        name=organization_name,
-        schema_name=organization_name.lower()
-    )
-    
-    # Criar o domínio para o tenant
-    domain = Domain.objects.create(
-        domain=f"{organization_name.lower()}.localhost",
-        tenant=tenant,
-        is_primary=True
-    )
-    
-    # Associar usuário ao tenant
-    user.tenant = tenant
-    user.save()
-    
+    with schema_context('public'), transaction.atomic():
+        # Criar o tenant (Client)
+        tenant = Client.objects.create(
+            name=organization_name,
+            schema_name=organization_name.lower()
+        )
+
+        # Criar o domínio para o tenant
+        domain = Domain.objects.create(
+            domain=f"{organization_name.lower()}.localhost",
+            tenant=tenant,
+            is_primary=True
+        )
+
+        # Associar usuário ao tenant
+        user.tenant = tenant
+        if user.pk is None:
+            user.save()
+        else:
+            user.save(update_fields=['tenant'])
+
     return tenant, domain
 
+
+def taken_credential(username, email):
+    """
+    'username' ou 'email' se algum dos dois já estiver em uso, senão None
+    (uma única query)
+    """
+    taken = list(
+        User.objects.filter(Q(username=username) | Q(email=email)).values_list('username', flat=True)[:2]
+    )
+    if username in taken:
+        return 'username'
+    if taken:
+        return 'email'
+    return None
+
 def get_tenant_redirect_url(user, for_api=False):
     """
     Retorna a URL de redirecionamento para o tenant do usuário
@@ -45,3 +76,26 @@ def get_tenant_redirect_url(user, for_api=False):
         except Domain.DoesNotExist:
             return '/auth/login/' if not for_api else '/login'
     return '/auth/login/' if not for_api else '/login'
+
+
+def activate_tenant(tenant):
+    """Coloca a conexão da thread atual no schema do tenant (se necessário)"""
+    if tenant is not None and connection.schema_name != tenant.schema_name:
+        connection.set_tenant(tenant)
+
+
+def tenant_coroutine(view_func):
+    """
+    Decorator para views async: garante o search_path do tenant da requisição
+    antes de qualquer query do ORM async.
+
+    As conexões do Django são locais à thread e o ORM async executa as queries
+    na thread "thread sensitive" do sync_to_async, não no event loop; por isso o
+    schema é ativado nessa mesma thread, e não na conexão do coroutine.
+    """
+    @functools.wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        await sync_to_async(activate_tenant)(getattr(request, 'tenant', None))
+        return await view_func(request, *args, **kwargs)
+
+    return wrapper
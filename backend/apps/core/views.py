@@ -31,10 +31,10 @@ def register_view(request):
     if request.method == 'POST':
         form = CustomUserCreationForm(request.POST)
         if form.is_valid():
-            user = form.save()
+            user = form.save(commit=False)
             organization_name = form.cleaned_data.get('organization')
             
-            # Criar tenant e domínio automaticamente
+            # Criar tenant, domínio e usuário (já com o tenant) em uma transação
             tenant, domain = create_tenant_with_domain(organization_name, user)
             
             # Redirecionar para a página de login do novo tenant
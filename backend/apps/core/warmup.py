@@ -0,0 +1,152 @@
+"""
+Warm-up dos workers: o que a primeira requisição de um processo novo pagaria.
+
+  * tenants: domínios dos WARMUP_TENANTS tenants com mais requisições nas
+    últimas 24h (core_tenantusage) no cache hostname -> tenant;
+  * conexões: abre e valida (SELECT 1) cada banco configurado (default,
+    réplica, shards);
+  * templates: compila WARMUP_TEMPLATES no loader com cache do Django;
+  * OpenAPI: carrega o schema servido em /api/openapi.json.
+
+Com WARMUP_ON_BOOT, project/wsgi.py e project/asgi.py rodam o warm-up ao
+carregar a aplicação - antes de o worker aceitar requisições, então ele
+entra no balanceador já aquecido. Com ``gunicorn --preload`` a aplicação
+carrega no master: chame on_boot() no hook post_worker_init para que as
+conexões sejam abertas em cada worker. Manualmente: ``python manage.py
+warmup``.
+
+Uma etapa que falha é registrada e não impede as outras nem o boot.
+"""
+import logging
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Sum
+from django.template import engines
+from django.template.loader import get_template
+from django.utils import timezone
+from django_tenants.utils import get_public_schema_name
+
+from . import metrics, openapi, tenant_cache
+from .models import Domain, TenantUsage
+
+logger = logging.getLogger(__name__)
+
+_last_report = {}
+
+
+def active_tenant_ids(limit, hours=24):
+    """Tenants com mais requisições nas últimas `hours` horas (medição de consumo)"""
+    since = timezone.now() - timedelta(hours=hours)
+    return list(
+        TenantUsage.objects
+        .filter(bucket__gte=since)
+        .values('tenant_id')
+        .annotate(total=Sum('requests'))
+        .order_by('-total')
+        .values_list('tenant_id', flat=True)[:limit]
+    )
+
+
+def warm_tenants(limit=None):
+    """Pré-carrega o cache de domínios; sem medição, os tenants mais recentes"""
+    limit = limit if limit is not None else settings.WARMUP_TENANTS
+    if tenant_cache.get_cache().ttl <= 0 or limit <= 0:
+        return 0
+
+    domains = (
+        Domain.objects.select_related('tenant')
+        .exclude(tenant__schema_name=get_public_schema_name())
+        .filter(tenant__disabled_at__isnull=True)
+    )
+    tenant_ids = active_tenant_ids(limit)
+    if tenant_ids:
+        domains = domains.filter(tenant_id__in=tenant_ids)
+    else:
+        domains = domains.order_by('-tenant_id')[:limit]
+    return tenant_cache.preload(domains)
+
+
+def warm_connections():
+    """Abre e valida as conexões de todos os bancos; retorna os aliases"""
+    aliases = []
+    for alias in connections:
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+        aliases.append(alias)
+    return aliases
+
+
+def template_names(patterns=None):
+    """Nomes dos templates que casam com os padrões (ex.: 'core/*.html')"""
+    patterns = patterns if patterns is not None else settings.WARMUP_TEMPLATES
+    names = set()
+    for engine in engines.all():
+        for directory in engine.template_dirs:
+            directory = Path(directory)
+            for pattern in patterns:
+                names.update(
+                    path.relative_to(directory).as_posix() for path in directory.glob(pattern) if path.is_file()
+                )
+    return sorted(names)
+
+
+def warm_templates(patterns=None):
+    names = template_names(patterns)
+    for name in names:
+        get_template(name)
+    return names
+
+
+def warm_openapi():
+    body, _ = openapi.get_schema()
+    return len(body)
+
+
+STEPS = (
+    ('tenants', warm_tenants),
+    ('connections', warm_connections),
+    ('templates', warm_templates),
+    ('openapi', warm_openapi),
+)
+
+
+def warm_up(steps=None):
+    """Roda as etapas; retorna {etapa: {'ok', 'ms', 'result' ou 'error'}}"""
+    report = {}
+    for name, step in STEPS:
+        if steps is not None and name not in steps:
+            continue
+        started = time.perf_counter()
+        try:
+            result = step()
+        except Exception as e:
+            logger.exception(f'Warm-up: falha na etapa {name}')
+            report[name] = {'ok': False, 'error': str(e)}
+        else:
+            report[name] = {'ok': True, 'result': result}
+        report[name]['ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+    _last_report.clear()
+    _last_report.update(report)
+    return report
+
+
+metrics.register('warmup', lambda: dict(_last_report))
+
+
+def on_boot():
+    """Hook de boot do worker (WARMUP_ON_BOOT)"""
+    if not settings.WARMUP_ON_BOOT:
+        return None
+    report = warm_up()
+    logger.info(
+        'Warm-up concluído: ' + ', '.join(
+            f"{name} {'ok' if step['ok'] else 'falhou'} ({step['ms']} ms)" for name, step in report.items()
+        )
+    )
+    return report
@@ -1,8 +1,12 @@
 from ninja import Router, Schema
 from ninja.security import HttpBearer
-from django.db.models import Prefetch
-from .models import Project, Task
+from .models import ArchivedProject, Project
 from apps.core.jwt_utils import JWTAuth
+from apps.core.idempotency import idempotent
+from apps.core.query_budget import query_budget
+from apps.core.routers import read_only_route
+from . import archive, changes, projection, stats
+from .search import DEFAULT_LIMIT, search
 
 router = Router(tags=["Projects", "Tasks"])
 
@@ -21,8 +25,28 @@ class ProjectSchema(Schema):
     is_completed: bool
     created_at: str
     updated_at: str
+    task_count: int = 0
     tasks: list[TaskSchema] = []
 
+# Respostas de ?fields=/?include= (apps.tasks.projection): só os campos pedidos
+class TaskFieldsSchema(Schema):
+    id: int
+    name: str = None
+    description: str = None
+    created_at: str = None
+    updated_at: str = None
+
+class ProjectFieldsSchema(Schema):
+    id: int
+    name: str = None
+    description: str = None
+    is_completed: bool = None
+    created_at: str = None
+    updated_at: str = None
+    task_count: int = None
+    archived_at: str | None = None  # só com ?include_archived=true
+    tasks: list[TaskFieldsSchema] = None
+
 class ProjectCreateSchema(Schema):
     name: str
     description: str
@@ -33,67 +57,121 @@ class ProjectUpdateSchema(Schema):
     description: str = None
     is_completed: bool = None
 
+class SearchResultSchema(Schema):
+    kind: str  # "project" ou "task"
+    id: int
+    project_id: int
+    name: str
+    description: str
+    rank: float
+
+class SearchPageSchema(Schema):
+    results: list[SearchResultSchema]
+    next_offset: int | None = None
+
+class TenantStatsSchema(Schema):
+    projects: int
+    completed_projects: int
+    tasks: int
+    last_activity_at: str | None = None
+
+class ChangedProjectSchema(Schema):
+    id: int
+    name: str
+    description: str
+    is_completed: bool
+    created_at: str
+    updated_at: str
+
+class ChangedTaskSchema(TaskSchema):
+    project_id: int
+
+class DeletedSchema(Schema):
+    kind: str  # "project" ou "task"
+    id: int
+
+class ChangesSchema(Schema):
+    cursor: str
+    has_more: bool
+    reset: bool  # cursor inválido ou de outro shard: descartar a cópia local
+    projects: list[ChangedProjectSchema]
+    tasks: list[ChangedTaskSchema]
+    deleted: list[DeletedSchema]
+
 # Autenticação JWT
 jwt_auth = JWTAuth()
 
-@router.get("/projects", response=list[ProjectSchema], auth=jwt_auth)
-def list_projects(request):
-    """Listar todos os projetos do usuário logado"""
+
+def task_to_schema(task):
+    return TaskSchema(
+        id=task.id,
+        name=task.name,
+        description=task.description,
+        created_at=task.created_at.isoformat(),
+        updated_at=task.updated_at.isoformat()
+    )
+
+
+def project_to_schema(project, tasks):
+    return ProjectSchema(
+        id=project.id,
+        name=project.name,
+        description=project.description,
+        is_completed=project.is_completed,
+        created_at=project.created_at.isoformat(),
+        updated_at=project.updated_at.isoformat(),
+        task_count=project.task_count,
+        tasks=[task_to_schema(task) for task in tasks]
+    )
+
+
+def stats_to_schema(totals):
+    last_activity_at = totals['last_activity_at']
+    return TenantStatsSchema(
+        projects=totals['projects'],
+        completed_projects=totals['completed_projects'],
+        tasks=totals['tasks'],
+        last_activity_at=last_activity_at.isoformat() if last_activity_at else None,
+    )
+
+
+def changes_to_schema(page):
+    return ChangesSchema(
+        cursor=page['cursor'],
+        has_more=page['has_more'],
+        reset=page['reset'],
+        projects=[
+            ChangedProjectSchema(**project_to_schema(project, []).dict(exclude={'tasks', 'task_count'}))
+            for project in page['projects']
+        ],
+        tasks=[ChangedTaskSchema(**task_to_schema(task).dict(), project_id=task.project_id) for task in page['tasks']],
+        deleted=page['deleted'],
+    )
+
+
+@router.get("/projects", response=list[ProjectFieldsSchema], auth=jwt_auth, exclude_unset=True)
+@query_budget(3)
+@read_only_route
+def list_projects(request, fields: str = None, include: str = None, include_archived: bool = False):
+    """Listar todos os projetos do usuário logado (?fields=id,name, ?include=tasks e ?include_archived=true)"""
     # Em um sistema multi-tenant, cada schema tem seus próprios projetos
     # Não precisa filtrar por usuário, pois o schema já segrega os dados corretos
-    projects = Project.objects.all().prefetch_related(
-        Prefetch('tasks', queryset=Task.objects.all())
-    )
-    
-    return [
-        ProjectSchema(
-            id=project.id,
-            name=project.name,
-            description=project.description,
-            is_completed=project.is_completed,
-            created_at=project.created_at.isoformat(),
-            updated_at=project.updated_at.isoformat(),
-            tasks=[
-                TaskSchema(
-                    id=task.id,
-                    name=task.name,
-                    description=task.description,
-                    created_at=task.created_at.isoformat(),
-                    updated_at=task.updated_at.isoformat()
-                )
-                for task in project.tasks.all()
-            ]
-        )
-        for project in projects
-    ]
-
-@router.get("/projects/{project_id}", response=ProjectSchema, auth=jwt_auth)
-def get_project(request, project_id: int):
-    """Obter um projeto específico"""
+    return projection.list_projects(projection.Projection(fields, include, include_archived))
+
+@router.get("/projects/{project_id}", response={200: ProjectFieldsSchema, 404: dict}, auth=jwt_auth,
+            exclude_unset=True)
+@query_budget(3)
+@read_only_route
+def get_project(request, project_id: int, fields: str = None, include: str = None, include_archived: bool = False):
+    """Obter um projeto específico (?fields=id,name, ?include=tasks e ?include_archived=true)"""
     try:
-        project = Project.objects.get(id=project_id)
-        return ProjectSchema(
-            id=project.id,
-            name=project.name,
-            description=project.description,
-            is_completed=project.is_completed,
-            created_at=project.created_at.isoformat(),
-            updated_at=project.updated_at.isoformat(),
-            tasks=[
-                TaskSchema(
-                    id=task.id,
-                    name=task.name,
-                    description=task.description,
-                    created_at=task.created_at.isoformat(),
-                    updated_at=task.updated_at.isoformat()
-                )
-                for task in project.tasks.all()
-            ]
-        )
+        return projection.get_project(project_id, projection.Projection(fields, include, include_archived))
     except Project.DoesNotExist:
-        return {"error": "Project not found"}, 404
+        return 404, {"error": "Project not found"}
 
 @router.post("/projects", response=ProjectSchema, auth=jwt_auth)
+@idempotent()
+@query_budget(2)
 def create_project(request, payload: ProjectCreateSchema):
     """Criar um novo projeto"""
     project = Project.objects.create(
@@ -102,17 +180,11 @@ def create_project(request, payload: ProjectCreateSchema):
         is_completed=payload.is_completed
     )
     
-    return ProjectSchema(
-        id=project.id,
-        name=project.name,
-        description=project.description,
-        is_completed=project.is_completed,
-        created_at=project.created_at.isoformat(),
-        updated_at=project.updated_at.isoformat(),
-        tasks=[]
-    )
+    return project_to_schema(project, [])
 
 @router.put("/projects/{project_id}", response=ProjectSchema, auth=jwt_auth)
+@idempotent()
+@query_budget(4)
 def update_project(request, project_id: int, payload: ProjectUpdateSchema):
     """Atualizar um projeto"""
     try:
@@ -127,28 +199,24 @@ def update_project(request, project_id: int, payload: ProjectUpdateSchema):
             
         project.save()
         
-        return ProjectSchema(
-            id=project.id,
-            name=project.name,
-            description=project.description,
-            is_completed=project.is_completed,
-            created_at=project.created_at.isoformat(),
-            updated_at=project.updated_at.isoformat(),
-            tasks=[
-                TaskSchema(
-                    id=task.id,
-                    name=task.name,
-                    description=task.description,
-                    created_at=task.created_at.isoformat(),
-                    updated_at=task.updated_at.isoformat()
-                )
-                for task in project.tasks.all()
-            ]
-        )
+        return project_to_schema(project, project.tasks.all())
     except Project.DoesNotExist:
         return {"error": "Project not found"}, 404
 
+@router.post("/projects/{project_id}/restore", response={200: ProjectSchema, 404: dict, 503: dict}, auth=jwt_auth)
+@query_budget(9)
+def restore_project(request, project_id: int):
+    """Restaurar um projeto arquivado (com as tarefas)"""
+    try:
+        project = archive.restore_project(request.tenant, project_id)
+    except ArchivedProject.DoesNotExist:
+        return 404, {"error": "Archived project not found"}
+    except archive.WritesFrozen:
+        return 503, {"error": "Tenant temporariamente somente leitura, tente novamente em instantes"}
+    return project_to_schema(project, project.tasks.all())
+
 @router.delete("/projects/{project_id}", auth=jwt_auth)
+@query_budget(5)
 def delete_project(request, project_id: int):
     """Excluir um projeto"""
     try:
@@ -160,21 +228,38 @@ def delete_project(request, project_id: int):
 
 # Tasks endpoints
 @router.get("/projects/{project_id}/tasks", response=list[TaskSchema], auth=jwt_auth)
+@query_budget(3)
+@read_only_route
 def list_project_tasks(request, project_id: int):
     """Listar tarefas de um projeto"""
     try:
         project = Project.objects.get(id=project_id)
         tasks = project.tasks.all()
         
-        return [
-            TaskSchema(
-                id=task.id,
-                name=task.name,
-                description=task.description,
-                created_at=task.created_at.isoformat(),
-                updated_at=task.updated_at.isoformat()
-            )
-            for task in tasks
-        ]
+        return [task_to_schema(task) for task in tasks]
     except Project.DoesNotExist:
         return {"error": "Project not found"}, 404
+
+
+@router.get("/search", response=SearchPageSchema, auth=jwt_auth)
+@query_budget(3)
+@read_only_route
+def search_projects_and_tasks(request, q: str, kind: str = None, limit: int = DEFAULT_LIMIT, offset: int = 0):
+    """Buscar projetos e tarefas por nome/descrição, ordenados por relevância"""
+    return search(q, [kind] if kind else None, limit, offset)
+
+
+@router.get("/stats", response=TenantStatsSchema, auth=jwt_auth)
+@query_budget(2)
+@read_only_route
+def get_tenant_stats(request):
+    """Totais de projetos/tarefas do tenant (contadores mantidos, sem COUNT)"""
+    return stats_to_schema(stats.tenant_stats())
+
+
+@router.get("/changes", response=ChangesSchema, auth=jwt_auth)
+@query_budget(8)
+@read_only_route
+def list_changes(request, since: str = None, limit: int = changes.DEFAULT_LIMIT):
+    """Projetos e tarefas criados/alterados/removidos desde o cursor `since`"""
+    return changes_to_schema(changes.collect_changes(request.tenant.shard, since, limit))
@@ -0,0 +1,186 @@
+"""
+Versões async (ASGI) dos endpoints de projetos e tarefas, usando o ORM async.
+
+Montadas em /api/async/. Sob ASGI rodam direto no event loop, sem ocupar uma
+thread do sync_to_async durante toda a requisição.
+"""
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+from ninja import Router, Schema
+
+from apps.core.jwt_utils import AsyncJWTAuth, AsyncJWTQueryAuth
+from apps.core.idempotency import idempotent
+from apps.core.query_budget import query_budget
+from apps.core.utils import tenant_coroutine
+from . import archive, changes, events, projection, stats
+from .api import (
+    ChangesSchema,
+    ProjectCreateSchema,
+    ProjectFieldsSchema,
+    ProjectSchema,
+    ProjectUpdateSchema,
+    SearchPageSchema,
+    TaskSchema,
+    TenantStatsSchema,
+    changes_to_schema,
+    project_to_schema,
+    stats_to_schema,
+    task_to_schema,
+)
+from .models import ArchivedProject, Project
+from .search import DEFAULT_LIMIT, asearch
+
+router = Router(tags=["Projects (async)", "Tasks (async)"])
+
+jwt_auth = AsyncJWTAuth()
+stream_auth = AsyncJWTQueryAuth()
+
+
+class ErrorSchema(Schema):
+    error: str
+
+
+@router.get("/projects", response=list[ProjectFieldsSchema], auth=jwt_auth, exclude_unset=True)
+@query_budget(3)
+@tenant_coroutine
+async def list_projects_async(request, fields: str = None, include: str = None, include_archived: bool = False):
+    """Listar todos os projetos do tenant (?fields=id,name, ?include=tasks e ?include_archived=true)"""
+    return await projection.alist_projects(projection.Projection(fields, include, include_archived))
+
+
+@router.get("/projects/{project_id}", response={200: ProjectFieldsSchema, 404: ErrorSchema}, auth=jwt_auth,
+            exclude_unset=True)
+@query_budget(3)
+@tenant_coroutine
+async def get_project_async(request, project_id: int, fields: str = None, include: str = None,
+                            include_archived: bool = False):
+    """Obter um projeto específico (?fields=id,name, ?include=tasks e ?include_archived=true)"""
+    try:
+        return await projection.aget_project(project_id, projection.Projection(fields, include, include_archived))
+    except Project.DoesNotExist:
+        return 404, {"error": "Project not found"}
+
+
+@router.post("/projects", response=ProjectSchema, auth=jwt_auth)
+@idempotent()
+@query_budget(2)
+@tenant_coroutine
+async def create_project_async(request, payload: ProjectCreateSchema):
+    """Criar um novo projeto"""
+    project = await Project.objects.acreate(
+        name=payload.name,
+        description=payload.description,
+        is_completed=payload.is_completed
+    )
+    return project_to_schema(project, [])
+
+
+@router.put("/projects/{project_id}", response={200: ProjectSchema, 404: ErrorSchema}, auth=jwt_auth)
+@idempotent()
+@query_budget(4)
+@tenant_coroutine
+async def update_project_async(request, project_id: int, payload: ProjectUpdateSchema):
+    """Atualizar um projeto"""
+    try:
+        project = await Project.objects.aget(id=project_id)
+    except Project.DoesNotExist:
+        return 404, {"error": "Project not found"}
+
+    if payload.name is not None:
+        project.name = payload.name
+    if payload.description is not None:
+        project.description = payload.description
+    if payload.is_completed is not None:
+        project.is_completed = payload.is_completed
+
+    await project.asave()
+
+    return project_to_schema(project, [task async for task in project.tasks.all()])
+
+
+@router.post("/projects/{project_id}/restore", response={200: ProjectSchema, 404: ErrorSchema, 503: ErrorSchema},
+             auth=jwt_auth)
+@query_budget(9)
+@tenant_coroutine
+async def restore_project_async(request, project_id: int):
+    """Restaurar um projeto arquivado (com as tarefas)"""
+    try:
+        # Uma transação com várias instruções: uma ida só à thread do ORM
+        project = await sync_to_async(archive.restore_project)(request.tenant, project_id)
+    except ArchivedProject.DoesNotExist:
+        return 404, {"error": "Archived project not found"}
+    except archive.WritesFrozen:
+        return 503, {"error": "Tenant temporariamente somente leitura, tente novamente em instantes"}
+    return project_to_schema(project, [task async for task in project.tasks.all()])
+
+
+@router.delete("/projects/{project_id}", response={200: dict, 404: ErrorSchema}, auth=jwt_auth)
+@query_budget(5)
+@tenant_coroutine
+async def delete_project_async(request, project_id: int):
+    """Excluir um projeto"""
+    try:
+        project = await Project.objects.aget(id=project_id)
+    except Project.DoesNotExist:
+        return 404, {"error": "Project not found"}
+
+    await project.adelete()
+    return {"success": True, "message": "Project deleted successfully"}
+
+
+@router.get("/projects/{project_id}/tasks", response={200: list[TaskSchema], 404: ErrorSchema}, auth=jwt_auth)
+@query_budget(3)
+@tenant_coroutine
+async def list_project_tasks_async(request, project_id: int):
+    """Listar tarefas de um projeto"""
+    try:
+        project = await Project.objects.aget(id=project_id)
+    except Project.DoesNotExist:
+        return 404, {"error": "Project not found"}
+
+    return [task_to_schema(task) async for task in project.tasks.all()]
+
+
+@router.get("/search", response=SearchPageSchema, auth=jwt_auth)
+@query_budget(3)
+@tenant_coroutine
+async def search_projects_and_tasks_async(request, q: str, kind: str = None, limit: int = DEFAULT_LIMIT,
+                                          offset: int = 0):
+    """Buscar projetos e tarefas por nome/descrição, ordenados por relevância"""
+    return await asearch(q, [kind] if kind else None, limit, offset)
+
+
+@router.get("/stats", response=TenantStatsSchema, auth=jwt_auth)
+@query_budget(2)
+@tenant_coroutine
+async def get_tenant_stats_async(request):
+    """Totais de projetos/tarefas do tenant (contadores mantidos, sem COUNT)"""
+    return stats_to_schema(await stats.atenant_stats())
+
+
+@router.get("/changes", response=ChangesSchema, auth=jwt_auth)
+@query_budget(8)
+@tenant_coroutine
+async def list_changes_async(request, since: str = None, limit: int = changes.DEFAULT_LIMIT):
+    """Projetos e tarefas criados/alterados/removidos desde o cursor `since`"""
+    # As leituras do feed são várias e sequenciais: uma ida só à thread do ORM
+    page = await sync_to_async(changes.collect_changes)(request.tenant.shard, since, limit)
+    return changes_to_schema(page)
+
+
+@router.get("/events", response={403: ErrorSchema, 503: ErrorSchema}, auth=stream_auth)
+@query_budget(1)
+async def stream_events(request):
+    """
+    Stream SSE (text/event-stream) das mudanças de projetos e tarefas do
+    tenant. Requer ASGI; o token pode ir em ?token=.
+    """
+    if request.auth.tenant_id != request.tenant.pk:
+        return 403, {"error": "Token de outro tenant"}
+    if not events.get_hub().has_capacity():
+        return 503, {"error": "Muitas conexões de eventos, tente novamente"}
+
+    response = StreamingHttpResponse(events.event_stream(request.tenant), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: não segurar o stream em buffer
+    return response
@@ -0,0 +1,126 @@
+"""
+Arquivamento de projetos concluídos.
+
+Projetos concluídos (Project.completed_at, mantido por trigger) há mais de
+Client.archive_completed_after_days dias (vazio = ARCHIVE_COMPLETED_AFTER_DAYS,
+0 = nunca) saem de tasks_project/tasks_task para tasks_archivedproject/
+tasks_archivedtask, nas tabelas do mesmo schema (ou nas compartilhadas do
+public). Cada lote de ARCHIVE_BATCH_SIZE projetos é uma transação com
+INSERT ... SELECT e DELETE, sem passar as linhas pelo Python; os projetos do
+lote ficam travados (FOR UPDATE SKIP LOCKED), e um projeto reaberto nesse
+meio tempo não é arquivado.
+
+Depois de arquivados, os projetos saem das listagens, da busca e dos
+contadores (task_count, /api/stats). Para o feed de mudanças e o SSE,
+arquivar é remover e restaurar é criar de novo. O projeto restaurado volta
+com completed_at = agora: ganha uma janela inteira antes do próximo
+arquivamento.
+
+    python manage.py archive_projects [--schema acme]
+    GET /api/projects?include_archived=true
+    POST /api/projects/{id}/restore
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from apps.core.models import Client
+from .models import ArchivedProject, ArchivedTask, Project, Task
+
+PROJECT_COLUMNS = ('id', 'tenant_id', 'name', 'description', 'is_completed', 'created_at', 'updated_at')
+TASK_COLUMNS = ('id', 'tenant_id', 'project_id', 'name', 'description', 'created_at', 'updated_at')
+
+
+def archive_after_days(tenant):
+    days = tenant.archive_completed_after_days
+    return settings.ARCHIVE_COMPLETED_AFTER_DAYS if days is None else days
+
+
+class WritesFrozen(Exception):
+    """Tenant com writes_frozen (ex.: migração de shard em andamento)"""
+
+
+def move_rows(cursor, source, target, columns, where, params, values=None):
+    """
+    INSERT INTO target SELECT FROM source + DELETE; retorna quantas linhas.
+    `values` troca a coluna lida da origem por uma expressão SQL ({'updated_at': 'now()'})
+    """
+    values = values or {}
+    selected = ', '.join(values.get(column, f'"{column}"') for column in columns)
+    columns = ', '.join(f'"{column}"' for column in columns)
+    source_table, target_table = source._meta.db_table, target._meta.db_table
+    cursor.execute(
+        f'INSERT INTO "{target_table}" ({columns}) SELECT {selected} FROM "{source_table}" WHERE {where}', params,
+    )
+    cursor.execute(f'DELETE FROM "{source_table}" WHERE {where}', params)
+    return cursor.rowcount
+
+
+def archive_batch(cutoff, batch_size):
+    """Arquiva um lote do tenant ativo; retorna (projetos, tarefas)"""
+    alias = router.db_for_write(Project)
+    with transaction.atomic(using=alias):
+        ids = list(
+            Project.objects.using(alias)
+            .filter(is_completed=True, completed_at__lt=cutoff)
+            .order_by('completed_at', 'id')
+            .select_for_update(skip_locked=True)
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0, 0
+
+        # Os ids são únicos na tabela (também na compartilhada): dispensam o
+        # filtro por tenant. As FKs do Django são checadas no commit, então a
+        # ordem das remoções não importa
+        with connections[alias].cursor() as cursor:
+            move_rows(cursor, Project, ArchivedProject, PROJECT_COLUMNS + ('completed_at', 'task_count'),
+                      '"id" = ANY(%s)', [ids])
+            tasks = move_rows(cursor, Task, ArchivedTask, TASK_COLUMNS, '"project_id" = ANY(%s)', [ids])
+    return len(ids), tasks
+
+
+def writes_frozen(tenant):
+    # Consultado a cada lote: uma migração de shard pode começar no meio
+    return Client.objects.filter(pk=tenant.pk, writes_frozen=True).exists()
+
+
+def archive_projects(tenant, now=None, batch_size=None):
+    """Arquiva os projetos vencidos do tenant ativo: {'projects': n, 'tasks': n}"""
+    archived = {'projects': 0, 'tasks': 0}
+    days = archive_after_days(tenant)
+    if not days:
+        return archived
+
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    cutoff = (now or timezone.now()) - timedelta(days=days)
+    while not writes_frozen(tenant):
+        projects, tasks = archive_batch(cutoff, batch_size)
+        archived['projects'] += projects
+        archived['tasks'] += tasks
+        if projects < batch_size:
+            break
+    return archived
+
+
+def restore_project(tenant, project_id):
+    """
+    Devolve o projeto arquivado (com as tarefas) às tabelas ativas e retorna
+    o Project; ArchivedProject.DoesNotExist se não estiver arquivado e
+    WritesFrozen durante uma migração de shard
+    """
+    if writes_frozen(tenant):
+        raise WritesFrozen(tenant.schema_name)
+    alias = router.db_for_write(Project)
+    with transaction.atomic(using=alias):
+        ArchivedProject.objects.using(alias).select_for_update().values_list('id', flat=True).get(id=project_id)
+        with connections[alias].cursor() as cursor:
+            # Sem completed_at (o trigger grava agora) e sem task_count (os
+            # triggers das tarefas recontam). Restaurar é uma escrita:
+            # updated_at = agora, como num save()
+            restored = {'updated_at': 'now()'}
+            move_rows(cursor, ArchivedProject, Project, PROJECT_COLUMNS, '"id" = %s', [project_id], restored)
+            move_rows(cursor, ArchivedTask, Task, TASK_COLUMNS, '"project_id" = %s', [project_id], restored)
+        return Project.objects.using(alias).get(id=project_id)
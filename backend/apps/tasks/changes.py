@@ -0,0 +1,96 @@
+"""
+Feed incremental de mudanças de projetos e tarefas (sincronização por cursor).
+
+Toda linha de tasks_project/tasks_task guarda em change_id o id da transação
+que a escreveu, e toda exclusão (inclusive as em cascata) grava um Tombstone,
+tudo por trigger (migration 0006) - vale para save(), update(), bulk_create()
+e SQL direto.
+
+O cursor é o xmin do snapshot da leitura: nenhuma transação ainda em andamento
+tem id menor que ele, então a próxima leitura a partir do cursor enxerga tudo
+que for commitado depois, inclusive o que já estava em andamento. O preço é
+reenviar as linhas das transações da janela [cursor, fim da leitura] - o
+cliente aplica as mudanças como upsert/delete por id, então repetir é inócuo.
+
+O cursor carrega o shard do tenant ("default:123456"): ids de transação só
+valem dentro de um banco, então um cursor de outro shard (tenant movido) ou
+inválido pede uma ressincronização completa (reset=True, a partir do zero).
+"""
+from django.db import connections
+
+from .models import Project, Task, Tombstone
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+
+
+def current_xmin(queryset):
+    """xmin do snapshot atual no banco em que `queryset` seria lido"""
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute('SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint')
+        return cursor.fetchone()[0]
+
+
+def parse_cursor(cursor, shard):
+    """Retorna (change_id, reset)"""
+    if not cursor:
+        return 0, False
+    cursor_shard, _, value = cursor.rpartition(':')
+    if cursor_shard != shard or not value.isdigit():
+        return 0, True
+    return int(value), False
+
+
+def format_cursor(shard, change_id):
+    return f'{shard}:{change_id}'
+
+
+def collect_changes(shard, cursor=None, limit=DEFAULT_LIMIT):
+    """
+    Mudanças a partir do cursor, em ordem de change_id:
+    {'cursor', 'has_more', 'reset', 'projects', 'tasks', 'deleted'}.
+
+    Com mais de `limit` linhas de algum tipo, a página para antes do primeiro
+    change_id que não coube e has_more=True; as linhas de uma mesma transação
+    vão sempre juntas, mesmo que passem do limite.
+    """
+    since, reset = parse_cursor(cursor, shard)
+    limit = max(1, min(limit or DEFAULT_LIMIT, MAX_LIMIT))
+    querysets = {
+        'projects': Project.objects.all(),
+        'tasks': Task.objects.all(),
+        'deleted': Tombstone.objects.all(),
+    }
+    # Antes das leituras: o que for escrito durante elas fica para a próxima
+    xmin = current_xmin(querysets['projects'])
+
+    rows = {
+        name: list(queryset.filter(change_id__gte=since).order_by('change_id', 'id')[:limit + 1])
+        for name, queryset in querysets.items()
+    }
+    truncated = [items[limit].change_id for items in rows.values() if len(items) > limit]
+    boundary = min(truncated) if truncated else None
+
+    if boundary is None:
+        next_cursor = xmin
+    else:
+        rows = {name: [item for item in items if item.change_id < boundary] for name, items in rows.items()}
+        if not any(rows.values()):
+            # Uma única transação com mais de `limit` linhas: vai inteira
+            rows = {
+                name: list(queryset.filter(change_id=boundary).order_by('id'))
+                for name, queryset in querysets.items()
+            }
+            boundary += 1
+        next_cursor = min(xmin, boundary)
+
+    return {
+        'cursor': format_cursor(shard, next_cursor),
+        # Sem avanço (transação longa segurando o xmin), o cliente espera a
+        # próxima sincronização em vez de repetir a mesma página em seguida
+        'has_more': boundary is not None and next_cursor > since,
+        'reset': reset,
+        'projects': rows['projects'],
+        'tasks': rows['tasks'],
+        'deleted': [{'kind': tombstone.kind, 'id': tombstone.object_id} for tombstone in rows['deleted']],
+    }
@@ -0,0 +1,336 @@
+"""
+Push de mudanças de projetos e tarefas por Server-Sent Events.
+
+Triggers (migration 0007) fazem NOTIFY no canal do schema a cada linha
+escrita; cada processo mantém uma única conexão LISTEN por banco (shard),
+em uma thread, que assina só os canais dos tenants com clientes conectados
+neste processo e distribui os eventos para as filas dos assinantes.
+
+As filas são limitadas (SSE_QUEUE_SIZE): um cliente que não consome a tempo
+é desconectado com um evento "dropped" em vez de acumular memória no
+servidor. Ao reconectar, ou ao receber "resync" (a conexão LISTEN caiu e
+eventos podem ter se perdido), o cliente busca o que perdeu em /api/changes.
+
+O stream é um gerador async: sob ASGI cada cliente conectado custa só uma
+corrotina. A conexão LISTEN precisa ir direto ao PostgreSQL (um pooler em
+modo transação não repassa notificações).
+"""
+import asyncio
+import json
+import logging
+import os
+import select
+import threading
+
+import psycopg2
+from django.conf import settings
+from django.db import connections
+from django_tenants.utils import get_public_schema_name
+from psycopg2 import sql
+
+from apps.core import metrics
+
+logger = logging.getLogger(__name__)
+
+# Marcadores colocados na fila de um assinante
+DROPPED = object()
+RESYNC = object()
+
+
+class TooManySubscribers(Exception):
+    """Limite de conexões SSE do processo atingido"""
+
+
+def channel_for(schema_name):
+    # Mesmo nome gerado pelo trigger (identificadores têm até 63 bytes)
+    return f'tasks_{schema_name}'[:63]
+
+
+def format_event(event, data, event_id=None):
+    lines = [f'id: {event_id}'] if event_id is not None else []
+    lines += [f'event: {event}', f'data: {json.dumps(data)}']
+    return '\n'.join(lines) + '\n\n'
+
+
+class Subscription:
+    """Fila de eventos de um cliente SSE, consumida no event loop dele"""
+
+    def __init__(self, hub, key, schema_name, tenant_id, loop, queue_size):
+        self.hub = hub
+        self.key = key
+        self.schema_name = schema_name
+        self.tenant_id = tenant_id  # só para tenants compartilhados
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+    def matches(self, event):
+        if event.get('schema') != self.schema_name:
+            return False
+        return self.tenant_id is None or event.get('tenant') == self.tenant_id
+
+    def push(self, event):
+        """Chamado pela thread do listener"""
+        try:
+            self.loop.call_soon_threadsafe(self.deliver, event)
+        except RuntimeError:  # event loop já encerrado
+            self.hub.unsubscribe(self)
+
+    def deliver(self, event):
+        if self.dropped:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Cliente lento: descarta o atraso e encerra o stream
+            self.dropped = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(DROPPED)
+            self.hub.unsubscribe(self, dropped=True)
+
+
+class ChangeListener(threading.Thread):
+    """Conexão LISTEN de um banco; os canais acompanham os assinantes do hub"""
+
+    def __init__(self, hub, alias, idle_check=30.0, reconnect_delay=1.0):
+        super().__init__(name=f'change-listener-{alias}', daemon=True)
+        self.hub = hub
+        self.alias = alias
+        self.idle_check = idle_check
+        self.reconnect_delay = reconnect_delay
+        self.lock = threading.Lock()
+        self.channels = set()
+        self.listening = set()
+        self.wake_r, self.wake_w = os.pipe()
+        self.stopped = threading.Event()
+        self.connected = threading.Event()
+        self.reconnects = 0
+
+    def set_channels(self, channels):
+        with self.lock:
+            self.channels = set(channels)
+        os.write(self.wake_w, b'.')
+
+    def stop(self):
+        self.stopped.set()
+        try:
+            os.write(self.wake_w, b'.')
+        except OSError:
+            pass
+
+    def connect(self):
+        params = connections[self.alias].get_connection_params()
+        params.pop('cursor_factory', None)
+        db_connection = psycopg2.connect(**params)
+        db_connection.autocommit = True
+        self.listening = set()
+        return db_connection
+
+    def sync_channels(self, db_connection):
+        with self.lock:
+            wanted = set(self.channels)
+        with db_connection.cursor() as cursor:
+            for channel in wanted - self.listening:
+                cursor.execute(sql.SQL('LISTEN {}').format(sql.Identifier(channel)))
+            for channel in self.listening - wanted:
+                cursor.execute(sql.SQL('UNLISTEN {}').format(sql.Identifier(channel)))
+        self.listening = wanted
+
+    def run(self):
+        db_connection = None
+        while not self.stopped.is_set():
+            try:
+                if db_connection is None:
+                    db_connection = self.connect()
+                    self.connected.set()
+                self.sync_channels(db_connection)
+
+                ready, _, _ = select.select([db_connection, self.wake_r], [], [], self.idle_check)
+                if self.wake_r in ready:
+                    os.read(self.wake_r, 1024)
+                if not ready:
+                    # Ocioso: confirma que a conexão continua viva
+                    with db_connection.cursor() as cursor:
+                        cursor.execute('SELECT 1')
+                db_connection.poll()
+                while db_connection.notifies:
+                    notify = db_connection.notifies.pop(0)
+                    self.hub.dispatch(self.alias, notify.channel, notify.payload)
+            except (psycopg2.Error, OSError) as error:
+                logger.warning('Listener de mudanças de %s desconectado: %s', self.alias, error)
+                self.connected.clear()
+                if db_connection is not None:
+                    db_connection.close()
+                    # Notificações podem ter se perdido enquanto estava fora
+                    self.hub.resync(self.alias)
+                db_connection = None
+                self.reconnects += 1
+                self.stopped.wait(self.reconnect_delay)
+
+        if db_connection is not None:
+            db_connection.close()
+        os.close(self.wake_r)
+        os.close(self.wake_w)
+
+
+class ChangeHub:
+    """Assinantes SSE do processo, agrupados por (banco, canal)"""
+
+    def __init__(self, queue_size=100, max_subscribers=1000):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.lock = threading.Lock()
+        self.subscribers = {}
+        self.listeners = {}
+        self.delivered = 0
+        self.dropped = 0
+        self.rejected = 0
+
+    def subscriber_count(self):
+        with self.lock:
+            return sum(len(subscriptions) for subscriptions in self.subscribers.values())
+
+    def has_capacity(self):
+        return self.subscriber_count() < self.max_subscribers
+
+    def subscribe(self, tenant, loop=None):
+        loop = loop or asyncio.get_running_loop()
+        alias = tenant.shard
+        schema_name = get_public_schema_name() if tenant.is_shared else tenant.schema_name
+        key = (alias, channel_for(schema_name))
+        subscription = Subscription(
+            self, key, schema_name, tenant.pk if tenant.is_shared else None, loop, self.queue_size,
+        )
+        with self.lock:
+            if sum(len(subscriptions) for subscriptions in self.subscribers.values()) >= self.max_subscribers:
+                self.rejected += 1
+                raise TooManySubscribers()
+            self.subscribers.setdefault(key, set()).add(subscription)
+            listener = self.listeners.get(alias)
+            if listener is None:
+                listener = self.listeners[alias] = ChangeListener(self, alias)
+                listener.start()
+            channels = self.channels(alias)
+        listener.set_channels(channels)
+        return subscription
+
+    def unsubscribe(self, subscription, dropped=False):
+        alias = subscription.key[0]
+        with self.lock:
+            subscriptions = self.subscribers.get(subscription.key)
+            if not subscriptions or subscription not in subscriptions:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self.subscribers[subscription.key]
+            if dropped:
+                self.dropped += 1
+            listener = self.listeners.get(alias)
+            channels = self.channels(alias)
+        if listener is not None:
+            listener.set_channels(channels)
+
+    def channels(self, alias):
+        return {channel for (key_alias, channel) in self.subscribers if key_alias == alias}
+
+    def dispatch(self, alias, channel, payload):
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            return
+        with self.lock:
+            subscriptions = [s for s in self.subscribers.get((alias, channel), ()) if s.matches(event)]
+            self.delivered += len(subscriptions)
+        for subscription in subscriptions:
+            subscription.push(event)
+
+    def resync(self, alias):
+        with self.lock:
+            subscriptions = [
+                subscription
+                for (key_alias, _), group in self.subscribers.items() if key_alias == alias
+                for subscription in group
+            ]
+        for subscription in subscriptions:
+            subscription.push(RESYNC)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'subscribers': sum(len(subscriptions) for subscriptions in self.subscribers.values()),
+                'channels': len(self.subscribers),
+                'max_subscribers': self.max_subscribers,
+                'delivered': self.delivered,
+                'dropped': self.dropped,
+                'rejected': self.rejected,
+                'listeners': {
+                    alias: {'connected': listener.connected.is_set(), 'reconnects': listener.reconnects}
+                    for alias, listener in self.listeners.items()
+                },
+            }
+
+    def shutdown(self):
+        with self.lock:
+            listeners = list(self.listeners.values())
+            self.listeners = {}
+        for listener in listeners:
+            listener.stop()
+            listener.join(timeout=5)
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_hub():
+    """Hub do processo, criado na primeira utilização"""
+    global _hub
+    if _hub is None:
+        with _hub_lock:
+            if _hub is None:
+                _hub = ChangeHub(
+                    queue_size=settings.SSE_QUEUE_SIZE,
+                    max_subscribers=settings.SSE_MAX_SUBSCRIBERS,
+                )
+    return _hub
+
+
+metrics.register('change_events', lambda: get_hub().snapshot())
+
+
+def to_client_event(event):
+    return {key: event.get(key) for key in ('kind', 'op', 'id', 'project_id', 'change_id')}
+
+
+async def event_stream(tenant, hub=None, heartbeat=None):
+    """
+    Corpo do text/event-stream: eventos "change" até o cliente desconectar
+    ou ser descartado por lentidão ("dropped"), com comentários de heartbeat
+    nos intervalos (mantêm proxies com a conexão aberta).
+    """
+    hub = hub or get_hub()
+    heartbeat = heartbeat or settings.SSE_HEARTBEAT
+    yield f'retry: {settings.SSE_RETRY_MS}\n\n'
+    try:
+        subscription = hub.subscribe(tenant)
+    except TooManySubscribers:
+        yield format_event('dropped', {'reason': 'capacity'})
+        return
+
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+            if event is DROPPED:
+                yield format_event('dropped', {'reason': 'slow_client'})
+                return
+            if event is RESYNC:
+                yield format_event('resync', {})
+                continue
+            yield format_event('change', to_client_event(event), event_id=event.get('change_id'))
+    finally:
+        hub.unsubscribe(subscription)
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.11 on 2026-10-19 01:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django_tenants.utils import get_public_schema_name
+
+
+def create_shared_tables(apps, schema_editor):
+    """
+    O app entrou em SHARED_APPS depois das migrations 0001-0003, que já
+    estavam registradas no public sem criar tabelas; cria as do estado atual.
+    """
+    connection = schema_editor.connection
+    if connection.schema_name != get_public_schema_name():
+        return
+    existing = connection.introspection.table_names()
+    for model_name in ('Project', 'Task'):
+        model = apps.get_model('tasks', model_name)
+        if model._meta.db_table not in existing:
+            schema_editor.create_model(model)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_client_tenancy_mode'),
+        ('tasks', '0003_project_is_completed'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_shared_tables, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='project',
+            name='tenant',
+            field=models.ForeignKey(blank=True, db_constraint=False, editable=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.client'),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='tenant',
+            field=models.ForeignKey(blank=True, db_constraint=False, editable=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.client'),
+        ),
+    ]
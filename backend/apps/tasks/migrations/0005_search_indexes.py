@@ -0,0 +1,57 @@
+# Generated by Django 5.2.11 on 2026-10-19 01:53
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+from django_tenants.utils import get_public_schema_name
+
+TRIGRAM_INDEXES = {
+    'tasks_project': 'tasks_project_trgm',
+    'tasks_task': 'tasks_task_trgm',
+}
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """
+    Índices de trigramas para busca por trecho (ILIKE '%termo%') quando o
+    pg_trgm está disponível no servidor; sem ele a busca usa só o full-text.
+    A extensão é instalada uma vez, no schema public.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        if schema_editor.connection.schema_name == get_public_schema_name():
+            cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+            if cursor.fetchone():
+                cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm WITH SCHEMA public')
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        if not cursor.fetchone():
+            return
+    for table, index in TRIGRAM_INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS "{index}" ON "{table}" '
+            f'USING gin ("name" public.gin_trgm_ops, "description" public.gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    for index in TRIGRAM_INDEXES.values():
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{index}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_client_tenancy_mode'),
+        ('tasks', '0004_scoped_tenant'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='project',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('name', 'description', config='simple'), name='tasks_project_search'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('name', 'description', config='simple'), name='tasks_task_search'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
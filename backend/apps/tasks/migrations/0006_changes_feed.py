@@ -0,0 +1,81 @@
+# Generated by Django 5.2.11 on 2026-10-19 01:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# change_id = id da transação que escreveu a linha (xid8 cabe em bigint). O
+# tombstone vai para a tabela do mesmo schema da linha removida, independente
+# do search_path de quem apagou.
+CHANGE_TRIGGERS = """
+CREATE OR REPLACE FUNCTION tasks_set_change_id() RETURNS trigger AS $$
+BEGIN
+    NEW.change_id := pg_current_xact_id()::text::bigint;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION tasks_record_tombstone() RETURNS trigger AS $$
+BEGIN
+    EXECUTE format(
+        'INSERT INTO %I.tasks_tombstone (kind, object_id, tenant_id, change_id, deleted_at) '
+        'VALUES ($1, $2, $3, pg_current_xact_id()::text::bigint, now())',
+        TG_TABLE_SCHEMA
+    ) USING TG_ARGV[0], OLD.id, OLD.tenant_id;
+    RETURN OLD;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER tasks_project_change_id BEFORE INSERT OR UPDATE ON tasks_project
+    FOR EACH ROW EXECUTE FUNCTION tasks_set_change_id();
+CREATE TRIGGER tasks_task_change_id BEFORE INSERT OR UPDATE ON tasks_task
+    FOR EACH ROW EXECUTE FUNCTION tasks_set_change_id();
+CREATE TRIGGER tasks_project_tombstone AFTER DELETE ON tasks_project
+    FOR EACH ROW EXECUTE FUNCTION tasks_record_tombstone('project');
+CREATE TRIGGER tasks_task_tombstone AFTER DELETE ON tasks_task
+    FOR EACH ROW EXECUTE FUNCTION tasks_record_tombstone('task');
+"""
+
+DROP_CHANGE_TRIGGERS = """
+DROP TRIGGER IF EXISTS tasks_task_tombstone ON tasks_task;
+DROP TRIGGER IF EXISTS tasks_project_tombstone ON tasks_project;
+DROP TRIGGER IF EXISTS tasks_task_change_id ON tasks_task;
+DROP TRIGGER IF EXISTS tasks_project_change_id ON tasks_project;
+DROP FUNCTION IF EXISTS tasks_record_tombstone();
+DROP FUNCTION IF EXISTS tasks_set_change_id();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_client_tenancy_mode'),
+        ('tasks', '0005_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='change_id',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='change_id',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('change_id', models.BigIntegerField(db_index=True)),
+                ('deleted_at', models.DateTimeField()),
+                ('tenant', models.ForeignKey(blank=True, db_constraint=False, editable=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.client')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunSQL(CHANGE_TRIGGERS, DROP_CHANGE_TRIGGERS),
+    ]
@@ -0,0 +1,53 @@
+from django.db import migrations
+
+# Um NOTIFY por linha escrita, no canal do schema da tabela (tenants
+# compartilhados caem no canal do public; o tenant vai no payload). O
+# PostgreSQL só entrega no commit e descarta tudo no rollback.
+NOTIFY_TRIGGERS = """
+CREATE OR REPLACE FUNCTION tasks_notify_change() RETURNS trigger AS $$
+DECLARE
+    changed jsonb;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        changed := to_jsonb(OLD);
+    ELSE
+        changed := to_jsonb(NEW);
+    END IF;
+    PERFORM pg_notify(
+        left('tasks_' || TG_TABLE_SCHEMA, 63),
+        jsonb_build_object(
+            'schema', TG_TABLE_SCHEMA,
+            'tenant', changed->'tenant_id',
+            'kind', TG_ARGV[0],
+            'op', lower(TG_OP),
+            'id', changed->'id',
+            'project_id', COALESCE(changed->'project_id', changed->'id'),
+            'change_id', pg_current_xact_id()::text::bigint
+        )::text
+    );
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER tasks_project_notify AFTER INSERT OR UPDATE OR DELETE ON tasks_project
+    FOR EACH ROW EXECUTE FUNCTION tasks_notify_change('project');
+CREATE TRIGGER tasks_task_notify AFTER INSERT OR UPDATE OR DELETE ON tasks_task
+    FOR EACH ROW EXECUTE FUNCTION tasks_notify_change('task');
+"""
+
+DROP_NOTIFY_TRIGGERS = """
+DROP TRIGGER IF EXISTS tasks_task_notify ON tasks_task;
+DROP TRIGGER IF EXISTS tasks_project_notify ON tasks_project;
+DROP FUNCTION IF EXISTS tasks_notify_change();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0006_changes_feed'),
+    ]
+
+    operations = [
+        migrations.RunSQL(NOTIFY_TRIGGERS, DROP_NOTIFY_TRIGGERS),
+    ]
@@ -0,0 +1,172 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+# O UPDATE de task_count feito pelos triggers de contagem não é uma mudança
+# do projeto para o feed (/api/changes) nem para o SSE: os triggers de linha
+# do projeto passam a ignorar updates que só mexem nele.
+ONLY_COUNTERS_CHANGED = (
+    "(to_jsonb(OLD) - 'task_count' - 'change_id') IS DISTINCT FROM (to_jsonb(NEW) - 'task_count' - 'change_id')"
+)
+
+PROJECT_ROW_TRIGGERS = f"""
+DROP TRIGGER tasks_project_change_id ON tasks_project;
+DROP TRIGGER tasks_project_notify ON tasks_project;
+CREATE TRIGGER tasks_project_change_id BEFORE INSERT ON tasks_project
+    FOR EACH ROW EXECUTE FUNCTION tasks_set_change_id();
+CREATE TRIGGER tasks_project_change_id_update BEFORE UPDATE ON tasks_project
+    FOR EACH ROW WHEN ({ONLY_COUNTERS_CHANGED}) EXECUTE FUNCTION tasks_set_change_id();
+CREATE TRIGGER tasks_project_notify AFTER INSERT OR DELETE ON tasks_project
+    FOR EACH ROW EXECUTE FUNCTION tasks_notify_change('project');
+CREATE TRIGGER tasks_project_notify_update AFTER UPDATE ON tasks_project
+    FOR EACH ROW WHEN ({ONLY_COUNTERS_CHANGED}) EXECUTE FUNCTION tasks_notify_change('project');
+"""
+
+RESTORE_PROJECT_ROW_TRIGGERS = """
+DROP TRIGGER IF EXISTS tasks_project_notify_update ON tasks_project;
+DROP TRIGGER IF EXISTS tasks_project_notify ON tasks_project;
+DROP TRIGGER IF EXISTS tasks_project_change_id_update ON tasks_project;
+DROP TRIGGER IF EXISTS tasks_project_change_id ON tasks_project;
+CREATE TRIGGER tasks_project_change_id BEFORE INSERT OR UPDATE ON tasks_project
+    FOR EACH ROW EXECUTE FUNCTION tasks_set_change_id();
+CREATE TRIGGER tasks_project_notify AFTER INSERT OR UPDATE OR DELETE ON tasks_project
+    FOR EACH ROW EXECUTE FUNCTION tasks_notify_change('project');
+"""
+
+# Triggers por instrução com tabelas de transição: um bulk_create/COPY de N
+# tarefas vira um UPDATE por projeto afetado e um upsert na linha de
+# estatísticas, em vez de N. A linha do tenant é a de tenant_id (0 para linhas
+# gravadas sem tenant, ex.: seed por COPY); a leitura soma as linhas visíveis.
+STATS_TRIGGERS = """
+CREATE OR REPLACE FUNCTION tasks_count_tasks() RETURNS trigger AS $$
+DECLARE
+    delta text;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        delta := 'SELECT project_id, tenant_id, 1 AS n FROM new_rows';
+    ELSIF TG_OP = 'DELETE' THEN
+        delta := 'SELECT project_id, tenant_id, -1 AS n FROM old_rows';
+    ELSE
+        delta := 'SELECT project_id, tenant_id, 1 AS n FROM new_rows '
+                 'UNION ALL SELECT project_id, tenant_id, -1 FROM old_rows';
+    END IF;
+
+    EXECUTE format(
+        'UPDATE %I.tasks_project AS p SET task_count = p.task_count + d.n '
+        'FROM (SELECT project_id, sum(n) AS n FROM (%s) delta GROUP BY project_id HAVING sum(n) <> 0) d '
+        'WHERE p.id = d.project_id',
+        TG_TABLE_SCHEMA, delta
+    );
+    EXECUTE format(
+        'INSERT INTO %I.tasks_tenantstats AS s '
+        '(tenant_id, project_count, completed_project_count, task_count, last_activity_at) '
+        'SELECT COALESCE(tenant_id, 0), 0, 0, sum(n), now() FROM (%s) delta GROUP BY 1 '
+        'ON CONFLICT (tenant_id) DO UPDATE SET task_count = s.task_count + EXCLUDED.task_count, '
+        'last_activity_at = GREATEST(s.last_activity_at, EXCLUDED.last_activity_at)',
+        TG_TABLE_SCHEMA, delta
+    );
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION tasks_count_projects() RETURNS trigger AS $$
+DECLARE
+    delta text;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        delta := 'SELECT tenant_id, 1 AS n, is_completed::int AS c FROM new_rows';
+    ELSIF TG_OP = 'DELETE' THEN
+        delta := 'SELECT tenant_id, -1 AS n, -(is_completed::int) AS c FROM old_rows';
+    ELSE
+        -- Ignora os updates de task_count feitos por tasks_count_tasks()
+        delta := 'SELECT cur.tenant_id, 0 AS n, cur.is_completed::int - prev.is_completed::int AS c '
+                 'FROM new_rows cur JOIN old_rows prev ON prev.id = cur.id '
+                 'WHERE (to_jsonb(prev) - ''task_count'' - ''change_id'') '
+                 'IS DISTINCT FROM (to_jsonb(cur) - ''task_count'' - ''change_id'')';
+    END IF;
+
+    EXECUTE format(
+        'INSERT INTO %I.tasks_tenantstats AS s '
+        '(tenant_id, project_count, completed_project_count, task_count, last_activity_at) '
+        'SELECT COALESCE(tenant_id, 0), sum(n), sum(c), 0, now() FROM (%s) delta GROUP BY 1 '
+        'ON CONFLICT (tenant_id) DO UPDATE SET project_count = s.project_count + EXCLUDED.project_count, '
+        'completed_project_count = s.completed_project_count + EXCLUDED.completed_project_count, '
+        'last_activity_at = GREATEST(s.last_activity_at, EXCLUDED.last_activity_at)',
+        TG_TABLE_SCHEMA, delta
+    );
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER tasks_task_stats_insert AFTER INSERT ON tasks_task
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION tasks_count_tasks();
+CREATE TRIGGER tasks_task_stats_update AFTER UPDATE ON tasks_task
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION tasks_count_tasks();
+CREATE TRIGGER tasks_task_stats_delete AFTER DELETE ON tasks_task
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION tasks_count_tasks();
+CREATE TRIGGER tasks_project_stats_insert AFTER INSERT ON tasks_project
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION tasks_count_projects();
+CREATE TRIGGER tasks_project_stats_update AFTER UPDATE ON tasks_project
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION tasks_count_projects();
+CREATE TRIGGER tasks_project_stats_delete AFTER DELETE ON tasks_project
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION tasks_count_projects();
+"""
+
+DROP_STATS_TRIGGERS = """
+DROP TRIGGER IF EXISTS tasks_project_stats_delete ON tasks_project;
+DROP TRIGGER IF EXISTS tasks_project_stats_update ON tasks_project;
+DROP TRIGGER IF EXISTS tasks_project_stats_insert ON tasks_project;
+DROP TRIGGER IF EXISTS tasks_task_stats_delete ON tasks_task;
+DROP TRIGGER IF EXISTS tasks_task_stats_update ON tasks_task;
+DROP TRIGGER IF EXISTS tasks_task_stats_insert ON tasks_task;
+DROP FUNCTION IF EXISTS tasks_count_projects();
+DROP FUNCTION IF EXISTS tasks_count_tasks();
+"""
+
+# Contadores das linhas que já existem (antes dos triggers de estatística)
+BACKFILL = """
+UPDATE tasks_project AS p SET task_count = c.n
+FROM (SELECT project_id, count(*) AS n FROM tasks_task GROUP BY project_id) c
+WHERE p.id = c.project_id;
+
+INSERT INTO tasks_tenantstats (tenant_id, project_count, completed_project_count, task_count, last_activity_at)
+SELECT tenant_key, sum(projects), sum(completed), sum(tasks), max(activity) FROM (
+    SELECT COALESCE(tenant_id, 0) AS tenant_key, count(*) AS projects,
+           count(*) FILTER (WHERE is_completed) AS completed, 0 AS tasks, max(updated_at) AS activity
+    FROM tasks_project GROUP BY 1
+    UNION ALL
+    SELECT COALESCE(tenant_id, 0), 0, 0, count(*), max(updated_at) FROM tasks_task GROUP BY 1
+) counts GROUP BY tenant_key;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_client_tenancy_mode'),
+        ('tasks', '0007_change_notifications'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='task_count',
+            field=models.IntegerField(db_default=0, default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='TenantStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('project_count', models.IntegerField(default=0)),
+                ('completed_project_count', models.IntegerField(default=0)),
+                ('task_count', models.IntegerField(default=0)),
+                ('last_activity_at', models.DateTimeField(blank=True, null=True)),
+                ('tenant', models.ForeignKey(blank=True, db_constraint=False, editable=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.client')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('tenant',), name='tasks_tenantstats_tenant')],
+            },
+        ),
+        migrations.RunSQL(PROJECT_ROW_TRIGGERS, RESTORE_PROJECT_ROW_TRIGGERS),
+        migrations.RunSQL(BACKFILL, migrations.RunSQL.noop),
+        migrations.RunSQL(STATS_TRIGGERS, DROP_STATS_TRIGGERS),
+    ]
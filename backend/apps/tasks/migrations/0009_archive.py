@@ -0,0 +1,105 @@
+# Generated by Django 5.2.11 on 2026-10-19 02:50
+
+import django.db.models.deletion
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+# completed_at acompanha is_completed em qualquer caminho de escrita (save(),
+# update(), SQL direto): preenchido quando o projeto é concluído, limpo quando
+# é reaberto. Um valor explícito é respeitado (ex.: restauração, correções).
+COMPLETED_AT_TRIGGER = """
+CREATE OR REPLACE FUNCTION tasks_set_completed_at() RETURNS trigger AS $$
+BEGIN
+    IF NOT NEW.is_completed THEN
+        NEW.completed_at := NULL;
+    ELSIF TG_OP = 'INSERT' OR NOT OLD.is_completed THEN
+        NEW.completed_at := COALESCE(NEW.completed_at, now());
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER tasks_project_completed_at BEFORE INSERT OR UPDATE OF is_completed, completed_at ON tasks_project
+    FOR EACH ROW EXECUTE FUNCTION tasks_set_completed_at();
+"""
+
+DROP_COMPLETED_AT_TRIGGER = """
+DROP TRIGGER IF EXISTS tasks_project_completed_at ON tasks_project;
+DROP FUNCTION IF EXISTS tasks_set_completed_at();
+"""
+
+# Projetos já concluídos: a melhor estimativa é a última alteração. Sem os
+# triggers, para não virar uma mudança de cada projeto no feed/SSE
+BACKFILL = """
+ALTER TABLE tasks_project DISABLE TRIGGER USER;
+UPDATE tasks_project SET completed_at = updated_at WHERE is_completed;
+ALTER TABLE tasks_project ENABLE TRIGGER USER;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_client_archive_completed_after_days'),
+        ('tasks', '0008_maintained_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedProject',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100)),
+                ('description', models.TextField()),
+                ('is_completed', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('task_count', models.IntegerField(default=0)),
+                ('archived_at', models.DateTimeField(db_default=django.db.models.functions.datetime.Now())),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedTask',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100)),
+                ('description', models.TextField()),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(db_default=django.db.models.functions.datetime.Now())),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunSQL(BACKFILL, migrations.RunSQL.noop),
+        migrations.RunSQL(COMPLETED_AT_TRIGGER, DROP_COMPLETED_AT_TRIGGER),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(condition=models.Q(('is_completed', True)), fields=['tenant', 'completed_at'], name='tasks_project_completed'),
+        ),
+        migrations.AddField(
+            model_name='archivedproject',
+            name='tenant',
+            field=models.ForeignKey(blank=True, db_constraint=False, editable=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.client'),
+        ),
+        migrations.AddField(
+            model_name='archivedtask',
+            name='project',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tasks', to='tasks.archivedproject'),
+        ),
+        migrations.AddField(
+            model_name='archivedtask',
+            name='tenant',
+            field=models.ForeignKey(blank=True, db_constraint=False, editable=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.client'),
+        ),
+    ]
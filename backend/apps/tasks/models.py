@@ -1,22 +1,132 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
 from django.db import models
-from django_tenants.models import TenantMixin
+from django.db.models import Q
+from django.db.models.functions import Now
 
-class Project(models.Model):
+from apps.core.tenancy import TenantScopedModel
+
+# Configuração do full-text search. O índice GIN é de expressão: só é usado
+# quando a query repete exatamente search_vector() (ver apps.tasks.search)
+SEARCH_CONFIG = 'simple'
+
+
+def search_vector():
+    return SearchVector('name', 'description', config=SEARCH_CONFIG)
+
+
+def change_id_field():
+    # Id da transação da última escrita na linha, gravado por trigger (ver
+    # migration 0006 e apps.tasks.changes); o valor enviado pelo Django é ignorado
+    return models.BigIntegerField(default=0, editable=False, db_index=True)
+
+
+class Project(TenantScopedModel):
     name = models.CharField(max_length=100)
     description = models.TextField()
     is_completed = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    
+    change_id = change_id_field()
+    # Mantido por trigger a cada escrita em tasks_task (migration 0008)
+    task_count = models.IntegerField(default=0, db_default=0, editable=False)
+    # Quando o projeto foi concluído; preenchido por trigger (migration 0009),
+    # base do arquivamento (apps.tasks.archive)
+    completed_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            GinIndex(search_vector(), name='tasks_project_search'),
+            models.Index(fields=['tenant', 'completed_at'], condition=Q(is_completed=True),
+                         name='tasks_project_completed'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Um save() regravaria o task_count (e o completed_at) lido antes,
+        # desfazendo o que os triggers gravaram nesse meio tempo
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in ('task_count', 'completed_at')
+            ]
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.name
 
-class Task(models.Model):
+class Task(TenantScopedModel):
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='tasks')
     name = models.CharField(max_length=100)
     description = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    
+    change_id = change_id_field()
+
+    class Meta:
+        indexes = [GinIndex(search_vector(), name='tasks_task_search')]
+
     def __str__(self):
         return self.name
+
+
+class ArchivedProject(TenantScopedModel):
+    """
+    Projeto concluído movido para fora de tasks_project pelo arquivamento
+    (apps.tasks.archive), com o mesmo id. As linhas só são escritas ao
+    arquivar: a cópia incremental entre shards usa archived_at.
+    """
+    changed_at_column = 'archived_at'
+    id = models.BigIntegerField(primary_key=True)
+    name = models.CharField(max_length=100)
+    description = models.TextField()
+    is_completed = models.BooleanField(default=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    completed_at = models.DateTimeField(null=True, blank=True)
+    task_count = models.IntegerField(default=0)
+    archived_at = models.DateTimeField(db_default=Now())
+
+    def __str__(self):
+        return self.name
+
+
+class ArchivedTask(TenantScopedModel):
+    """Tarefa de um ArchivedProject, com o mesmo id da original"""
+    changed_at_column = 'archived_at'
+    id = models.BigIntegerField(primary_key=True)
+    project = models.ForeignKey(ArchivedProject, on_delete=models.CASCADE, related_name='tasks')
+    name = models.CharField(max_length=100)
+    description = models.TextField()
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(db_default=Now())
+
+    def __str__(self):
+        return self.name
+
+
+class Tombstone(TenantScopedModel):
+    """Exclusão de projeto/tarefa registrada por trigger, para o feed de mudanças"""
+    trigger_maintained = True
+    kind = models.CharField(max_length=20)  # "project" ou "task"
+    object_id = models.BigIntegerField()
+    change_id = models.BigIntegerField(db_index=True)
+    deleted_at = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.kind} {self.object_id}'
+
+
+class TenantStats(TenantScopedModel):
+    """
+    Totais do tenant mantidos por triggers (migration 0008), sem COUNT nas
+    leituras. Normalmente uma linha; leia com apps.tasks.stats.tenant_stats().
+    """
+    trigger_maintained = True
+    project_count = models.IntegerField(default=0)
+    completed_project_count = models.IntegerField(default=0)
+    task_count = models.IntegerField(default=0)
+    last_activity_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['tenant'], name='tasks_tenantstats_tenant')]
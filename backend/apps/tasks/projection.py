@@ -0,0 +1,121 @@
+"""
+Respostas parciais dos endpoints de leitura de projetos (GET /projects e
+GET /projects/{id}).
+
+  * ``fields=id,name,is_completed`` escolhe as colunas do projeto; com
+    ``tasks.<campo>`` (ex.: ``tasks.name``) as das tarefas embutidas;
+  * ``include=tasks`` embute as tarefas. Sem ele nada de tarefas é lido - o
+    ``task_count`` (mantido por trigger) basta para as listagens;
+  * ``include_archived=true`` soma os projetos arquivados (apps.tasks.archive)
+    com um UNION ALL das tabelas ativas e de arquivo; cada projeto traz
+    ``archived_at`` (null nos ativos).
+
+Só as colunas pedidas saem do banco (.values(), sem instanciar os models) e
+só elas aparecem no JSON. O ``id`` sempre vem; nomes desconhecidos são
+ignorados, como os ``kind`` da busca.
+"""
+from datetime import datetime
+
+from django.db.models import DateTimeField, Value
+
+from .models import ArchivedProject, ArchivedTask, Project, Task
+
+PROJECT_FIELDS = ('id', 'name', 'description', 'is_completed', 'created_at', 'updated_at', 'task_count')
+TASK_FIELDS = ('id', 'name', 'description', 'created_at', 'updated_at')
+INCLUDES = ('tasks',)
+
+
+def split(value):
+    return [name.strip() for name in (value or '').split(',') if name.strip()]
+
+
+class Projection:
+    """Colunas pedidas do projeto e das tarefas (task_fields None: sem tarefas)"""
+
+    def __init__(self, fields=None, include=None, include_archived=False):
+        names = split(fields)
+        include = [name for name in split(include) if name in INCLUDES]
+        project_fields = {name for name in names if name in PROJECT_FIELDS}
+        task_fields = {name[len('tasks.'):] for name in names if name.startswith('tasks.')} & set(TASK_FIELDS)
+
+        if not names:
+            project_fields = set(PROJECT_FIELDS)
+        if not task_fields:
+            task_fields = set(TASK_FIELDS)
+        self.project_fields = [name for name in PROJECT_FIELDS if name in project_fields | {'id'}]
+        self.task_fields = (
+            [name for name in TASK_FIELDS if name in task_fields | {'id'}] if 'tasks' in include else None
+        )
+        self.include_archived = include_archived
+
+    def project_queryset(self, **filters):
+        projects = Project.objects.filter(**filters)
+        if not self.include_archived:
+            return projects.values(*self.project_fields)
+
+        fields = (*self.project_fields, 'archived_at')
+        return projects.annotate(archived_at=Value(None, output_field=DateTimeField())).values(*fields).union(
+            ArchivedProject.objects.filter(**filters).values(*fields), all=True,
+        )
+
+    def task_queryset(self, project_ids):
+        fields = ('project_id', *self.task_fields)
+        tasks = Task.objects.filter(project_id__in=project_ids).values(*fields)
+        if not self.include_archived:
+            return tasks
+        return tasks.union(ArchivedTask.objects.filter(project_id__in=project_ids).values(*fields), all=True)
+
+    def embed(self, projects, tasks):
+        """Dicts de resposta dos projetos, com as tarefas de cada um se pedidas"""
+        projects = [to_json(project) for project in projects]
+        if self.task_fields is None:
+            return projects
+
+        by_project = {project['id']: project for project in projects}
+        for project in projects:
+            project['tasks'] = []
+        for task in tasks:
+            by_project[task.pop('project_id')]['tasks'].append(to_json(task))
+        return projects
+
+
+def to_json(row):
+    return {name: value.isoformat() if isinstance(value, datetime) else value for name, value in row.items()}
+
+
+def list_projects(projection):
+    projects = list(projection.project_queryset())
+    if projection.task_fields is None or not projects:
+        return projection.embed(projects, [])
+    return projection.embed(projects, projection.task_queryset([project['id'] for project in projects]))
+
+
+def get_project(project_id, projection):
+    """Projeto com as colunas pedidas; Project.DoesNotExist se não existir"""
+    projects = list(projection.project_queryset(id=project_id))
+    if not projects:
+        raise Project.DoesNotExist
+    project = projects[0]
+    if projection.task_fields is None:
+        return projection.embed([project], [])[0]
+    return projection.embed([project], projection.task_queryset([project_id]))[0]
+
+
+async def alist_projects(projection):
+    """Versão async de list_projects()"""
+    projects = [project async for project in projection.project_queryset()]
+    if projection.task_fields is None or not projects:
+        return projection.embed(projects, [])
+    tasks = [task async for task in projection.task_queryset([project['id'] for project in projects])]
+    return projection.embed(projects, tasks)
+
+
+async def aget_project(project_id, projection):
+    """Versão async de get_project()"""
+    projects = [project async for project in projection.project_queryset(id=project_id)]
+    if not projects:
+        raise Project.DoesNotExist
+    project = projects[0]
+    if projection.task_fields is None:
+        return projection.embed([project], [])[0]
+    return projection.embed([project], [task async for task in projection.task_queryset([project_id])])[0]
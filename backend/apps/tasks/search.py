@@ -0,0 +1,113 @@
+"""
+Busca ranqueada em projetos e tarefas do tenant.
+
+Uma única query (UNION ALL de projetos e tarefas) ordenada por relevância:
+
+  - full-text: to_tsvector(name || description) @@ websearch_to_tsquery(q),
+    servida pelo índice GIN de expressão de cada tabela (a expressão da query
+    é a mesma do índice, search_vector());
+  - trigramas (se o pg_trgm estiver instalado): similaridade de palavra com
+    name/description, para trechos de palavras e erros de digitação, servida
+    pelos índices gin_trgm_ops criados na migration 0005.
+
+A paginação é por limit/offset; uma linha a mais é buscada para saber se há
+próxima página sem um COUNT sobre todos os resultados.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db import connections
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import Cast
+
+from .models import SEARCH_CONFIG, Project, Task, search_vector
+
+KINDS = ('project', 'task')
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# alias do banco -> pg_trgm instalado?
+_trigram_enabled = {}
+
+
+def trigram_enabled():
+    alias = Project.objects.db
+    if alias not in _trigram_enabled:
+        with connections[alias].cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _trigram_enabled[alias] = cursor.fetchone() is not None
+    return _trigram_enabled[alias]
+
+
+def ranked(model, kind, term, trigram):
+    query = SearchQuery(term, config=SEARCH_CONFIG, search_type='websearch')
+    condition = Q(search=query)
+    rank = SearchRank(search_vector(), query)
+    if trigram:
+        condition |= Q(name__trigram_word_similar=term) | Q(description__trigram_word_similar=term)
+        rank = rank + TrigramWordSimilarity(term, 'name')
+
+    return (
+        model.objects
+        .alias(search=search_vector())
+        .filter(condition)
+        .annotate(
+            kind=Value(kind),
+            item_id=F('id'),
+            item_project_id=F('id') if model is Project else F('project_id'),
+            item_name=F('name'),
+            item_description=F('description'),
+            rank=Cast(rank, FloatField()),
+        )
+        .values('kind', 'item_id', 'item_project_id', 'item_name', 'item_description', 'rank')
+    )
+
+
+def search_queryset(term, kinds=KINDS, trigram=False):
+    models = {'project': Project, 'task': Task}
+    querysets = [ranked(models[kind], kind, term, trigram) for kind in KINDS if kind in kinds]
+    combined = querysets[0].union(*querysets[1:], all=True) if len(querysets) > 1 else querysets[0]
+    return combined.order_by('-rank', 'kind', 'item_id')
+
+
+def normalize(term, kinds, limit, offset):
+    term = (term or '').strip()
+    kinds = [kind for kind in (kinds or KINDS) if kind in KINDS]
+    limit = max(1, min(limit or DEFAULT_LIMIT, MAX_LIMIT))
+    return term, kinds, limit, max(0, offset or 0)
+
+
+def to_result(row):
+    return {
+        'kind': row['kind'],
+        'id': row['item_id'],
+        'project_id': row['item_project_id'],
+        'name': row['item_name'],
+        'description': row['item_description'],
+        'rank': row['rank'],
+    }
+
+
+def page(rows, limit, offset):
+    return {
+        'results': [to_result(row) for row in rows[:limit]],
+        'next_offset': offset + limit if len(rows) > limit else None,
+    }
+
+
+def search(term, kinds=None, limit=DEFAULT_LIMIT, offset=0):
+    """Página de resultados: {'results': [...], 'next_offset': int | None}"""
+    term, kinds, limit, offset = normalize(term, kinds, limit, offset)
+    if not term or not kinds:
+        return page([], limit, offset)
+    rows = list(search_queryset(term, kinds, trigram_enabled())[offset:offset + limit + 1])
+    return page(rows, limit, offset)
+
+
+async def asearch(term, kinds=None, limit=DEFAULT_LIMIT, offset=0):
+    """Versão async de search()"""
+    term, kinds, limit, offset = normalize(term, kinds, limit, offset)
+    if not term or not kinds:
+        return page([], limit, offset)
+    trigram = await sync_to_async(trigram_enabled)()
+    rows = [row async for row in search_queryset(term, kinds, trigram)[offset:offset + limit + 1]]
+    return page(rows, limit, offset)
@@ -0,0 +1,122 @@
+"""
+Estatísticas denormalizadas de projetos e tarefas.
+
+Project.task_count e TenantStats são mantidos por triggers por instrução
+(migration 0008), então valem para qualquer caminho de escrita: save(),
+update(), bulk_create(), COPY e SQL direto. As leituras não contam linhas.
+
+O que passa por fora dos triggers (TRUNCATE, ALTER TABLE ... DISABLE TRIGGER,
+correções manuais) pode deixar os contadores divergentes; para consertar:
+
+    python manage.py reconcile_stats
+"""
+from django.db import transaction
+from django.db.models import Count, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Project, Task, TenantStats
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def totals():
+    return {
+        'projects': Coalesce(Sum('project_count'), 0),
+        'completed_projects': Coalesce(Sum('completed_project_count'), 0),
+        'tasks': Coalesce(Sum('task_count'), 0),
+        'last_activity_at': Max('last_activity_at'),
+    }
+
+
+def tenant_stats():
+    """Totais do tenant ativo (uma query, sem COUNT sobre projetos/tarefas)"""
+    return TenantStats.objects.aggregate(**totals())
+
+
+async def atenant_stats():
+    """Versão async de tenant_stats()"""
+    return await TenantStats.objects.aaggregate(**totals())
+
+
+def reconcile_project_counts(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Corrige Project.task_count em lotes de projetos (por id). Cada lote
+    trava os seus projetos antes de contar: uma tarefa criada em paralelo
+    espera o lote terminar e soma sobre o valor corrigido. Retorna quantos
+    projetos estavam divergentes.
+    """
+    actual = Coalesce(Subquery(
+        Task.objects.filter(project=OuterRef('pk')).order_by()
+        .values('project').annotate(total=Count('id')).values('total')
+    ), 0)
+    fixed = 0
+    last_id = 0
+    while True:
+        ids = list(Project.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return fixed
+        with transaction.atomic(using=Project.objects.db):
+            list(Project.objects.filter(pk__in=ids).select_for_update().values_list('pk', flat=True))
+            fixed += Project.objects.filter(pk__in=ids).exclude(task_count=actual).update(task_count=actual)
+        last_id = ids[-1]
+
+
+def recount_project_tasks(connection, schema_name):
+    """
+    Acerta o task_count de todos os projetos de um schema pela contagem real
+    das tarefas, por SQL direto na conexão dada - para um schema que o
+    roteamento ainda não alcança (ex.: o destino de uma migração de shard).
+    Retorna quantos projetos estavam divergentes.
+    """
+    projects, tasks = (f'"{schema_name}"."{model._meta.db_table}"' for model in (Project, Task))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {projects} AS project SET task_count = COALESCE(counted.total, 0) '
+            f'FROM {projects} AS current '
+            f'LEFT JOIN (SELECT project_id, COUNT(*) AS total FROM {tasks} GROUP BY project_id) AS counted '
+            f'ON counted.project_id = current.id '
+            f'WHERE project.id = current.id AND project.task_count <> COALESCE(counted.total, 0)'
+        )
+        return cursor.rowcount
+
+
+def reconcile_tenant_stats(tenant):
+    """
+    Recalcula os totais do tenant ativo e deixa uma única linha de
+    TenantStats. Retorna True se os totais estavam divergentes.
+    """
+    with transaction.atomic(using=TenantStats.objects.db):
+        # Trava a linha do tenant: as escritas em paralelo esperam a contagem
+        TenantStats.objects.bulk_create([TenantStats(tenant_id=tenant.pk)], ignore_conflicts=True)
+        rows = list(TenantStats.objects.select_for_update().order_by('pk'))
+
+        projects = Project.objects.aggregate(
+            total=Count('id'), completed=Count('id', filter=Q(is_completed=True)), activity=Max('updated_at'),
+        )
+        tasks = Task.objects.aggregate(total=Count('id'), activity=Max('updated_at'))
+        expected = (projects['total'], projects['completed'], tasks['total'])
+        current = (
+            sum(row.project_count for row in rows),
+            sum(row.completed_project_count for row in rows),
+            sum(row.task_count for row in rows),
+        )
+        if current == expected and len(rows) == 1:
+            return False
+
+        keep = next(row for row in rows if row.tenant_id == tenant.pk)
+        activity = [value for value in (
+            projects['activity'], tasks['activity'], *(row.last_activity_at for row in rows)
+        ) if value is not None]
+        TenantStats.objects.exclude(pk=keep.pk).delete()
+        keep.project_count, keep.completed_project_count, keep.task_count = expected
+        keep.last_activity_at = max(activity, default=None)
+        keep.save()
+        return current != expected
+
+
+def reconcile(tenant, batch_size=DEFAULT_BATCH_SIZE):
+    """{'projects_fixed': int, 'totals_fixed': bool} do tenant ativo"""
+    return {
+        'projects_fixed': reconcile_project_counts(batch_size),
+        'totals_fixed': reconcile_tenant_stats(tenant),
+    }
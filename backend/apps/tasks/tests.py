@@ -1,3 +1,673 @@
-from django.test import TestCase
+import asyncio
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+import psycopg2
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django_tenants.test.client import TenantClient
+from django_tenants.utils import schema_exists, tenant_context
+
+from apps.core.jwt_utils import generate_jwt_token
+from apps.core.models import Client
+from apps.core.seeding import fill_schema
+from apps.core.tenancy import promote_tenant
+from apps.core.testing import QueryBudgetTestMixin, TenantAPITestCase
+from . import archive, stats
+from .events import ChangeHub, event_stream
+from .models import ArchivedProject, ArchivedTask, Project, Task, TenantStats
+
+User = get_user_model()
+
+
+def project_payload(params):
+    return {'name': 'Projeto', 'description': 'Descrição'}
+
+
+class ProjectAPIQueryBudgetTestCase(QueryBudgetTestMixin, TenantAPITestCase):
+    """Garante que as rotas da API não executam queries proporcionais aos dados"""
+    write_payloads = {
+        'POST /projects': project_payload,
+        'POST /async/projects': project_payload,
+        'PUT /projects/{project_id}': project_payload,
+        'PUT /async/projects/{project_id}': project_payload,
+        'DELETE /projects/{project_id}': lambda params: None,
+        'DELETE /async/projects/{project_id}': lambda params: None,
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(
+            username='budget',
+            email='budget@example.com',
+            password='testpass123',
+            tenant=self.tenant,
+        )
+        self.token = generate_jwt_token(self.user)
+
+    def get_request_kwargs(self):
+        return {'HTTP_AUTHORIZATION': f'Bearer {self.token}'}
+
+    def seed_data(self, scale):
+        projects = Project.objects.bulk_create(
+            Project(name=f'Projeto {i}', description='Descrição')
+            for i in range(scale)
+        )
+        Task.objects.bulk_create(
+            Task(project=project, name=f'Tarefa {i}', description='Descrição')
+            for project in projects
+            for i in range(scale)
+        )
+        return {'project_id': projects[-1].id}
+
+    def test_query_counts_do_not_grow_with_data(self):
+        self.assertQueryCountsStable()
+
+
+class AsyncProjectAPITestCase(TenantAPITestCase):
+    """
+    Endpoints async (/api/async/) respondem igual aos síncronos. O client de
+    teste é WSGI, então as views async rodam via async_to_sync - o ORM async
+    volta para a thread do teste e enxerga a transação dele.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(
+            username='async',
+            email='async@example.com',
+            password='testpass123',
+            tenant=self.tenant,
+        )
+        self.headers = {'HTTP_AUTHORIZATION': f'Bearer {generate_jwt_token(self.user)}'}
+        project = Project.objects.create(name='Projeto', description='Descrição')
+        Task.objects.create(project=project, name='Tarefa', description='Descrição')
+
+    def test_list_projects_matches_sync_endpoint(self):
+        response = self.client.get('/api/async/projects', **self.headers)
+        self.assertEqual(response.status_code, 200)
+
+        sync_response = self.client.get('/api/projects', **self.headers)
+        self.assertEqual(response.json(), sync_response.json())
+
+    def test_create_and_get_project(self):
+        response = self.client.post(
+            '/api/async/projects',
+            {'name': 'Novo', 'description': 'Async'},
+            content_type='application/json',
+            **self.headers,
+        )
+        self.assertEqual(response.status_code, 200)
+        project_id = response.json()['id']
+
+        response = self.client.get(f'/api/async/projects/{project_id}', **self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['name'], 'Novo')
+        self.assertTrue(Project.objects.filter(id=project_id).exists())
+
+    def test_create_project_with_idempotency_key(self):
+        responses = [
+            self.client.post(
+                '/api/async/projects',
+                {'name': 'Retry', 'description': 'Async'},
+                content_type='application/json',
+                HTTP_IDEMPOTENCY_KEY='async-retry',
+                **self.headers,
+            )
+            for _ in range(2)
+        ]
+        self.assertEqual(responses[1]['Idempotent-Replayed'], 'true')
+        self.assertEqual(responses[1].json(), responses[0].json())
+        self.assertEqual(Project.objects.filter(name='Retry').count(), 1)
+
+    def test_get_missing_project_returns_404(self):
+        response = self.client.get('/api/async/projects/999999', **self.headers)
+        self.assertEqual(response.status_code, 404)
+
+    def test_requires_jwt(self):
+        response = self.client.get('/api/async/projects')
+        self.assertEqual(response.status_code, 401)
+
+    def test_login_jwt(self):
+        response = self.client.post(
+            '/api/async/auth/login-jwt',
+            {'username': 'async', 'password': 'testpass123'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['success'])
+
+
+class SparseProjectFieldsTestCase(TenantAPITestCase):
+    """?fields= e ?include=tasks nos endpoints de leitura de projetos"""
+
+    def setUp(self):
+        super().setUp()
+        user = User.objects.create_user(username='sparse', password='testpass123', tenant=self.tenant)
+        self.headers = {'HTTP_AUTHORIZATION': f'Bearer {generate_jwt_token(user)}'}
+        self.project = Project.objects.create(name='Projeto', description='Descrição longa')
+        self.task = Task.objects.create(project=self.project, name='Tarefa', description='Descrição da tarefa')
+
+    def get(self, path, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path, params or {}, **self.headers)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), [query['sql'] for query in queries if 'tasks_' in query['sql']]
+
+    def test_tasks_are_not_loaded_by_default(self):
+        projects, queries = self.get('/api/projects')
+        self.assertEqual(len(projects), 1)
+        self.assertNotIn('tasks', projects[0])
+        self.assertEqual(projects[0]['task_count'], 1)
+        self.assertFalse(any('tasks_task' in sql for sql in queries))
+
+    def test_fields_select_only_requested_columns(self):
+        projects, queries = self.get('/api/projects', {'fields': 'name,is_completed,unknown'})
+        self.assertEqual(projects, [{'id': self.project.id, 'name': 'Projeto', 'is_completed': False}])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('"description"', queries[0])
+
+    def test_include_tasks_with_task_fields(self):
+        project, queries = self.get(
+            f'/api/projects/{self.project.id}', {'fields': 'name,tasks.name', 'include': 'tasks'},
+        )
+        self.assertEqual(project, {
+            'id': self.project.id, 'name': 'Projeto', 'tasks': [{'id': self.task.id, 'name': 'Tarefa'}],
+        })
+        self.assertEqual(len(queries), 2)
+        self.assertFalse(any('"description"' in sql for sql in queries))
+
+    def test_include_tasks_returns_full_tasks(self):
+        projects, _ = self.get('/api/projects', {'include': 'tasks'})
+        self.assertEqual(projects[0]['description'], 'Descrição longa')
+        self.assertEqual(
+            set(projects[0]['tasks'][0]), {'id', 'name', 'description', 'created_at', 'updated_at'},
+        )
+
+    def test_async_endpoints_match_sync(self):
+        for params in ({}, {'fields': 'name', 'include': 'tasks'}):
+            self.assertEqual(
+                self.get('/api/async/projects', params)[0], self.get('/api/projects', params)[0],
+            )
+            self.assertEqual(
+                self.get(f'/api/async/projects/{self.project.id}', params)[0],
+                self.get(f'/api/projects/{self.project.id}', params)[0],
+            )
+
+
+class ProjectArchiveTestCase(TenantAPITestCase):
+    """Arquivamento de projetos concluídos (apps.tasks.archive)"""
+
+    def setUp(self):
+        super().setUp()
+        user = User.objects.create_user(username='archive', password='testpass123', tenant=self.tenant)
+        self.headers = {'HTTP_AUTHORIZATION': f'Bearer {generate_jwt_token(user)}'}
+
+    def create_project(self, name, completed_days_ago=None, tasks=0):
+        project = Project.objects.create(name=name, description='Descrição', is_completed=completed_days_ago is not None)
+        Task.objects.bulk_create([Task(project=project, name=f'T{i}', description='') for i in range(tasks)])
+        if completed_days_ago is not None:
+            Project.objects.filter(pk=project.pk).update(
+                completed_at=timezone.now() - timedelta(days=completed_days_ago),
+            )
+        return project
+
+    def get(self, path, params=None):
+        response = self.client.get(path, params or {}, **self.headers)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_completed_at_follows_is_completed(self):
+        project = Project.objects.create(name='Aberto', description='')
+        self.assertIsNone(Project.objects.get(pk=project.pk).completed_at)
+
+        project.is_completed = True
+        project.save()
+        completed_at = Project.objects.get(pk=project.pk).completed_at
+        self.assertIsNotNone(completed_at)
+        project.name = 'Renomeado'
+        project.save()
+        self.assertEqual(Project.objects.get(pk=project.pk).completed_at, completed_at)
+
+        Project.objects.filter(pk=project.pk).update(is_completed=False)
+        self.assertIsNone(Project.objects.get(pk=project.pk).completed_at)
+
+    def test_archives_old_completed_projects_in_batches(self):
+        first = self.create_project('Antigo', completed_days_ago=200, tasks=2)
+        second = self.create_project('Antigo 2', completed_days_ago=120, tasks=1)
+        recent = self.create_project('Recente', completed_days_ago=10, tasks=1)
+        self.create_project('Aberto', tasks=1)
+
+        self.assertEqual(archive.archive_projects(self.tenant, batch_size=1), {'projects': 2, 'tasks': 3})
+
+        self.assertEqual(
+            sorted(ArchivedProject.objects.values_list('id', 'task_count')), [(first.pk, 2), (second.pk, 1)],
+        )
+        self.assertEqual(ArchivedTask.objects.filter(project_id=first.pk).count(), 2)
+        self.assertFalse(Project.objects.filter(pk__in=[first.pk, second.pk]).exists())
+        self.assertFalse(Task.objects.filter(project_id__in=[first.pk, second.pk]).exists())
+        totals = self.get('/api/stats')
+        self.assertEqual((totals['projects'], totals['completed_projects'], totals['tasks']), (2, 1, 2))
+
+        self.assertEqual(len(self.get('/api/projects')), 2)
+        projects = self.get('/api/projects', {'include_archived': 'true', 'fields': 'name'})
+        archived = {p['id']: p['archived_at'] for p in projects}
+        self.assertEqual(len(archived), 4)
+        self.assertIsNone(archived[recent.pk])
+        self.assertIsNotNone(archived[first.pk])
+
+        project = self.get(f'/api/projects/{first.pk}', {'include_archived': 'true', 'include': 'tasks'})
+        self.assertEqual((project['name'], project['task_count'], len(project['tasks'])), ('Antigo', 2, 2))
+        self.assertEqual(
+            self.get(f'/api/async/projects/{first.pk}', {'include_archived': 'true', 'include': 'tasks'}), project,
+        )
+        for path in (f'/api/projects/{first.pk}', f'/api/async/projects/{first.pk}'):
+            response = self.client.get(path, **self.headers)
+            self.assertEqual(response.status_code, 404)
+            self.assertEqual(response.json(), {'error': 'Project not found'})
+
+    def test_tenant_window_overrides_default(self):
+        self.create_project('Antigo', completed_days_ago=100)
+
+        self.tenant.archive_completed_after_days = 0
+        self.assertEqual(archive.archive_projects(self.tenant)['projects'], 0)
+        self.tenant.archive_completed_after_days = 365
+        self.assertEqual(archive.archive_projects(self.tenant)['projects'], 0)
+        self.tenant.archive_completed_after_days = 30
+        self.assertEqual(archive.archive_projects(self.tenant)['projects'], 1)
+
+    def test_frozen_tenant_is_skipped(self):
+        self.create_project('Antigo', completed_days_ago=200)
+        Client.objects.filter(pk=self.tenant.pk).update(writes_frozen=True)
+        self.assertEqual(archive.archive_projects(self.tenant)['projects'], 0)
+
+    def test_restore_project(self):
+        project = self.create_project('Antigo', completed_days_ago=200, tasks=2)
+        archive.archive_projects(self.tenant)
+
+        response = self.client.post(f'/api/projects/{project.pk}/restore', **self.headers)
+        self.assertEqual(response.status_code, 200)
+        restored = response.json()
+        self.assertEqual((restored['id'], restored['task_count'], len(restored['tasks'])), (project.pk, 2, 2))
+        self.assertFalse(ArchivedProject.objects.exists())
+        self.assertFalse(ArchivedTask.objects.exists())
+        # Nova janela a partir da restauração, que conta como escrita
+        restored = Project.objects.get(pk=project.pk)
+        self.assertGreater(restored.completed_at, timezone.now() - timedelta(minutes=1))
+        self.assertGreater(restored.updated_at, timezone.now() - timedelta(minutes=1))
+        self.assertGreater(Task.objects.filter(project=project).earliest('updated_at').updated_at,
+                           timezone.now() - timedelta(minutes=1))
+        self.assertEqual(self.get('/api/stats')['tasks'], 2)
+
+        response = self.client.post(f'/api/projects/{project.pk}/restore', **self.headers)
+        self.assertEqual(response.status_code, 404)
+
+    def test_restore_refused_while_writes_frozen(self):
+        project = self.create_project('Antigo', completed_days_ago=200, tasks=1)
+        archive.archive_projects(self.tenant)
+        Client.objects.filter(pk=self.tenant.pk).update(writes_frozen=True)
+
+        with self.assertRaises(archive.WritesFrozen):
+            archive.restore_project(self.tenant, project.pk)
+        self.assertTrue(ArchivedProject.objects.filter(pk=project.pk).exists())
+
+    def test_restore_project_async(self):
+        project = self.create_project('Antigo', completed_days_ago=200, tasks=1)
+        archive.archive_projects(self.tenant)
+
+        response = self.client.post(f'/api/async/projects/{project.pk}/restore', **self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['tasks']), 1)
+        response = self.client.post(f'/api/async/projects/{project.pk}/restore', **self.headers)
+        self.assertEqual(response.status_code, 404)
+
+    def test_archive_projects_command(self):
+        self.create_project('Antigo', completed_days_ago=200, tasks=3)
+        output = StringIO()
+        call_command('archive_projects', schemas=[self.tenant.schema_name], stdout=output)
+        self.assertIn('1 projetos e 3 tarefas arquivados', output.getvalue())
+
+
+class SharedTenancyAPITestCase(TenantAPITestCase):
+    """Tenants em modo compartilhado usam a mesma API, com as linhas no public"""
+
+    def create_shared_tenant(self, name):
+        tenant = self.create_tenant(
+            name, f'test_{name}', f'{name}.test.localhost', tenancy_mode=Client.SHARED_MODE,
+        )
+        user = User.objects.create_user(username=name, password='testpass123', tenant=tenant)
+        client = TenantClient(tenant, HTTP_AUTHORIZATION=f'Bearer {generate_jwt_token(user)}')
+        return tenant, client
+
+    def setUp(self):
+        super().setUp()
+        self.shared, self.shared_client = self.create_shared_tenant('small')
+        self.other, self.other_client = self.create_shared_tenant('tiny')
+
+    def create_project(self, client, name):
+        response = client.post(
+            '/api/projects', {'name': name, 'description': 'Descrição'}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()['id']
+
+    def test_api_works_without_a_schema(self):
+        project_id = self.create_project(self.shared_client, 'Compartilhado')
+
+        self.assertFalse(schema_exists(self.shared.schema_name))
+        self.assertEqual(Project.unscoped.get(id=project_id).tenant_id, self.shared.pk)
+        response = self.shared_client.put(
+            f'/api/projects/{project_id}', {'is_completed': True}, content_type='application/json',
+        )
+        self.assertTrue(response.json()['is_completed'])
+        self.assertEqual([p['id'] for p in self.shared_client.get('/api/projects').json()], [project_id])
+        self.assertEqual([p['id'] for p in self.shared_client.get('/api/async/projects').json()], [project_id])
+        self.assertEqual(self.shared_client.delete(f'/api/projects/{project_id}').status_code, 200)
+        self.assertFalse(Project.unscoped.filter(id=project_id).exists())
+
+    def test_shared_tenants_only_see_their_rows(self):
+        project_id = self.create_project(self.shared_client, 'Privado')
+
+        self.assertEqual(self.other_client.get('/api/projects').json(), [])
+        with tenant_context(self.other):
+            self.assertFalse(Project.objects.filter(id=project_id).exists())
+            self.assertEqual(Project.objects.filter(id=project_id).delete()[0], 0)
+        # O tenant com schema próprio não enxerga as tabelas compartilhadas
+        self.assertFalse(Project.objects.filter(id=project_id).exists())
+
+    def test_archive_only_touches_the_tenants_rows(self):
+        ids = {}
+        for tenant, client in ((self.shared, self.shared_client), (self.other, self.other_client)):
+            ids[tenant.pk] = self.create_project(client, tenant.name)
+            with tenant_context(tenant):
+                Project.objects.filter(id=ids[tenant.pk]).update(
+                    is_completed=True, completed_at=timezone.now() - timedelta(days=365),
+                )
+
+        with tenant_context(self.shared):
+            self.assertEqual(archive.archive_projects(self.shared)['projects'], 1)
+
+        self.assertEqual(ArchivedProject.unscoped.get().tenant_id, self.shared.pk)
+        self.assertTrue(Project.unscoped.filter(id=ids[self.other.pk]).exists())
+        archived = self.shared_client.get('/api/projects', {'include_archived': 'true'}).json()
+        self.assertEqual([p['id'] for p in archived], [ids[self.shared.pk]])
+        other = self.other_client.get('/api/projects', {'include_archived': 'true'}).json()
+        self.assertEqual([(p['id'], p['archived_at']) for p in other], [(ids[self.other.pk], None)])
+
+    def test_promote_tenant_moves_rows_to_own_schema(self):
+        project_id = self.create_project(self.shared_client, 'Crescendo')
+        with tenant_context(self.shared):
+            Task.objects.create(project_id=project_id, name='Tarefa', description='Descrição')
+
+        promote_tenant(self.shared, grace=0)
+
+        self.shared.refresh_from_db()
+        self.assertEqual(self.shared.tenancy_mode, Client.SCHEMA_MODE)
+        self.assertTrue(schema_exists(self.shared.schema_name))
+        self.assertFalse(Project.unscoped.filter(tenant_id=self.shared.pk).exists())
+        projects = self.shared_client.get('/api/projects', {'include': 'tasks'}).json()
+        self.assertEqual([(p['id'], len(p['tasks'])) for p in projects], [(project_id, 1)])
+        self.assertEqual(self.other_client.get('/api/projects').json(), [])
+        # Contadores copiados como estavam (triggers desligados na cópia)
+        totals = self.shared_client.get('/api/stats').json()
+        self.assertEqual((totals['projects'], totals['tasks']), (1, 1))
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM public.tasks_tenantstats WHERE tenant_id = %s', [self.shared.pk])
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+
+class SearchAPITestCase(TenantAPITestCase):
+    def setUp(self):
+        super().setUp()
+        user = User.objects.create_user(username='search', password='testpass123', tenant=self.tenant)
+        self.headers = {'HTTP_AUTHORIZATION': f'Bearer {generate_jwt_token(user)}'}
+        self.launch = Project.objects.create(name='Lançamento do site', description='Novo portal institucional')
+        Project.objects.create(name='Financeiro', description='Fechamento mensal')
+        Task.objects.create(project=self.launch, name='Revisar site', description='Revisar textos do site')
+        Task.objects.create(project=self.launch, name='Publicar', description='Deploy em produção')
+
+    def search(self, path='/api/search', **params):
+        response = self.client.get(path, params, **self.headers)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_ranked_results_across_projects_and_tasks(self):
+        page = self.search(q='site')
+        self.assertEqual(
+            [(result['kind'], result['name']) for result in page['results']],
+            [('task', 'Revisar site'), ('project', 'Lançamento do site')],
+        )
+        self.assertEqual(page['results'][0]['project_id'], self.launch.id)
+        self.assertIsNone(page['next_offset'])
+        self.assertEqual(self.search('/api/async/search', q='site'), page)
+
+    def test_kind_filter_and_pagination(self):
+        self.assertEqual([r['kind'] for r in self.search(q='site', kind='project')['results']], ['project'])
+
+        first = self.search(q='site', limit=1)
+        self.assertEqual(first['next_offset'], 1)
+        second = self.search(q='site', limit=1, offset=first['next_offset'])
+        self.assertEqual(second['results'][0]['name'], 'Lançamento do site')
+        self.assertIsNone(second['next_offset'])
+
+    def test_blank_query_returns_nothing(self):
+        self.assertEqual(self.search(q='  '), {'results': [], 'next_offset': None})
+
+
+class ChangesFeedAPITestCase(TenantAPITestCase):
+    """
+    Cada teste roda em uma única transação: todas as escritas têm o mesmo
+    change_id e o cursor devolvido não passa dele.
+    """
+
+    def setUp(self):
+        super().setUp()
+        user = User.objects.create_user(username='changes', password='testpass123', tenant=self.tenant)
+        self.headers = {'HTTP_AUTHORIZATION': f'Bearer {generate_jwt_token(user)}'}
+        self.project = Project.objects.create(name='Sync', description='Projeto sincronizado')
+        self.task = Task.objects.create(project=self.project, name='Primeira', description='Tarefa')
+
+    def changes(self, path='/api/changes', **params):
+        response = self.client.get(path, params, **self.headers)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_created_updated_and_deleted_rows(self):
+        Project.objects.filter(pk=self.project.pk).update(name='Sync renomeado')
+        doomed = Project.objects.create(name='Temporário', description='Será removido')
+        doomed_task = Task.objects.create(project=doomed, name='Junto', description='Cascata')
+        doomed_id = doomed.id
+        doomed.delete()
+
+        page = self.changes()
+        self.assertEqual([p['name'] for p in page['projects']], ['Sync renomeado'])
+        self.assertEqual([(t['id'], t['project_id']) for t in page['tasks']], [(self.task.id, self.project.id)])
+        self.assertCountEqual(
+            [(d['kind'], d['id']) for d in page['deleted']],
+            [('project', doomed_id), ('task', doomed_task.id)],
+        )
+        self.assertFalse(page['has_more'])
+        self.assertFalse(page['reset'])
+        self.assertEqual(page['cursor'], f'default:{Project.objects.get(pk=self.project.pk).change_id}')
+        self.assertEqual(self.changes('/api/async/changes'), page)
+
+    def test_invalid_or_foreign_cursor_requests_reset(self):
+        for cursor in ('shard9:1', 'lixo'):
+            page = self.changes(since=cursor)
+            self.assertTrue(page['reset'])
+            self.assertEqual([p['id'] for p in page['projects']], [self.project.id])
+
+    def test_rows_of_one_transaction_are_never_split(self):
+        Task.objects.create(project=self.project, name='Segunda', description='Tarefa')
+        page = self.changes(limit=1)
+        self.assertEqual(len(page['tasks']), 2)
+        self.assertEqual(len(page['projects']), 1)
+        self.assertTrue(page['has_more'])
+        # O cursor não passa da transação ainda aberta: ela volta inteira
+        again = self.changes(since=page['cursor'], limit=1)
+        self.assertEqual(len(again['tasks']), 2)
+        self.assertFalse(again['has_more'])
+
+
+class ChangeEventsTestCase(TenantAPITestCase):
+    """SSE em /api/async/events e distribuição dos NOTIFY pelo ChangeHub"""
+
+    def setUp(self):
+        super().setUp()
+        user = User.objects.create_user(username='events', password='testpass123', tenant=self.tenant)
+        self.token = generate_jwt_token(user)
+        self.hub = ChangeHub(queue_size=2)
+        self.addCleanup(self.hub.shutdown)
+
+    def test_stream_auth(self):
+        self.assertEqual(self.client.get('/api/async/events').status_code, 401)
+
+        other = self.create_tenant('evt', 'test_evt', 'evt.test.localhost', tenancy_mode=Client.SHARED_MODE)
+        stranger = User.objects.create_user(username='stranger', password='testpass123', tenant=other)
+        response = self.client.get('/api/async/events', {'token': generate_jwt_token(stranger)})
+        self.assertEqual(response.status_code, 403)
+
+        response = self.client.get('/api/async/events', {'token': self.token})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertTrue(response.streaming)
+
+    def commit_and_delete_project(self):
+        """Escreve por outra conexão (o NOTIFY só sai no commit) sem deixar linhas"""
+        params = connection.get_connection_params()
+        params.pop('cursor_factory', None)
+        with psycopg2.connect(**params) as db_connection, db_connection.cursor() as cursor:
+            cursor.execute(f'SET search_path = "{self.tenant.schema_name}"')
+            cursor.execute(
+                "INSERT INTO tasks_project (name, description, is_completed, created_at, updated_at, change_id) "
+                "VALUES ('Evento', '', false, now(), now(), 0) RETURNING id"
+            )
+            project_id = cursor.fetchone()[0]
+            cursor.execute('DELETE FROM tasks_project WHERE id = %s', [project_id])
+            cursor.execute('DELETE FROM tasks_tombstone WHERE object_id = %s', [project_id])
+        db_connection.close()
+        return project_id
+
+    async def next_chunks(self, stream, count):
+        return [await asyncio.wait_for(anext(stream), 5) for _ in range(count)]
+
+    def test_trigger_notifications_reach_subscriber(self):
+        async def scenario():
+            stream = event_stream(self.tenant, hub=self.hub)
+            self.assertTrue((await anext(stream)).startswith('retry:'))
+            pending = asyncio.ensure_future(self.next_chunks(stream, 2))
+            while not self.hub.snapshot()['listeners'].get('default', {}).get('connected'):
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.1)  # LISTEN aplicado pela thread do listener
+            project_id = await asyncio.to_thread(self.commit_and_delete_project)
+            chunks = await pending
+            await stream.aclose()
+            return project_id, chunks
+
+        project_id, chunks = asyncio.run(scenario())
+        self.assertIn('event: change', chunks[0])
+        self.assertIn(f'"id": {project_id}', chunks[0])
+        self.assertIn('"op": "insert"', chunks[0])
+        self.assertIn('"op": "delete"', chunks[1])
+        self.assertEqual(self.hub.subscriber_count(), 0)
+
+    def test_slow_subscriber_is_dropped(self):
+        payload = f'{{"schema": "{self.tenant.schema_name}", "kind": "task", "op": "update", "id": 1}}'
+        channel = f'tasks_{self.tenant.schema_name}'
+
+        async def scenario():
+            stream = event_stream(self.tenant, hub=self.hub)
+            await anext(stream)
+            pending = asyncio.ensure_future(anext(stream))
+            while not self.hub.subscriber_count():
+                await asyncio.sleep(0.01)
+            for _ in range(3):  # fila de 2: o terceiro estoura
+                self.hub.dispatch('default', channel, payload)
+            await asyncio.sleep(0)
+            return await pending
+
+        self.assertIn('event: dropped', asyncio.run(scenario()))
+        self.assertEqual(self.hub.snapshot()['dropped'], 1)
+        self.assertEqual(self.hub.subscriber_count(), 0)
+
+    def test_seed_copy_skips_notify_triggers(self):
+        with CaptureQueriesContext(connection) as queries:
+            fill_schema(self.tenant.schema_name, projects=2, tasks=3, seed=0)
+
+        self.assertEqual(
+            [query['sql'] for query in queries.captured_queries if 'DISABLE TRIGGER' in query['sql']],
+            ['ALTER TABLE tasks_project DISABLE TRIGGER tasks_project_notify',
+             'ALTER TABLE tasks_task DISABLE TRIGGER tasks_task_notify'],
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT t.tgname FROM pg_trigger t JOIN pg_class c ON c.oid = t.tgrelid "
+                "JOIN pg_namespace n ON n.oid = c.relnamespace "
+                "WHERE n.nspname = %s AND NOT t.tgisinternal AND t.tgenabled = 'D'",
+                [self.tenant.schema_name],
+            )
+            self.assertEqual(cursor.fetchall(), [])
+        # Contadores e change_id seguiram pelos triggers que ficaram ligados
+        self.assertEqual(list(Project.objects.order_by('id').values_list('task_count', flat=True)), [3, 3])
+        self.assertFalse(Task.objects.filter(change_id__lte=0).exists())
+
+
+class MaintainedStatsTestCase(TenantAPITestCase):
+    """Project.task_count e TenantStats acompanham todos os caminhos de escrita"""
+
+    def setUp(self):
+        super().setUp()
+        user = User.objects.create_user(username='stats', password='testpass123', tenant=self.tenant)
+        self.headers = {'HTTP_AUTHORIZATION': f'Bearer {generate_jwt_token(user)}'}
+
+    def stats(self, path='/api/stats'):
+        response = self.client.get(path, **self.headers)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_counters_follow_writes(self):
+        first = Project.objects.create(name='Um', description='')
+        second = Project.objects.create(name='Dois', description='', is_completed=True)
+        Task.objects.bulk_create([Task(project=first, name=f'T{i}', description='') for i in range(3)])
+        moved = Task.objects.create(project=first, name='Movida', description='')
+        Task.objects.filter(pk=moved.pk).update(project=second)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.task_count, second.task_count), (3, 1))
+
+        # save() com um task_count antigo em memória não desfaz a contagem
+        stale = Project.objects.get(pk=first.pk)
+        Task.objects.create(project=first, name='Nova', description='')
+        stale.is_completed = True
+        stale.save()
+        first.refresh_from_db()
+        self.assertEqual(first.task_count, 4)
+
+        second.delete()
+        totals = self.stats()
+        self.assertEqual(
+            (totals['projects'], totals['completed_projects'], totals['tasks']), (1, 1, 4),
+        )
+        self.assertIsNotNone(totals['last_activity_at'])
+        self.assertEqual(self.stats('/api/async/stats'), totals)
+
+        response = self.client.get(f'/api/projects/{first.pk}', **self.headers)
+        self.assertEqual(response.json()['task_count'], 4)
+
+    def test_reconcile_repairs_drift(self):
+        project = Project.objects.create(name='Deriva', description='')
+        Task.objects.create(project=project, name='Tarefa', description='')
+        Project.objects.filter(pk=project.pk).update(task_count=7)
+        TenantStats.objects.update(task_count=0, project_count=5)
+
+        call_command('reconcile_stats', schemas=[self.tenant.schema_name], batch_size=1, stdout=StringIO())
+
+        project.refresh_from_db()
+        self.assertEqual(project.task_count, 1)
+        self.assertEqual(TenantStats.objects.count(), 1)
+        self.assertEqual((self.stats()['projects'], self.stats()['tasks']), (1, 1))
+        self.assertEqual(stats.reconcile(self.tenant), {'projects_fixed': 0, 'totals_fixed': False})
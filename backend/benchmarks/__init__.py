@@ -0,0 +1,6 @@
+"""
+Suíte de benchmark das APIs por tenant.
+
+Uso:
+    python -m benchmarks.run --tenants 5 --projects 50 --tasks 20 --output baseline.json
+"""
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+"""
+Compara o throughput da listagem de projetos em três modos:
+
+  - wsgi:       endpoint síncrono pelo handler WSGI, com `concurrency` threads
+  - sync-asgi:  endpoint síncrono pelo handler ASGI (cada requisição passa pela
+                thread do sync_to_async), com `concurrency` coroutines
+  - async-asgi: endpoint async (/api/async/projects) pelo handler ASGI, com o
+                ORM async
+
+As requisições são in-process (sem servidor HTTP), então a diferença medida é a
+do handler e do modelo de execução, não a da rede.
+
+Exemplo:
+    python -m benchmarks.asgi --tenants 3 --projects 50 --tasks 10 --concurrency 16
+"""
+import argparse
+import asyncio
+import json
+import sys
+import threading
+import time
+
+# benchmarks.run configura o Django (django.setup) ao ser importado
+from benchmarks.run import print_table, summarize
+
+from django.core.handlers.asgi import ASGIHandler  # noqa: E402
+from django.db import connection, connections  # noqa: E402
+from django.test import Client as DjangoClient  # noqa: E402
+
+from apps.core.jwt_utils import generate_jwt_token  # noqa: E402
+from apps.core.models import User  # noqa: E402
+from benchmarks import datagen  # noqa: E402
+
+SYNC_PATH = '/api/projects'
+ASYNC_PATH = '/api/async/projects'
+
+
+def get_targets(tenants):
+    """(host, token) de cada tenant de benchmark"""
+    users = User.objects.select_related('tenant').in_bulk(
+        [tenant.username for tenant in tenants], field_name='username'
+    )
+    return [
+        (tenant.domain, generate_jwt_token(users[tenant.username]))
+        for tenant in tenants
+    ]
+
+
+def run_wsgi(targets, requests, concurrency):
+    per_worker = max(1, requests // concurrency)
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    ready = threading.Barrier(concurrency + 1)
+
+    def worker(index):
+        client = DjangoClient()
+        host, token = targets[index % len(targets)]
+        local_latencies = []
+        local_errors = 0
+        try:
+            ready.wait()
+            for _ in range(per_worker):
+                start = time.perf_counter()
+                response = client.get(SYNC_PATH, HTTP_HOST=host, HTTP_AUTHORIZATION=f'Bearer {token}')
+                local_latencies.append(time.perf_counter() - start)
+                local_errors += 0 if response.status_code == 200 else 1
+        finally:
+            connections.close_all()
+            with lock:
+                latencies.extend(local_latencies)
+                errors.append(local_errors)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, sum(errors), time.perf_counter() - start)
+
+
+async def asgi_get(application, path, host, token):
+    """GET direto na aplicação ASGI; retorna o status HTTP"""
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': b'',
+        'root_path': '',
+        'client': ('127.0.0.1', 0),
+        'server': (host, 80),
+        'headers': [
+            (b'host', host.encode()),
+            (b'authorization', f'Bearer {token}'.encode()),
+        ],
+    }
+    status = None
+    body_sent = False
+    finished = asyncio.Event()
+
+    async def receive():
+        # Primeiro o corpo (vazio); depois o handler fica ouvindo o disconnect,
+        # que só acontece quando a resposta termina
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await finished.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        elif message['type'] == 'http.response.body' and not message.get('more_body'):
+            finished.set()
+
+    await application(scope, receive, send)
+    return status
+
+
+async def run_asgi(path, targets, requests, concurrency):
+    application = ASGIHandler()
+    per_worker = max(1, requests // concurrency)
+    latencies = []
+    errors = 0
+
+    async def worker(index):
+        nonlocal errors
+        host, token = targets[index % len(targets)]
+        for _ in range(per_worker):
+            start = time.perf_counter()
+            status = await asgi_get(application, path, host, token)
+            latencies.append(time.perf_counter() - start)
+            errors += 0 if status == 200 else 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark WSGI x ASGI x async')
+    parser.add_argument('--tenants', type=int, default=3)
+    parser.add_argument('--projects', type=int, default=20, help='Projetos por tenant')
+    parser.add_argument('--tasks', type=int, default=10, help='Tarefas por projeto')
+    parser.add_argument('--requests', type=int, default=400, help='Requisições medidas por modo')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--warmup', type=int, default=20, help='Requisições de aquecimento por modo')
+    parser.add_argument('--output', help='Arquivo JSON para salvar o resultado')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    print(f'Gerando dados: {args.tenants} tenants x {args.projects} projetos x {args.tasks} tarefas')
+    tenants = datagen.generate(args.tenants, args.projects, args.tasks, stdout=sys.stdout)
+    connection.set_schema_to_public()
+    targets = get_targets(tenants)
+
+    modes = {
+        'wsgi': lambda n, c: run_wsgi(targets, n, c),
+        'sync-asgi': lambda n, c: asyncio.run(run_asgi(SYNC_PATH, targets, n, c)),
+        'async-asgi': lambda n, c: asyncio.run(run_asgi(ASYNC_PATH, targets, n, c)),
+    }
+
+    results = {}
+    for name, run in modes.items():
+        print(f'Executando {name}...')
+        run(args.warmup, 1)
+        results[name] = run(args.requests, args.concurrency)
+
+    print()
+    print_table(results)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'concurrency': args.concurrency, 'modes': results}, output, indent=2, sort_keys=True)
+        print(f'\nResultado salvo em {args.output}')
+
+    return 1 if any(result['errors'] for result in results.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+"""
+Custo de conexão e de SET search_path por requisição (antes/depois).
+
+Executa a listagem de projetos pelo handler WSGI real (com os sinais de
+request_started/finished, que fecham conexões expiradas) em três modos:
+
+  - per-request:       CONN_MAX_AGE=0, SET search_path em toda requisição
+                       (comportamento anterior)
+  - persistent:        CONN_MAX_AGE>0, SET search_path em toda requisição
+  - persistent+elide:  CONN_MAX_AGE>0, SET só quando o schema muda
+
+Para cada modo reporta latência/throughput e, por requisição, conexões
+abertas e SETs enviados. Com --tenants > 1 as requisições alternam entre os
+tenants, o que força trocas de schema.
+
+Exemplo:
+    python -m benchmarks.connections --tenants 1 --requests 500
+"""
+import argparse
+import io
+import sys
+import time
+
+# benchmarks.run configura o Django (django.setup) ao ser importado
+from benchmarks.run import print_table, summarize
+
+from django.core.handlers.wsgi import WSGIHandler  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import RequestFactory, override_settings  # noqa: E402
+
+from apps.core.postgresql_backend import base as postgresql_backend  # noqa: E402
+from benchmarks import datagen  # noqa: E402
+from benchmarks.asgi import SYNC_PATH, get_targets  # noqa: E402
+
+MODES = {
+    'per-request': {'conn_max_age': 0, 'elision': False},
+    'persistent': {'conn_max_age': 600, 'elision': False},
+    'persistent+elide': {'conn_max_age': 600, 'elision': True},
+}
+
+
+def wsgi_get(handler, path, host, token):
+    """GET pelo WSGIHandler; retorna o status HTTP"""
+    environ = RequestFactory()._base_environ(
+        PATH_INFO=path,
+        REQUEST_METHOD='GET',
+        HTTP_HOST=host,
+        HTTP_AUTHORIZATION=f'Bearer {token}',
+    )
+    environ['wsgi.input'] = io.BytesIO()
+    status = []
+    response = handler(environ, lambda s, headers: status.append(s))
+    b''.join(response)
+    response.close()  # dispara request_finished
+    return int(status[0].split()[0])
+
+
+def run_mode(handler, targets, requests, conn_max_age, elision):
+    connection.close()
+    connection.settings_dict['CONN_MAX_AGE'] = conn_max_age
+    before = dict(postgresql_backend.stats)
+    latencies = []
+    errors = 0
+
+    with override_settings(TENANT_SEARCH_PATH_ELISION=elision):
+        start = time.perf_counter()
+        for i in range(requests):
+            host, token = targets[i % len(targets)]
+            request_start = time.perf_counter()
+            status = wsgi_get(handler, SYNC_PATH, host, token)
+            latencies.append(time.perf_counter() - request_start)
+            errors += 0 if status == 200 else 1
+        elapsed = time.perf_counter() - start
+
+    result = summarize(latencies, errors, elapsed)
+    for key in ('connections_opened', 'search_path_sets', 'search_path_elided'):
+        result[f'{key}_per_request'] = round((postgresql_backend.stats[key] - before[key]) / requests, 2)
+    return result
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark de conexões e search_path')
+    parser.add_argument('--tenants', type=int, default=1)
+    parser.add_argument('--projects', type=int, default=20, help='Projetos por tenant')
+    parser.add_argument('--tasks', type=int, default=5, help='Tarefas por projeto')
+    parser.add_argument('--requests', type=int, default=500, help='Requisições medidas por modo')
+    parser.add_argument('--warmup', type=int, default=20)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    print(f'Gerando dados: {args.tenants} tenants x {args.projects} projetos x {args.tasks} tarefas')
+    tenants = datagen.generate(args.tenants, args.projects, args.tasks, stdout=sys.stdout)
+    connection.set_schema_to_public()
+    targets = get_targets(tenants)
+    handler = WSGIHandler()
+
+    results = {}
+    for name, options in MODES.items():
+        print(f'Executando {name}...')
+        run_mode(handler, targets, args.warmup, **options)
+        results[name] = run_mode(handler, targets, args.requests, **options)
+
+    print()
+    print_table(results)
+    print()
+    print(f"{'modo':<28}{'conexões/req':>14}{'SETs/req':>10}{'elididos/req':>14}")
+    for name, m in results.items():
+        print(
+            f"{name:<28}{m['connections_opened_per_request']:>14}"
+            f"{m['search_path_sets_per_request']:>10}{m['search_path_elided_per_request']:>14}"
+        )
+
+    return 1 if any(result['errors'] for result in results.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+Gerador de dados para benchmark: N tenants x M projetos x K tarefas.
+
+Os tenants de benchmark usam o prefixo `bench` no schema e no domínio
+(`bench0.localhost`, `bench1.localhost`, ...) e cada um recebe um usuário
+`bench<i>` com a senha BENCH_PASSWORD. A criação usa o mesmo seeding
+determinístico do comando `seed_tenants` (clone de schema + COPY).
+"""
+from dataclasses import dataclass
+
+from django_tenants.utils import schema_context, schema_exists
+
+from apps.core.models import Client, User
+from apps.core.seeding import seed_tenants
+from apps.tasks.models import Project
+
+BENCH_PREFIX = 'bench'
+BENCH_PASSWORD = 'bench-pass-123'
+
+
+@dataclass
+class BenchTenant:
+    schema_name: str
+    domain: str
+    username: str
+    project_ids: list
+
+
+def generate(tenants, projects, tasks, prefix=BENCH_PREFIX, seed=0, workers=4, stdout=None):
+    """
+    Cria os dados de benchmark e retorna a lista de BenchTenant.
+    Tenants já existentes são reaproveitados, então rodadas seguidas são rápidas.
+    """
+    result = seed_tenants(
+        tenants, projects, tasks,
+        seed=seed, prefix=prefix, workers=workers, password=BENCH_PASSWORD,
+    )
+    if result.errors:
+        raise RuntimeError(f'Falha ao gerar tenants de benchmark: {result.errors}')
+
+    # O middleware de rate limit continua no caminho (o custo dele é medido),
+    # mas sem limites que estrangulem a carga do benchmark
+    Client.objects.filter(pk__in=bench_clients(tenants, prefix).values('pk')).update(
+        rate_limit=0, user_rate_limit=0, max_concurrent_requests=0,
+    )
+
+    bench_tenants = []
+    for i in range(tenants):
+        schema_name = f'{prefix}{i}'
+        with schema_context(schema_name):
+            project_ids = list(Project.objects.order_by('id').values_list('id', flat=True)[:projects])
+        bench_tenants.append(BenchTenant(
+            schema_name=schema_name,
+            domain=f'{schema_name}.localhost',
+            username=schema_name,
+            project_ids=project_ids,
+        ))
+        if stdout:
+            stdout.write(f'  - {schema_name}: {len(project_ids)} projetos\n')
+
+    return bench_tenants
+
+
+def bench_clients(tenants, prefix=BENCH_PREFIX):
+    """
+    Os tenants gerados: só os nomes exatos `<prefix><i>` com o domínio
+    `<prefix><i>.localhost` - um tenant real que apenas comece com o prefixo
+    nunca entra
+    """
+    schema_names = [f'{prefix}{i}' for i in range(tenants)]
+    return Client.objects.filter(
+        schema_name__in=schema_names,
+        domains__domain__in=[f'{schema_name}.localhost' for schema_name in schema_names],
+    )
+
+
+def drop(tenants, prefix=BENCH_PREFIX):
+    """Remove os `tenants` tenants de benchmark (schemas, domínios e usuários)"""
+    for tenant in bench_clients(tenants, prefix):
+        User.objects.filter(tenant=tenant).delete()
+        tenant.delete(force_drop=schema_exists(tenant.schema_name, tenant.shard))
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+"""
+Runner da suíte de benchmark.
+
+Gera os dados (N tenants x M projetos x K tarefas), executa os cenários e
+reporta p50/p95/p99 de latência e throughput. O resultado pode ser salvo em
+JSON (--output) e comparado com um baseline anterior (--compare), o que
+permite ao CI falhar em regressões.
+
+Exemplos:
+    python -m benchmarks.run --tenants 5 --projects 50 --tasks 20 --output baseline.json
+    python -m benchmarks.run --scenario project_list_polling --compare baseline.json
+    python -m benchmarks.run --base-url http://localhost:8000 --concurrency 8
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import django
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
+django.setup()
+
+from django.db import connection, connections  # noqa: E402
+
+from benchmarks import datagen  # noqa: E402
+from benchmarks.scenarios import SCENARIOS, HttpTransport, InProcessTransport, make_rng  # noqa: E402
+
+# Métricas em que um valor maior é pior (usadas na comparação com o baseline)
+LOWER_IS_BETTER = ('p50_ms', 'p95_ms', 'p99_ms')
+HIGHER_IS_BETTER = ('throughput_rps',)
+
+
+def percentile(sorted_values, pct):
+    """Percentil pelo método nearest-rank"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    total = len(latencies)
+    return {
+        'requests': total,
+        'errors': errors,
+        'throughput_rps': round(total / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3) if latencies else 0.0,
+    }
+
+
+def make_transport(args):
+    if args.base_url:
+        return HttpTransport(args.base_url)
+    return InProcessTransport()
+
+
+def run_scenario(scenario_class, tenants, args):
+    """Executa o cenário com `concurrency` workers e retorna o resumo"""
+    per_worker = max(1, args.requests // args.concurrency)
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    ready = threading.Barrier(args.concurrency + 1)
+
+    def worker(index):
+        transport = make_transport(args)
+        scenario = scenario_class(tenants)
+        rng = make_rng(args.seed, index)
+        local_latencies = []
+        local_errors = 0
+        try:
+            scenario.setup(transport)
+            for _ in range(args.warmup):
+                scenario.run_once(transport, rng)
+            ready.wait()
+            for _ in range(per_worker):
+                start = time.perf_counter()
+                try:
+                    ok = scenario.run_once(transport, rng)
+                except Exception:
+                    ok = False
+                local_latencies.append(time.perf_counter() - start)
+                local_errors += 0 if ok else 1
+        finally:
+            connections.close_all()
+            with lock:
+                latencies.extend(local_latencies)
+                errors.append(local_errors)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return summarize(latencies, sum(errors), elapsed)
+
+
+def compare(current, baseline, threshold):
+    """Compara com um baseline; retorna a lista de regressões acima do limite"""
+    regressions = []
+    for name, metrics in current['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous:
+            continue
+        for key in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            old, new = previous.get(key), metrics.get(key)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if key in HIGHER_IS_BETTER:
+                change = -change
+            if change > threshold:
+                regressions.append(f'{name}.{key}: {old} -> {new} ({change:+.0%})')
+    return regressions
+
+
+def print_table(results):
+    header = f"{'cenário':<28}{'req':>7}{'erros':>7}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header)
+    print('-' * len(header))
+    for name, m in results.items():
+        print(
+            f"{name:<28}{m['requests']:>7}{m['errors']:>7}{m['throughput_rps']:>10}"
+            f"{m['p50_ms']:>10}{m['p95_ms']:>10}{m['p99_ms']:>10}"
+        )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark das APIs por tenant')
+    parser.add_argument('--tenants', type=int, default=3)
+    parser.add_argument('--projects', type=int, default=20, help='Projetos por tenant')
+    parser.add_argument('--tasks', type=int, default=10, help='Tarefas por projeto')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='Cenário a executar (pode repetir). Padrão: todos')
+    parser.add_argument('--requests', type=int, default=200, help='Requisições medidas por cenário')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--warmup', type=int, default=5, help='Requisições de aquecimento por worker')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--base-url', help='Servidor HTTP alvo (padrão: in-process)')
+    parser.add_argument('--output', help='Arquivo JSON para salvar o resultado')
+    parser.add_argument('--compare', help='Baseline JSON para comparação')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Regressão máxima aceita na comparação (0.2 = 20%%)')
+    parser.add_argument('--drop', action='store_true', help='Remove os --tenants tenants de benchmark e sai')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.drop:
+        datagen.drop(args.tenants)
+        print('Tenants de benchmark removidos')
+        return 0
+
+    print(f'Gerando dados: {args.tenants} tenants x {args.projects} projetos x {args.tasks} tarefas')
+    tenants = datagen.generate(args.tenants, args.projects, args.tasks, stdout=sys.stdout)
+    connection.set_schema_to_public()
+
+    results = {}
+    for name in args.scenario or sorted(SCENARIOS):
+        print(f'Executando {name}...')
+        results[name] = run_scenario(SCENARIOS[name], tenants, args)
+
+    report = {
+        'meta': {
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'transport': 'http' if args.base_url else 'in-process',
+            'tenants': args.tenants,
+            'projects': args.projects,
+            'tasks': args.tasks,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'seed': args.seed,
+        },
+        'scenarios': results,
+    }
+
+    print()
+    print_table(results)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2, sort_keys=True))
+        print(f'\nResultado salvo em {args.output}')
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print('\nRegressões em relação ao baseline:')
+            for regression in regressions:
+                print(f'  - {regression}')
+            return 1
+        print('\nSem regressões em relação ao baseline')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
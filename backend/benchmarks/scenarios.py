@@ -0,0 +1,157 @@
+"""
+Cenários de benchmark.
+
+Cada cenário recebe um Transport (requisições in-process pelo test client do
+Django ou HTTP real contra um servidor rodando) e executa uma operação por
+chamada de `run_once`. O runner mede a latência de cada chamada.
+"""
+import json
+import random
+import urllib.error
+import urllib.request
+
+from django.test import Client as DjangoClient
+
+from apps.core.models import Client
+from apps.core.sharding import admin_report
+from .datagen import BENCH_PASSWORD
+
+
+class Transport:
+    """Interface mínima para disparar requisições contra a API"""
+
+    def request(self, method, path, host, data=None, token=None):
+        raise NotImplementedError
+
+
+class InProcessTransport(Transport):
+    """Executa as requisições dentro do processo, pela stack completa do Django"""
+
+    def __init__(self):
+        self.client = DjangoClient()
+
+    def request(self, method, path, host, data=None, token=None):
+        kwargs = {'HTTP_HOST': host}
+        if token:
+            kwargs['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+        if data is not None:
+            kwargs['data'] = json.dumps(data)
+            kwargs['content_type'] = 'application/json'
+        response = getattr(self.client, method.lower())(path, **kwargs)
+        return response.status_code, response.json() if response.content else None
+
+
+class HttpTransport(Transport):
+    """Executa as requisições via HTTP contra um servidor (runserver, gunicorn, uvicorn...)"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, host, data=None, token=None):
+        body = json.dumps(data).encode() if data is not None else None
+        request = urllib.request.Request(self.base_url + path, data=body, method=method)
+        request.add_header('Host', host)
+        request.add_header('Content-Type', 'application/json')
+        if token:
+            request.add_header('Authorization', f'Bearer {token}')
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, json.loads(response.read() or 'null')
+        except urllib.error.HTTPError as error:
+            return error.code, None
+
+
+class Scenario:
+    name = None
+
+    def __init__(self, tenants):
+        self.tenants = tenants
+
+    def setup(self, transport):
+        """Preparação executada uma vez por worker, fora da medição"""
+
+    def run_once(self, transport, rng):
+        """Executa uma operação; retorna True em caso de sucesso"""
+        raise NotImplementedError
+
+
+class AuthenticatedScenario(Scenario):
+    """Cenário que precisa de um token JWT por tenant"""
+
+    def setup(self, transport):
+        self.tokens = {}
+        for tenant in self.tenants:
+            status, data = transport.request('POST', '/api/auth/login-jwt', tenant.domain, {
+                'username': tenant.username,
+                'password': BENCH_PASSWORD,
+            })
+            if status != 200 or not data.get('success'):
+                raise RuntimeError(f'Falha no login de benchmark para {tenant.username}: {data}')
+            self.tokens[tenant.schema_name] = data['access_token']
+
+
+class LoginJWTStorm(Scenario):
+    """Rajada de logins JWT (dominado pelo hash de senha)"""
+    name = 'login_jwt_storm'
+
+    def run_once(self, transport, rng):
+        tenant = rng.choice(self.tenants)
+        status, data = transport.request('POST', '/api/auth/login-jwt', tenant.domain, {
+            'username': tenant.username,
+            'password': BENCH_PASSWORD,
+        })
+        return status == 200 and data['success']
+
+
+class ProjectListPolling(AuthenticatedScenario):
+    """Polling de /api/projects, como o frontend faz em cada aba aberta"""
+    name = 'project_list_polling'
+
+    def run_once(self, transport, rng):
+        tenant = rng.choice(self.tenants)
+        status, _ = transport.request(
+            'GET', '/api/projects', tenant.domain, token=self.tokens[tenant.schema_name]
+        )
+        return status == 200
+
+
+class BulkWrites(AuthenticatedScenario):
+    """Criação e atualização de projetos em sequência"""
+    name = 'bulk_writes'
+
+    def run_once(self, transport, rng):
+        tenant = rng.choice(self.tenants)
+        token = self.tokens[tenant.schema_name]
+        status, data = transport.request('POST', '/api/projects', tenant.domain, {
+            'name': f'Bench {rng.randint(0, 10**6)}',
+            'description': 'Criado pelo benchmark',
+        }, token=token)
+        if status != 200:
+            return False
+        status, _ = transport.request('PUT', f"/api/projects/{data['id']}", tenant.domain, {
+            'is_completed': True,
+        }, token=token)
+        return status == 200
+
+
+class CrossTenantAdminReport(Scenario):
+    """
+    Relatório administrativo que percorre todos os tenants (não há endpoint
+    para isso, então o cenário usa o ORM diretamente, como um comando de admin).
+    Com vários shards, cada shard é percorrido em paralelo.
+    """
+    name = 'cross_tenant_admin_report'
+
+    def run_once(self, transport, rng):
+        tenants = Client.objects.filter(schema_name__in=[t.schema_name for t in self.tenants])
+        return bool(admin_report(tenants))
+
+
+SCENARIOS = {
+    scenario.name: scenario
+    for scenario in (LoginJWTStorm, ProjectListPolling, BulkWrites, CrossTenantAdminReport)
+}
+
+
+def make_rng(seed, worker):
+    return random.Random(f'{seed}-{worker}')
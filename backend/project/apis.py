@@ -1,7 +1,13 @@
 from ninja import NinjaAPI
 
 from apps.core.api import router as auth_router
+from apps.core.api_async import router as async_auth_router
+from apps.core.hashing import HashingPoolSaturated
+from apps.core.metering import router as metering_router
+from apps.core.metrics import router as metrics_router
+from apps.core.timeouts import QueryTimeout, with_query_timeouts
 from apps.tasks.api import router as tasks_router
+from apps.tasks.api_async import router as async_tasks_router
 
 
 api = NinjaAPI(
@@ -9,5 +15,29 @@ api = NinjaAPI(
     version="1.0.0"
 )
 
+
+@api.exception_handler(HashingPoolSaturated)
+def hashing_pool_saturated(request, exc):
+    response = api.create_response(request, {"error": str(exc)}, status=503)
+    response["Retry-After"] = str(exc.retry_after)
+    return response
+
+
+@api.exception_handler(QueryTimeout)
+def query_timeout(request, exc):
+    response = api.create_response(request, {"error": str(exc), "timeout": exc.kind}, status=503)
+    response["Retry-After"] = str(exc.retry_after)
+    return response
+
+
+# statement_timeout/lock_timeout por tenant e endpoint em todas as operações
+# (antes dos add_router: os routers herdam os decorators da API)
+api.add_decorator(with_query_timeouts)
+
 api.add_router("/auth/", auth_router)
+# Versões async (ASGI) - registradas antes do router "/" de tarefas
+api.add_router("/async/auth/", async_auth_router)
+api.add_router("/async/", async_tasks_router)
+api.add_router("/", metrics_router)
+api.add_router("/", metering_router)
 api.add_router("/", tasks_router)
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
 
 application = get_asgi_application()
+
+# Cache de tenants, conexões, templates e schema OpenAPI antes da primeira requisição
+from apps.core.warmup import on_boot  # noqa: E402
+
+on_boot()
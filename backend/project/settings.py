@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -33,6 +34,9 @@ DEBUG = os.environ.get('DEBUG')
 
 ALLOWED_HOSTS = os.environ.get('ALLOWED_HOSTS', '').split(',')
 
+# True quando rodando a suíte de testes (manage.py test ou pytest)
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+
 
 # Application definition
 
@@ -44,10 +48,14 @@ SHARED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',  # SearchVector/GinIndex (busca em apps.tasks)
     'django_extensions',
     'corsheaders',
     'ninja',  # Django Ninja
     'apps.core',
+    # Também compartilhado: tabelas no public para os tenants em modo
+    # 'shared' (apps.core.tenancy)
+    'apps.tasks',
 ]
 
 # NESSA LISTA SOMENTE OS APPS QUE OS CLIENTES(TENANTS) VÃO USAR
@@ -62,8 +70,12 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'django_tenants.middleware.main.TenantMainMiddleware',
+    'apps.core.middleware.CachedTenantMainMiddleware',  # TenantMainMiddleware com cache hostname -> tenant
     'apps.core.middleware.TenantSubdomainMiddleware',  # Middleware personalizado para debugging
+    'apps.core.middleware.TenantDisabledMiddleware',  # 410 para tenants desativados (offboarding)
+    'apps.core.metering.UsageMeteringMiddleware',  # Consumo por tenant (mede também as respostas 429)
+    'apps.core.ratelimit.RateLimitMiddleware',  # Rate limit por tenant/usuário (antes de qualquer query)
+    'apps.core.middleware.TenantWriteFreezeMiddleware',  # 503 em escritas de tenants congelados
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -88,6 +100,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'project.wsgi.application'
+ASGI_APPLICATION = 'project.asgi.application'
 
 
 # Database
@@ -95,20 +108,73 @@ WSGI_APPLICATION = 'project.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django_tenants.postgresql_backend',
+        # django_tenants.postgresql_backend + reuso de conexão e elisão do SET search_path
+        'ENGINE': 'apps.core.postgresql_backend',
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASSWORD'),
         'HOST': os.environ.get('DB_HOST'),
         'PORT': os.environ.get('DB_PORT'),
+        # Conexões persistentes (segundos; 0 = reconecta a cada requisição)
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Atrás de um pooler em modo transação (PgBouncer pool_mode=transaction) o
+# estado de sessão não é confiável: o SET search_path vai junto de cada
+# statement e cursores server-side ficam desligados.
+TENANT_TRANSACTION_POOLING = os.environ.get('DB_TRANSACTION_POOLING', '0') == '1'
+# Não reenvia o SET search_path quando a conexão já está no schema pedido
+TENANT_SEARCH_PATH_ELISION = True
+
+if TENANT_TRANSACTION_POOLING:
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+
+# Shards (opcional): bancos extras para schemas de tenant, cada Client aponta
+# para um deles em Client.shard. Formato: "alias=banco" ou
+# "alias=host:porta/banco", separados por vírgula. Usuário e senha são os do
+# banco default. Ex.: DB_SHARDS="shard1=tenancy_shard1,shard2=10.0.0.5:5432/tenancy"
+TENANT_SHARDS = ['default']
+for entry in filter(None, os.environ.get('DB_SHARDS', '').split(',')):
+    alias, _, location = entry.strip().partition('=')
+    address, _, name = location.rpartition('/')
+    host, _, port = address.partition(':')
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME': name,
+        'HOST': host or DATABASES['default']['HOST'],
+        'PORT': port or DATABASES['default']['PORT'],
+    }
+    TENANT_SHARDS.append(alias)
+
 # CONF PARA TENANT
 DATABASE_ROUTERS = (
+    'apps.core.routers.TenantShardRouter',  # Models de tenant no banco do shard do tenant
+    'apps.core.routers.TenantReadReplicaRouter',  # Leituras das rotas read-only na réplica
     'django_tenants.routers.TenantSyncRouter',
 )
 
+# Réplica de leitura (opcional): habilitada quando DB_REPLICA_HOST/DB_REPLICA_NAME
+# estão definidos. Nos testes ela é um espelho do banco default.
+if os.environ.get('DB_REPLICA_HOST') or os.environ.get('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ.get('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'USER': os.environ.get('DB_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.environ.get('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        'HOST': os.environ.get('DB_REPLICA_HOST', DATABASES['default']['HOST']),
+        'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# Depois de uma escrita, as leituras do tenant ficam no banco principal por
+# este intervalo (read-your-writes)
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+# Cache onde fica essa marca; com a réplica ligada (e DEBUG desligado) precisa
+# ser compartilhado entre os workers, senão o boot falha
+REPLICA_STICKY_CACHE_ALIAS = os.environ.get('REPLICA_STICKY_CACHE_ALIAS', 'default')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -128,6 +194,10 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Nos testes o hash de senha não precisa ser seguro, só rápido
+if TESTING:
+    PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -199,4 +269,97 @@ CORS_ALLOW_METHODS = [
     'OPTIONS',
 ]
 
-LOGOUT_REDIRECT_URL = 'login'
\ No newline at end of file
+LOGOUT_REDIRECT_URL = 'login'
+
+# ============================ QUERY BUDGET ===============================
+# Em testes e DEBUG o estouro do orçamento de queries de um endpoint levanta
+# QueryBudgetExceeded; em produção apenas gera um warning no log.
+QUERY_BUDGET_STRICT = bool(DEBUG) or TESTING
+
+# ============================ CREDENTIAL HASHING ===============================
+# Pool dedicado para hash/verificação de senhas (login e registro). Com a fila
+# cheia as requisições recebem 503 + Retry-After imediatamente.
+HASHING_POOL_WORKERS = int(os.getenv('HASHING_POOL_WORKERS', 4))
+HASHING_POOL_QUEUE_SIZE = int(os.getenv('HASHING_POOL_QUEUE_SIZE', 32))
+HASHING_POOL_TIMEOUT = float(os.getenv('HASHING_POOL_TIMEOUT', 5))  # segundos
+HASHING_POOL_RETRY_AFTER = int(os.getenv('HASHING_POOL_RETRY_AFTER', 1))  # segundos
+
+# Importação em massa de usuários (apps.core.user_import): linhas por
+# bulk_create e processos para o hash das senhas (<= 1: no próprio processo)
+USER_IMPORT_CHUNK_SIZE = int(os.getenv('USER_IMPORT_CHUNK_SIZE', 500))
+USER_IMPORT_HASH_WORKERS = int(os.getenv('USER_IMPORT_HASH_WORKERS', 4))
+
+# ============================ SSE (GET /api/async/events) ===============================
+# Fila por cliente conectado; cheia, o cliente é desconectado ("dropped")
+SSE_QUEUE_SIZE = int(os.getenv('SSE_QUEUE_SIZE', 100))
+SSE_MAX_SUBSCRIBERS = int(os.getenv('SSE_MAX_SUBSCRIBERS', 1000))  # por processo
+SSE_HEARTBEAT = float(os.getenv('SSE_HEARTBEAT', 15))  # segundos
+SSE_RETRY_MS = int(os.getenv('SSE_RETRY_MS', 3000))  # espera do EventSource antes de reconectar
+
+# GET /api/metrics e /api/metering/top exigem o header X-Metrics-Token com este
+# valor; sem ele configurado, os dois respondem 403
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# ============================ METERING ===============================
+# Consumo por tenant acumulado em memória e gravado em core_tenantusage
+METERING_ENABLED = os.getenv('METERING_ENABLED', '0' if TESTING else '1') == '1'
+METERING_BUCKET_SECONDS = int(os.getenv('METERING_BUCKET_SECONDS', 300))  # granularidade da tabela
+METERING_FLUSH_INTERVAL = float(os.getenv('METERING_FLUSH_INTERVAL', 10))  # segundos; 0 = só flush manual
+
+# ============================ TIMEOUTS DE QUERIES ===============================
+# statement_timeout/lock_timeout das operações da API (ms, 0 = sem limite);
+# cada Client pode sobrescrever, também por endpoint (apps.core.timeouts).
+# Estourou: 503 + Retry-After
+QUERY_STATEMENT_TIMEOUT_MS = int(os.getenv('QUERY_STATEMENT_TIMEOUT_MS', 5000))
+QUERY_LOCK_TIMEOUT_MS = int(os.getenv('QUERY_LOCK_TIMEOUT_MS', 2000))
+QUERY_TIMEOUT_RETRY_AFTER = int(os.getenv('QUERY_TIMEOUT_RETRY_AFTER', 1))  # segundos
+
+# ============================ OPENAPI ===============================
+# Schema gerado no build por `python manage.py build_openapi` e servido com
+# ETag em /api/openapi.json (sem o arquivo, ou com DEBUG, é gerado uma vez por processo)
+OPENAPI_SCHEMA_PATH = os.getenv('OPENAPI_SCHEMA_PATH', str(BASE_DIR / 'build' / 'openapi.json'))
+OPENAPI_SCHEMA_MAX_AGE = int(os.getenv('OPENAPI_SCHEMA_MAX_AGE', 300))  # segundos (Cache-Control)
+
+# ============================ WARM-UP / CACHE DE TENANTS ===============================
+# Cache hostname -> tenant do processo (apps.core.tenant_cache); 0 desliga
+TENANT_CACHE_TTL = float(os.getenv('TENANT_CACHE_TTL', '0' if TESTING else 30))  # segundos
+TENANT_CACHE_MAX_SIZE = int(os.getenv('TENANT_CACHE_MAX_SIZE', 10000))
+# Warm-up ao carregar a aplicação nos workers (apps.core.warmup)
+WARMUP_ON_BOOT = os.getenv('WARMUP_ON_BOOT', '0' if TESTING else '1') == '1'
+WARMUP_TENANTS = int(os.getenv('WARMUP_TENANTS', 100))  # tenants mais ativos pré-carregados
+WARMUP_TEMPLATES = ['core/*.html', 'project_list.html']
+
+# ============================ IDEMPOTÊNCIA ===============================
+# Respostas dos endpoints com Idempotency-Key (apps.core.idempotency)
+IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', 24 * 60 * 60))  # segundos
+IDEMPOTENCY_LOCK_TIMEOUT_MS = int(os.getenv('IDEMPOTENCY_LOCK_TIMEOUT_MS', 10000))  # espera pela duplicata
+IDEMPOTENCY_RETRY_AFTER = int(os.getenv('IDEMPOTENCY_RETRY_AFTER', 1))  # segundos (409)
+
+# ============================ ARQUIVAMENTO ===============================
+# python manage.py archive_projects: projetos concluídos há mais de N dias vão
+# para as tabelas de arquivo (Client.archive_completed_after_days sobrescreve;
+# 0 = nunca arquiva)
+ARCHIVE_COMPLETED_AFTER_DAYS = int(os.getenv('ARCHIVE_COMPLETED_AFTER_DAYS', 90))
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', 500))  # projetos por transação
+
+# ============================ OFFBOARDING ===============================
+# python manage.py offboard_tenant: arquivo .tar.gz por tenant e remoção em
+# transações curtas que desistem do lock depois de OFFBOARDING_LOCK_TIMEOUT_MS
+OFFBOARDING_ARCHIVE_DIR = os.getenv('OFFBOARDING_ARCHIVE_DIR', str(BASE_DIR / 'archives'))
+OFFBOARDING_CHUNK_SIZE = int(os.getenv('OFFBOARDING_CHUNK_SIZE', 5000))  # linhas por DELETE
+OFFBOARDING_LOCK_TIMEOUT_MS = int(os.getenv('OFFBOARDING_LOCK_TIMEOUT_MS', 2000))
+OFFBOARDING_LOCK_RETRIES = int(os.getenv('OFFBOARDING_LOCK_RETRIES', 10))
+
+# ============================ RATE LIMIT ===============================
+# Padrões por tenant; cada Client pode sobrescrever (campos rate_limit*,
+# user_rate_limit* e max_concurrent_requests). 0 desliga o limite.
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', '0' if TESTING else '1') == '1'
+# 'local' (memória do processo) ou 'cache' (compartilhado entre os nós)
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'local')
+RATE_LIMIT_CACHE_ALIAS = 'default'
+RATE_LIMIT_TENANT_RATE = float(os.getenv('RATE_LIMIT_TENANT_RATE', 50))  # req/s
+RATE_LIMIT_TENANT_BURST = int(os.getenv('RATE_LIMIT_TENANT_BURST', 100))
+RATE_LIMIT_USER_RATE = float(os.getenv('RATE_LIMIT_USER_RATE', 10))  # req/s
+RATE_LIMIT_USER_BURST = int(os.getenv('RATE_LIMIT_USER_BURST', 20))
+RATE_LIMIT_TENANT_MAX_CONCURRENT = int(os.getenv('RATE_LIMIT_TENANT_MAX_CONCURRENT', 20))
+RATE_LIMIT_CONCURRENCY_RETRY_AFTER = 1  # segundos
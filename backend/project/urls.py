@@ -16,12 +16,15 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from apps.core.openapi import openapi_json
 from project.apis import api
 
 # URLs públicas (schema public)
 public_patterns = [
     path('admin/', admin.site.urls),
     path('auth/', include('apps.core.urls')),
+    # Schema pré-gerado (build_openapi) no lugar do gerado pelo Ninja a cada requisição
+    path('api/openapi.json', openapi_json),
     path('api/', api.urls),
     path('', include('apps.tasks.urls')),
     
@@ -97,11 +97,9 @@ const Home = () => {
                 <span>
                   Criado: {new Date(project.created_at).toLocaleDateString()}
                 </span>
-                {project.tasks && (
-                  <span className="ml-4">
-                    Tarefas: {project.tasks.length}
-                  </span>
-                )}
+                <span className="ml-4">
+                  Tarefas: {project.task_count}
+                </span>
               </div>
             </div>
             <div className="bg-gray-50 px-4 py-3 sm:px-6">
@@ -90,11 +90,9 @@ const ProjectList = () => {
                 <span>
                   Created: {new Date(project.created_at).toLocaleDateString()}
                 </span>
-                {project.tasks && (
-                  <span className="ml-4">
-                    Tasks: {project.tasks.length}
-                  </span>
-                )}
+                <span className="ml-4">
+                  Tasks: {project.task_count}
+                </span>
               </div>
             </div>
             <div className="bg-gray-50 px-4 py-3 sm:px-6">
@@ -18,7 +18,8 @@ export interface Project {
   is_completed: boolean;
   created_at: string;
   updated_at: string;
-  tasks: Task[];
+  task_count: number;
+  tasks?: Task[]; // só com ?include=tasks
 }
 
 export interface Task {